@@ -59,9 +59,91 @@ class ExportEGG(bpy.types.Operator, ExportHelper):
     bl_label = "Export to Panda3D EGG"
 
     filename_ext = ".egg"
-    filter_glob = props.StringProperty(default="*.egg", options={'HIDDEN'},)
+    filter_glob = props.StringProperty(default="*.egg;*.egg.pz", options={'HIDDEN'},)
     export_format = 'ASCII'
 
+    compress = props.BoolProperty(
+        name='Compress (.egg.pz)',
+        description='Write a gzip compressed .egg.pz file, compressed on a background thread while exporting',
+        default=False,
+    )
+    processes = props.IntProperty(
+        name='Processes',
+        description='Worker processes formatting the meshes, 0 formats everything on the main thread',
+        default=0,
+        min=0,
+    )
+    use_cache = props.BoolProperty(
+        name='Cache objects',
+        description='Reuse the output of the objects that did not change since the previous export',
+        default=False,
+    )
+    cache_size = props.IntProperty(
+        name='Cache size (MB)',
+        description='Size of the object cache, the least recently used objects are evicted first',
+        default=512,
+        min=1,
+    )
+    weld_distance = props.FloatProperty(
+        name='Weld distance',
+        description='Round the position, normal, UVs, color and shape keys of polygon corners to multiples of this '
+                    'step, the same for every attribute, and merge the corners that become identical into a single '
+                    'vertex. Close corners on both sides of a step can stay apart. 0 only merges identical corners',
+        default=0.0,
+        min=0.0,
+    )
+    optimize_vertex_cache = props.BoolProperty(
+        name='Optimize vertex cache',
+        description='Reorder the triangles of every mesh for the vertex cache of the GPU and renumber their vertices '
+                    'in first use order, slower to export',
+        default=False,
+    )
+    export_animations = props.BoolProperty(
+        name='Animations',
+        description='Sample the actions of the armatures and shape keys at every frame of the scenes',
+        default=True,
+    )
+    animation_tolerance = props.FloatProperty(
+        name='Animation tolerance',
+        description='Animation channels varying by less than this are written as a single value, and left out when '
+                    'that value is the default of the channel. 0 only folds the channels that are constant once '
+                    'written with the animation decimals',
+        default=0.0,
+        min=0.0,
+    )
+    animation_error = props.FloatProperty(
+        name='Animation error',
+        description='Write the bone tables of every armature at a reduced frame rate, shared by its bones, that '
+                    'reproduces their channels within this error once interpolated. 0 keeps the scene frame rate',
+        default=0.0,
+        min=0.0,
+    )
+    position_precision = props.IntProperty(
+        name='Position decimals',
+        description='Decimals of the vertex positions and shape key offsets, trailing zeros are not written',
+        default=6,
+        min=0,
+        max=15,
+    )
+    normal_precision = props.IntProperty(
+        name='Normal decimals', description='Decimals of the normals', default=6, min=0, max=15,
+    )
+    uv_precision = props.IntProperty(
+        name='UV decimals', description='Decimals of the texture coordinates', default=6, min=0, max=15,
+    )
+    color_precision = props.IntProperty(
+        name='Color decimals', description='Decimals of the vertex colors', default=6, min=0, max=15,
+    )
+    animation_precision = props.IntProperty(
+        name='Animation decimals', description='Decimals of the animation channels', default=6, min=0, max=15,
+    )
+    trace = props.BoolProperty(
+        name='Trace',
+        description='Record the time spent in every phase, object and mesh in a Chrome trace (.trace.json) next to the '
+                    'egg file',
+        default=False,
+    )
+
     scene_key = 'exportpanda3deggsetting'
 
     def execute(self, context):
@@ -69,10 +151,33 @@ class ExportEGG(bpy.types.Operator, ExportHelper):
         export_settings = {}
 
         export_settings['egg_file_format'] = 'UTF-8'
-
-        export_settings['egg_filepath'] = bpy.path.ensure_ext(self.filepath, self.filename_ext)
+        export_settings['egg_processes'] = self.processes
+        export_settings['egg_weld_epsilon'] = self.weld_distance
+        export_settings['egg_vertex_cache'] = self.optimize_vertex_cache
+        export_settings['egg_animations'] = self.export_animations
+        export_settings['egg_animation_tolerance'] = self.animation_tolerance
+        export_settings['egg_animation_error'] = self.animation_error
+        export_settings['egg_precision'] = {
+            'position': self.position_precision,
+            'normal': self.normal_precision,
+            'uv': self.uv_precision,
+            'color': self.color_precision,
+            'animation': self.animation_precision,
+        }
+
+        export_settings['egg_compress'] = self.compress
+        filepath = self.filepath[:-len('.pz')] if self.filepath.endswith('.pz') else self.filepath
+        export_settings['egg_filepath'] = bpy.path.ensure_ext(filepath, self.filename_ext)
+        if self.compress:
+            export_settings['egg_filepath'] += '.pz'
         export_settings['egg_exportdir'] = os.path.dirname(export_settings['egg_filepath']) + '/'
 
+        if self.use_cache:
+            export_settings['egg_cache_dir'] = os.path.join(export_settings['egg_exportdir'], '.egg_cache')
+            export_settings['egg_cache_size'] = self.cache_size << 20
+
+        export_settings['egg_trace'] = self.trace
+
         save(context, export_settings)
 
         return {'FINISHED'}
@@ -0,0 +1,21 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+import importlib
+import os
+import sys
+import types
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON_NAME = 'egg_exporter'
+
+
+def load_addon_module(name):
+    """
+    Import a module of the addon without running the addon __init__, which registers the Blender operator.
+    """
+    if ADDON_NAME not in sys.modules:
+        package = types.ModuleType(ADDON_NAME)
+        package.__path__ = [ADDON_DIR]
+        sys.modules[ADDON_NAME] = package
+    return importlib.import_module('{}.{}'.format(ADDON_NAME, name))
@@ -0,0 +1,119 @@
+"""
+Memory used by the egg Entry tree of a large mesh.
+
+Builds the VertexPool and Group entries of a grid mesh the same way EggExporter does and reports the memory used per
+node (growth of the peak RSS while building the tree) and the peak RSS of the process. Every variant runs in its own
+process so the measures are not mixed up.
+
+    python benchmark/entry_memory.py --vertices 1000000
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from common import load_addon_module
+
+egg = load_addon_module('egg')
+
+
+def grid_size(vertex_count):
+    side = max(2, int(vertex_count ** 0.5))
+    return side, side * side
+
+
+def build_entry_tree(side):
+    """
+    Generic Entry nodes, as the exporter originally built them.
+    """
+    pool = egg.Entry('VertexPool', name='grid')
+    for index in range(side * side):
+        pool.append(egg.Entry('Vertex', name=index, content=[(float(index % side), float(index // side), 0.0)]))
+
+    group = egg.Entry('Group', name='grid')
+    for row in range(side - 1):
+        for column in range(side - 1):
+            first = row * side + column
+            vertex_ref = egg.Entry('VertexRef', content=(first, first + 1, first + side + 1, first + side))
+            vertex_ref.append(egg.Entry('Ref', content='grid'))
+            group.append(egg.Entry('Polygon', content=vertex_ref))
+    return egg.Egg([pool, group])
+
+
+def build_typed_tree(side):
+    """
+    Typed __slots__ nodes sharing a single Ref.
+    """
+    pool = egg.Entry('VertexPool', name='grid')
+    for index in range(side * side):
+        pool.append(egg.Vertex(index, (float(index % side), float(index // side), 0.0)))
+
+    group = egg.Entry('Group', name='grid')
+    pool_ref = egg.Ref('grid')
+    for row in range(side - 1):
+        for column in range(side - 1):
+            first = row * side + column
+            group.append(egg.Polygon(egg.VertexRef((first, first + 1, first + side + 1, first + side), pool_ref)))
+    return egg.Egg([pool, group])
+
+
+VARIANTS = {
+    'entry': build_entry_tree,
+    'typed': build_typed_tree,
+}
+
+
+def peak_rss():
+    """
+    Peak resident set size of the process in bytes (ru_maxrss is in kilobytes on Linux).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(variant, vertex_count):
+    side, vertex_count = grid_size(vertex_count)
+    polygon_count = (side - 1) * (side - 1)
+
+    baseline = peak_rss()
+    start = time.perf_counter()
+    tree = VARIANTS[variant](side)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss()
+
+    # Vertex + Polygon, plus the VertexRef and Ref of every polygon when they are not shared.
+    node_count = vertex_count + polygon_count * (2 if variant == 'typed' else 3)
+    return {
+        'variant': variant,
+        'vertices': vertex_count,
+        'polygons': polygon_count,
+        'nodes': node_count,
+        'build_seconds': round(elapsed, 3),
+        'bytes_per_node': round((peak - baseline) / node_count, 1),
+        'peak_rss_mb': round(peak / float(1 << 20), 1),
+        'tree_size': len(tree),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--vertices', type=int, default=1000000)
+    parser.add_argument('--variant', choices=sorted(VARIANTS), help='measure a single variant in this process')
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(measure(args.variant, args.vertices)))
+        return
+
+    for variant in sorted(VARIANTS):
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--vertices', str(args.vertices), '--variant', variant],
+        )
+        result = json.loads(output.decode())
+        print('{variant:>6}: {vertices} vertices, {nodes} nodes, {bytes_per_node} bytes/node, '
+              'peak RSS {peak_rss_mb} MB, built in {build_seconds}s'.format(**result))
+
+
+if __name__ == '__main__':
+    main()
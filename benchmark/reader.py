@@ -0,0 +1,41 @@
+"""
+Throughput of the egg parser on the test files.
+
+    python benchmark/reader.py [--repeat 5] [files...]
+"""
+import argparse
+import os
+import time
+
+from common import ADDON_DIR, load_addon_module
+
+egg_reader = load_addon_module('egg_reader')
+
+DEFAULT_FILES = [
+    os.path.join(ADDON_DIR, 'test', 'files', 'panda.egg'),
+    os.path.join(ADDON_DIR, 'test', 'files', 'panda-model.egg'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('files', nargs='*', default=DEFAULT_FILES)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for filepath in args.files:
+        with open(filepath, encoding='UTF-8') as eggfile:
+            text = eggfile.read()
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            egg_reader.parse(text)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        print('{}: {:.1f} KB parsed in {:.3f}s ({:.1f} MB/s)'.format(
+            os.path.basename(filepath), len(text) / 1024.0, best, len(text) / best / (1 << 20),
+        ))
+
+
+if __name__ == '__main__':
+    main()
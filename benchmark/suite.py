@@ -0,0 +1,248 @@
+"""
+Benchmark suite of the egg construction, formatting and writing stages.
+
+Synthetic scenes (grids from 1k to 5M vertices, deep group hierarchies, meshes split over many materials) are timed
+stage by stage and the results written as JSON. compare flags the stages slower than a stored baseline.
+
+    python benchmark/suite.py run --output results.json [--sizes 1000,100000] [--repeat 3]
+    python benchmark/suite.py compare baseline.json results.json [--threshold 0.1]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from common import load_addon_module
+
+headless = load_addon_module('headless')
+# outside of blender, the save() stage runs on the headless bpy stand-in.
+bpy = headless.install()
+egg = load_addon_module('egg')
+egg_mesh = load_addon_module('egg_mesh')
+egg_blender_export = load_addon_module('egg_blender_export')
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000, 5000000)
+HIERARCHY_DEPTHS = (16, 256)
+MATERIAL_COUNTS = (8, 512)
+STAGES = ('construct', 'format_output', 'write', 'save')
+
+
+def grid(vertex_count):
+    """
+    Positions and triangles of a square grid of about vertex_count vertices.
+    """
+    side = max(2, int(round(vertex_count ** 0.5)))
+    x, y = np.meshgrid(np.arange(side, dtype=np.float64), np.arange(side, dtype=np.float64))
+    positions = np.stack([x.ravel(), y.ravel(), np.sin(x.ravel()) * 0.25], axis=1) * 0.1
+    first = (np.arange(side - 1)[:, None] * side + np.arange(side - 1)).ravel()
+    triangles = np.concatenate([
+        np.stack([first, first + 1, first + side + 1], axis=1),
+        np.stack([first, first + side + 1, first + side], axis=1),
+    ]).astype(np.int32)
+    return positions, triangles
+
+
+class Case():
+    """
+    A synthetic scene, built into an egg tree by construct().
+    """
+    def __init__(self, name, vertex_count, depth=1, material_count=1):
+        self.name = name
+        self.vertex_count = vertex_count
+        self.depth = depth
+        self.material_count = material_count
+        self.positions, self.triangles = grid(vertex_count)
+
+    def construct(self):
+        root = egg.Egg([egg.Entry('CoordinateSystem', content='Z-up')])
+        for material in range(self.material_count):
+            root.append(egg.Entry('Material', name='material{}'.format(material), content=[
+                egg.Entry('Scalar', name='diffr', content=str(material / float(self.material_count))),
+            ]))
+
+        parent = root
+        for level in range(self.depth - 1):
+            group = egg.Entry('Group', name='level{}'.format(level))
+            parent.append(group)
+            parent = group
+
+        mesh_entry = egg.Entry('Group', name=self.name)
+        parent.append(mesh_entry)
+        for material, triangles in enumerate(np.array_split(self.triangles, self.material_count)):
+            polygons = egg_mesh.polygon_entries(self.name, triangles)
+            if self.material_count > 1:
+                material_ref = egg.Entry('MRef', content='material{}'.format(material))
+                for polygon in polygons:
+                    polygon.contents.insert(0, material_ref)
+                mesh_entry.append(egg.Entry('Group', name='material{}'.format(material), content=polygons))
+            else:
+                mesh_entry.contents.extend(polygons)
+        root.append(egg.VertexPool(self.name, self.positions))
+        return root
+
+    def build_scene(self):
+        """
+        Replace the scenes of the bpy stand-in by the blender scene of the case.
+        """
+        bpy.data.clear()
+        materials = [headless.Material('material{}'.format(material)) for material in range(self.material_count)]
+        bpy.data.materials.extend(materials)
+        mesh = headless.Mesh(self.name)
+        mesh.from_pydata(self.positions, [], self.triangles)
+        mesh.materials.extend(materials)
+        mesh.polygons.foreach_set('material_index', np.concatenate([
+            np.full(len(triangles), material, dtype=np.int32)
+            for material, triangles in enumerate(np.array_split(self.triangles, self.material_count))
+        ]))
+        bpy.data.meshes.append(mesh)
+
+        objects = []
+        for level in range(self.depth - 1):
+            empty = headless.Object('level{}'.format(level))
+            empty.parent = objects[-1] if objects else None
+            objects.append(empty)
+        mesh_object = headless.Object(self.name, mesh)
+        mesh_object.parent = objects[-1] if objects else None
+        objects.append(mesh_object)
+        bpy.data.objects.extend(objects)
+        bpy.data.scenes.append(headless.Scene('scene', objects))
+
+
+def cases(sizes):
+    for size in sizes:
+        yield Case('grid{}'.format(size), size)
+    for depth in HIERARCHY_DEPTHS:
+        yield Case('hierarchy{}'.format(depth), 10000, depth=depth)
+    for material_count in MATERIAL_COUNTS:
+        yield Case('materials{}'.format(material_count), 100000, material_count=material_count)
+
+
+def time_stage(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_case(case, directory, repeat):
+    results = {}
+    results['construct'] = time_stage(case.construct, repeat)
+    tree = case.construct()
+    results['format_output'] = time_stage(tree.format_output, repeat)
+
+    export_settings = {
+        'egg_file_format': 'UTF-8',
+        'egg_filepath': os.path.join(directory, case.name + '.egg'),
+        'egg_exportdir': directory + '/',
+    }
+    results['write'] = time_stage(lambda: egg_blender_export._write(tree, export_settings), repeat)
+    if isinstance(bpy.data, headless.BlendData):
+        case.build_scene()
+        results['save'] = time_stage(lambda: egg_blender_export.save(bpy.context, export_settings), repeat)
+    else:
+        # never replace the scenes of a running blender.
+        results['save'] = None
+    return results
+
+
+def run(args):
+    sizes = [int(size) for size in args.sizes.split(',')]
+    directory = tempfile.mkdtemp()
+    records = []
+    try:
+        for case in cases(sizes):
+            results = run_case(case, directory, args.repeat)
+            for stage in STAGES:
+                records.append({
+                    'case': case.name,
+                    'vertices': len(case.positions),
+                    'triangles': len(case.triangles),
+                    'stage': stage,
+                    'seconds': results[stage],
+                })
+            print('{:>16}: {}'.format(case.name, ', '.join(
+                '{} {}'.format(stage, 'skipped' if results[stage] is None else '{:.3f}s'.format(results[stage]))
+                for stage in STAGES
+            )))
+    finally:
+        shutil.rmtree(directory)
+
+    output = {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+        },
+        'results': records,
+    }
+    with open(args.output, 'w') as output_file:
+        json.dump(output, output_file, indent=2)
+    print('results written to {}'.format(args.output))
+
+
+def compare(args):
+    """
+    Print the timing ratio of every stage against the baseline, returns 1 when a stage regressed.
+    """
+    def timings(path):
+        with open(path) as results_file:
+            records = json.load(results_file)['results']
+        return {(record['case'], record['stage']): record['seconds'] for record in records}
+
+    baseline = timings(args.baseline)
+    results = timings(args.results)
+    regressions = 0
+    for key in sorted(set(baseline) & set(results)):
+        before, after = baseline[key], results[key]
+        if before is None or after is None:
+            continue
+        ratio = after / before if before else float('inf')
+        regressed = after > before * (1.0 + args.threshold) and after - before > args.min_seconds
+        regressions += regressed
+        print('{:>16} {:>14}: {:.3f}s -> {:.3f}s ({:+.1%}){}'.format(
+            key[0], key[1], before, after, ratio - 1.0, '  REGRESSION' if regressed else '',
+        ))
+    print('{} regression(s)'.format(regressions))
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help='run the benchmarks and write the results as JSON')
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                            help='comma separated vertex counts of the grid cases')
+    run_parser.add_argument('--repeat', type=int, default=1, help='the best time of the repetitions is kept')
+
+    compare_parser = subparsers.add_parser('compare', help='compare results against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('results')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='relative slowdown reported as a regression')
+    compare_parser.add_argument('--min-seconds', type=float, default=0.01,
+                                help='slowdowns under this duration are ignored as noise')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    elif args.command == 'compare':
+        sys.exit(compare(args))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,57 +1,662 @@
+import gzip
+import io
+import queue
+import re
+import threading
+
+import numpy as np
+
+
 INDENT = '    '
+CHUNK_SIZE = 1 << 16
+POOL_CHUNK_ROWS = 4096
+# Values per line of the <V> entries of animation tables.
+ANIM_ROW_VALUES = 16
+COMPRESS_QUEUE_CHUNKS = 16
+# Characters a bare egg word cannot hold, names with any of them are written as quoted strings.
+UNSAFE_NAME_PATTERN = re.compile(r'[\s{}"<>]')
+QUOTED_NAME_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"\Z')
+# Values scaled to their last decimal must stay under this to fit in an int64 when counting their trailing zeros.
+MAX_SCALED = float(1 << 62)
 
 
-class Entry():
+class EggWriter():
+    """
+    Streaming output for Entry trees.
+    Lines are indented according to the current depth and pushed to the stream in chunks of roughly `chunk_size`
+    characters, so the memory used while writing does not depend on the size of the tree. When `encoding` is None the
+    stream is expected to accept str (e.g. io.StringIO), otherwise it is a binary stream and chunks are encoded.
+    """
+    def __init__(self, stream, encoding=None, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.depth = 0
+        self._indents = ['']
+        self._pending = []
+        self._pending_size = 0
+
+    @property
+    def indent(self):
+        """
+        Indentation string for the current depth.
+        """
+        while len(self._indents) <= self.depth:
+            self._indents.append(self._indents[-1] + INDENT)
+        return self._indents[self.depth]
+
+    def write_line(self, line):
+        """
+        Write a single line at the current depth.
+        """
+        self.write(self.indent + line + '\n' if line else '\n')
+
+    def write(self, text):
+        """
+        Write already indented text, it must end with a new line.
+        """
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        chunk = ''.join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        self.stream.write(chunk if self.encoding is None else chunk.encode(self.encoding))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.flush()
+
+
+class ThreadedGzipStream():
+    """
+    Binary stream compressing what is written to it with gzip on a background thread.
+    zlib releases the GIL, so compression overlaps with the serialization feeding the stream. At most max_pending
+    chunks wait for the compressor, the writer blocks beyond that. Panda3D reads gzip compressed .egg.pz files directly.
+    """
+    def __init__(self, fileobj, compresslevel=6, max_pending=COMPRESS_QUEUE_CHUNKS):
+        self._queue = queue.Queue(max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._compress, args=(fileobj, compresslevel))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _compress(self, fileobj, compresslevel):
+        try:
+            with gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=compresslevel) as compressed:
+                while True:
+                    data = self._queue.get()
+                    if data is None:
+                        return
+                    compressed.write(data)
+        except Exception as error:
+            self._error = error
+            # keep consuming so the writer never blocks on a full queue.
+            while self._queue.get() is not None:
+                pass
+
+    def write(self, data):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(data)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+class FloatFormat():
+    """
+    Fixed point formatting of float arrays, with a number of decimals per attribute class: position (also used for
+    morph deltas), normal, uv, color and animation. Trailing zeros are trimmed, 0.500000 is written 0.5 and 2.000000 is
+    written 2. The trimmed number of decimals of every value is computed with NumPy and given to a '%.*f' conversion,
+    so whole arrays are formatted by a single %-format call.
+    """
+    __slots__ = ('precision',)
+
+    def __init__(self, position=6, normal=6, uv=6, color=6, animation=6):
+        self.precision = {'position': position, 'normal': normal, 'uv': uv, 'color': color, 'animation': animation}
+        for attribute, precision in self.precision.items():
+            if not isinstance(precision, int) or precision < 0:
+                raise ValueError('invalid {} precision: {!r}'.format(attribute, precision))
+
+    def decimals(self, values, precisions):
+        """
+        Number of decimals of each of the (n, k) values once trimmed, column j being rounded to precisions[j]
+        decimals. The values are returned too, with the ones rounding to zero replaced by 0 so none is written -0.
+        """
+        precisions = np.asarray(precisions, dtype=np.int64)
+        scaled = np.rint(np.abs(values) * 10.0 ** precisions)
+        values = np.where(scaled == 0, 0.0, values)
+        # decimals of values too large to be scaled in an int64 are meaningless, they are dropped.
+        limits = np.where(scaled < MAX_SCALED, precisions, 0)
+        scaled = np.minimum(scaled, MAX_SCALED).astype(np.int64)
+        decimals = limits.copy()
+        for digits in range(1, int(precisions.max(initial=0)) + 1):
+            decimals -= (scaled % 10 ** digits == 0) & (limits >= digits)
+        return decimals, values
+
+    def format_array(self, values, attribute):
+        """
+        Strings of an array of values of an attribute class, in row order.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = values.reshape(-1, values.shape[-1] if values.ndim > 1 else 1)
+        decimals, values = self.decimals(values, [self.precision[attribute]] * values.shape[1])
+        return (('%.*f\n' * values.size) % precision_arguments(decimals, values)).split('\n')[:-1]
+
+    def __eq__(self, other):
+        return isinstance(other, FloatFormat) and self.precision == other.precision
+
+    def __repr__(self):
+        return 'FloatFormat({})'.format(', '.join('{}={}'.format(key, value) for key, value in self.precision.items()))
+
+
+class Node():
+    """
+    Base of every entry of an EGG file.
+    Subclasses provide `type`, `name` and the sequence of `contents`, the output format is shared. Nodes use __slots__
+    since large scenes create millions of them.
+    """
+    __slots__ = ()
+    type = None
+    name = None
+
+    def count(self):
+        return len(self.contents)
+
+    def write(self, writer):
+        """
+        Stream the entry and all of its contents to an EggWriter.
+        """
+        contents = self.contents
+        if self.type is None:
+            for index, content in enumerate(contents):
+                if index:
+                    writer.write_line('')
+                _write_content(writer, content)
+            return
+
+        header = '<{}>{} {{'.format(self.type, '' if self.name is None else ' ' + quote_name(self.name))
+        count = len(contents)
+        if count == 1 and not isinstance(contents[0], Node):
+            writer.write_line('{} {} }}'.format(header, _format_value(contents[0])))
+        elif count:
+            writer.write_line(header)
+            writer.depth += 1
+            for content in contents:
+                _write_content(writer, content)
+            writer.depth -= 1
+            writer.write_line('}')
+        else:
+            writer.write_line(header + '}')
+
+    def format_output(self):
+        return str(self).split('\n')
+
+    def __len__(self):
+        return self.count()
+
+    def __str__(self):
+        output = io.StringIO()
+        with EggWriter(output) as writer:
+            self.write(writer)
+        return output.getvalue()[:-1]
+
+    def __repr__(self):
+        return '{} "{}" object at {}'.format(self.type, self.name, hex(id(self)))
+
+
+class Entry(Node):
     """
     Representation of an Entry in an EGG file.
-    NOTE: If performance becomes an issue for large scene, consider using __slots__ to save space and speed up Entry
-    management.
+    An Entry with a None type is the root of an egg file, its contents are written one after the other, separated by
+    empty lines.
     """
-    def __init__(self, entry_type, name=None, content=[]):
+    __slots__ = ('type', 'name', '_contents')
+
+    def __init__(self, entry_type, name=None, content=None):
         self.type = entry_type
-        if isinstance(content, list):
+        if content is None:
+            self._contents = []
+        elif isinstance(content, list):
             self._contents = content
         else:
             self._contents = [content]
         self.name = name
 
-    def count(self):
-        return len(self._contents)
+    @property
+    def contents(self):
+        return self._contents
 
     def append(self, entry):
         self._contents.append(entry)
 
-    def format_output(self):
-        output_lines = []
-        output_lines.append('<{}>{} {{'.format(self.type, '' if not self.name else ' {}'.format(self.name)))
-        if self.count() > 1:
-            for content in self._contents:
-                if isinstance(content, Entry):
-                    output_lines.extend([INDENT + line for line in content.format_output()])
-                elif isinstance(content, tuple):
-                    output_lines.append(INDENT + ' '.join(str(x) for x in content))
-                else:
-                    output_lines.append(INDENT + content)
-            output_lines.append('}')
-        elif self.count() == 1:
-            content = self._contents[0]
-            if isinstance(content, Entry):
-                output_lines.extend([INDENT + line for line in content.format_output()])
-                output_lines.append('}')
-            elif isinstance(content, tuple):
-                output_lines[-1] += ' {} }}'.format(' '.join(str(x) for x in content))
-            else:
-                output_lines[-1] += ' {} }}'.format(content)
+
+class Egg(Entry):
+    """
+    Root of an egg file.
+    """
+    __slots__ = ()
+
+    def __init__(self, content=None):
+        super(Egg, self).__init__(None, content=content)
+
+
+class Vertex(Node):
+    """
+    <Vertex> entry, the position is stored apart from the optional attribute entries (<Normal>, <UV>, ...).
+    """
+    __slots__ = ('name', 'position', 'attributes')
+    type = 'Vertex'
+
+    def __init__(self, index, position, attributes=None):
+        self.name = index
+        self.position = position
+        self.attributes = attributes
+
+    @property
+    def contents(self):
+        if self.attributes is None:
+            return (self.position,)
+        return [self.position] + self.attributes
+
+    def append(self, entry):
+        if self.attributes is None:
+            self.attributes = []
+        self.attributes.append(entry)
+
+
+class Polygon(Node):
+    """
+    <Polygon> entry, contains the polygon attributes and its <VertexRef>.
+    """
+    __slots__ = ('_contents',)
+    type = 'Polygon'
+
+    def __init__(self, content=None):
+        if content is None:
+            self._contents = []
+        elif isinstance(content, list):
+            self._contents = content
         else:
-            output_lines[-1] += '}'
+            self._contents = [content]
 
-        return output_lines
+    @property
+    def contents(self):
+        return self._contents
 
-    def __len__(self):
-        return self.count()
+    def append(self, entry):
+        self._contents.append(entry)
 
-    def __str__(self):
-        return '\n'.join(self.format_output())
 
-    def __repr__(self):
-        return '{} "{}" object at {}'.format(self.type, self.name, hex(id(self)))
+class VertexRef(Node):
+    """
+    <VertexRef> entry, a tuple of vertex indices in the referenced pool.
+    """
+    __slots__ = ('indices', 'ref')
+    type = 'VertexRef'
+
+    def __init__(self, indices, ref):
+        self.indices = indices
+        self.ref = ref
+
+    @property
+    def contents(self):
+        return (self.indices, self.ref)
+
+
+class Ref(Node):
+    """
+    <Ref> entry naming a vertex pool. A single Ref can be shared by all the VertexRef of a pool.
+    """
+    __slots__ = ('pool',)
+    type = 'Ref'
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    @property
+    def contents(self):
+        return (quote_name(self.pool),)
+
+
+class VertexPool(Node):
+    """
+    <VertexPool> entry storing its vertices as contiguous columns instead of one Vertex node per vertex.
+    positions, normals and colors are (n, 3), (n, 3) and (n, 4) arrays, uvs and morphs are lists of (name, array) pairs
+    with (n, 2) and (n, 3) arrays. A None uv name writes an unnamed <UV>. Morph deltas are only written for the
+    vertices they move. Rows are formatted in bulk, a block of vertices at a time, with float_format (a FloatFormat)
+    or as the exact repr of the values when it is None. Vertices are numbered from first_index, which lets a pool be
+    split into row ranges (see rows()).
+    """
+    __slots__ = ('name', 'positions', 'normals', 'uvs', 'colors', 'morphs', 'first_index', 'float_format')
+    type = 'VertexPool'
+
+    def __init__(
+        self, name, positions, normals=None, uvs=None, colors=None, morphs=None, first_index=0, float_format=None,
+    ):
+        self.name = name
+        self.first_index = first_index
+        self.float_format = float_format
+        self.positions = _column(positions, 3)
+        self.normals = None if normals is None else _column(normals, 3)
+        self.uvs = [(uv_name, _column(uv, 2)) for uv_name, uv in uvs or ()]
+        self.colors = None if colors is None else _column(colors, 4)
+        self.morphs = [(morph_name, _column(deltas, 3)) for morph_name, deltas in morphs or ()]
+
+    def count(self):
+        return len(self.positions)
+
+    @property
+    def contents(self):
+        """
+        The pool as Vertex nodes, only meant for inspection since it creates one node per vertex.
+        """
+        return [self._vertex(index) for index in range(self.count())]
+
+    def rows(self, start, stop):
+        """
+        Pool holding the vertices [start, stop) of this one, keeping their numbering.
+        """
+        return VertexPool(
+            self.name,
+            self.positions[start:stop],
+            normals=None if self.normals is None else self.normals[start:stop],
+            uvs=[(uv_name, uv[start:stop]) for uv_name, uv in self.uvs],
+            colors=None if self.colors is None else self.colors[start:stop],
+            morphs=[(morph_name, deltas[start:stop]) for morph_name, deltas in self.morphs],
+            first_index=self.first_index + start,
+            float_format=self.float_format,
+        )
+
+    def _vertex(self, index):
+        vertex = Vertex(self.first_index + index, tuple(self.positions[index].tolist()))
+        if self.normals is not None:
+            vertex.append(Entry('Normal', content=tuple(self.normals[index].tolist())))
+        for uv_name, uv in self.uvs:
+            vertex.append(Entry('UV', name=uv_name, content=tuple(uv[index].tolist())))
+        if self.colors is not None:
+            vertex.append(Entry('RGBA', content=tuple(self.colors[index].tolist())))
+        for morph_name, deltas in self.morphs:
+            if deltas[index].any():
+                vertex.append(Entry('Dxyz', name=morph_name, content=tuple(deltas[index].tolist())))
+        return vertex
+
+    def write(self, writer):
+        count = self.count()
+        header = '<VertexPool> {} {{'.format(quote_name(self.name))
+        if not count:
+            writer.write_line(header + '}')
+            return
+
+        writer.write_line(header)
+        writer.depth += 1
+        self.write_rows(writer)
+        writer.depth -= 1
+        writer.write_line('}')
+
+    def write_rows(self, writer):
+        """
+        Write the <Vertex> entries of the pool, without the <VertexPool> header.
+        """
+        count = self.count()
+        columns = [('position', self.positions)]
+        if self.normals is not None:
+            columns.append(('normal', self.normals))
+        columns.extend(('uv', uv) for _, uv in self.uvs)
+        if self.colors is not None:
+            columns.append(('color', self.colors))
+        fixed_width = 1 + sum(column.shape[1] for _, column in columns)
+        columns.extend(('position', deltas) for _, deltas in self.morphs)
+        precisions = None
+        if self.float_format is not None:
+            precisions = [0]
+            for attribute, column in columns:
+                precisions.extend([self.float_format.precision[attribute]] * column.shape[1])
+
+        # moved[i, j] is set when morph j moves vertex i. Rows moved by the same morphs share a template, found by the
+        # key of their row of moved flags: its index among the unique rows of packed flags.
+        moved = np.zeros((count, len(self.morphs)), dtype=bool)
+        for column, (_, deltas) in enumerate(self.morphs):
+            moved[:, column] = np.any(deltas != 0, axis=1)
+        if self.morphs:
+            keys = np.unique(np.packbits(moved, axis=1), axis=0, return_inverse=True)[1].reshape(-1)
+        else:
+            keys = np.zeros(count, dtype=np.intp)
+        templates = {}
+        for start in range(0, count, POOL_CHUNK_ROWS):
+            stop = min(start + POOL_CHUNK_ROWS, count)
+            indices = np.arange(self.first_index + start, self.first_index + stop, dtype=np.float64)[:, None]
+            values = np.hstack([indices] + [column[start:stop] for _, column in columns])
+            if precisions is not None:
+                decimals, values = self.float_format.decimals(values, precisions)
+            breaks = np.flatnonzero(keys[start + 1:stop] != keys[start:stop - 1]) + 1
+            for run_start, run_stop in zip([0] + breaks.tolist(), breaks.tolist() + [stop - start]):
+                key = int(keys[start + run_start])
+                if key not in templates:
+                    templates[key] = self._row_template(writer.indent, moved[start + run_start], fixed_width)
+                template, selected = templates[key]
+                rows = values[run_start:run_stop, selected]
+                if precisions is None:
+                    arguments = tuple(rows.ravel().tolist())
+                else:
+                    arguments = precision_arguments(decimals[run_start:run_stop, selected], rows)
+                writer.write((template * (run_stop - run_start)) % arguments)
+
+    def _row_template(self, indent, moved, fixed_width):
+        """
+        %-format template of a single <Vertex> moved by the morphs flagged in moved, and the value columns it consumes.
+        """
+        conversion = '%r' if self.float_format is None else '%.*f'
+
+        def values(size):
+            return ' '.join([conversion] * size)
+
+        attributes = []
+        if self.normals is not None:
+            attributes.append('<Normal> {{ {} }}'.format(values(3)))
+        for uv_name, _ in self.uvs:
+            attributes.append('<UV>{} {{ {} }}'.format(
+                '' if uv_name is None else ' ' + _escape(quote_name(uv_name)), values(2),
+            ))
+        if self.colors is not None:
+            attributes.append('<RGBA> {{ {} }}'.format(values(4)))
+        selected = list(range(fixed_width))
+        for column, (morph_name, _) in enumerate(self.morphs):
+            if moved[column]:
+                attributes.append('<Dxyz> {} {{ {} }}'.format(_escape(quote_name(morph_name)), values(3)))
+                selected.extend(range(fixed_width + 3 * column, fixed_width + 3 * column + 3))
+
+        index = '%d' if self.float_format is None else '%.*f'
+        if not attributes:
+            return '{}<Vertex> {} {{ {} }}\n'.format(indent, index, values(3)), selected
+        inner = indent + INDENT
+        lines = ['{}<Vertex> {} {{'.format(indent, index), inner + values(3)]
+        lines.extend(inner + attribute for attribute in attributes)
+        lines.append(indent + '}')
+        return '\n'.join(lines) + '\n', selected
+
+
+class Values(Node):
+    """
+    <V> entry of an animation table storing its values as an array instead of strings.
+    Values are written width per line, formatted in bulk a block of lines at a time with the animation precision of
+    float_format (a FloatFormat), or as their exact repr when it is None. A single line of values is written on the
+    line of the entry.
+    """
+    __slots__ = ('values', 'width', 'float_format')
+    type = 'V'
+
+    def __init__(self, values, width=ANIM_ROW_VALUES, float_format=None):
+        self.values = np.asarray(values, dtype=np.float64).ravel()
+        self.width = width
+        self.float_format = float_format
+
+    def count(self):
+        return -(-len(self.values) // self.width)
+
+    @property
+    def contents(self):
+        """
+        The lines of values as tuples, only meant for inspection.
+        """
+        values = self.values.tolist()
+        return [tuple(values[start:start + self.width]) for start in range(0, len(values), self.width)]
+
+    def write(self, writer):
+        count = len(self.values)
+        if count <= self.width:
+            writer.write_line('<V> {{ {}}}'.format(self._format(self.values[None], '', ' ')) if count else '<V> {}')
+            return
+
+        writer.write_line('<V> {')
+        writer.depth += 1
+        indent = writer.indent
+        full = count - count % self.width
+        lines = self.values[:full].reshape(-1, self.width)
+        for start in range(0, len(lines), POOL_CHUNK_ROWS):
+            writer.write(self._format(lines[start:start + POOL_CHUNK_ROWS], indent, '\n'))
+        if full < count:
+            writer.write(self._format(self.values[None, full:], indent, '\n'))
+        writer.depth -= 1
+        writer.write_line('}')
+
+    def _format(self, lines, indent, end):
+        """
+        Text of (n, k) values, a line of k values per row, each one starting with indent and ending with end.
+        """
+        if self.float_format is None:
+            template = indent + ' '.join(['%r'] * lines.shape[1]) + end
+            return (template * len(lines)) % tuple(lines.ravel().tolist())
+        template = indent + ' '.join(['%.*f'] * lines.shape[1]) + end
+        decimals, lines = self.float_format.decimals(lines, [self.float_format.precision['animation']] * lines.shape[1])
+        return (template * len(lines)) % precision_arguments(decimals, lines)
+
+
+class Chunk(Node):
+    """
+    Egg text formatted ahead of time, e.g. by a worker process.
+    text is a str or a future resolving to one, it is written verbatim and must have been formatted for the depth the
+    chunk is written at.
+    """
+    __slots__ = ('text', 'depth')
+
+    def __init__(self, text, depth=0):
+        self.text = text
+        self.depth = depth
+
+    @property
+    def contents(self):
+        return (self.text,)
+
+    def write(self, writer):
+        if writer.depth != self.depth:
+            raise ValueError('chunk formatted for depth {} written at depth {}'.format(self.depth, writer.depth))
+        writer.write(self.text if isinstance(self.text, str) else self.text.result())
+
+
+class Tee(Node):
+    """
+    Node written as is, its text also handed to `callback` once written, e.g. to cache it as it is streamed out.
+    Only the text of the node is held in memory, not the one of the rest of the file.
+    """
+    __slots__ = ('node', 'callback')
+
+    def __init__(self, node, callback):
+        self.node = node
+        self.callback = callback
+
+    @property
+    def contents(self):
+        return (self.node,)
+
+    def write(self, writer):
+        parts = []
+        with EggWriter(_TeeStream(writer, parts), chunk_size=writer.chunk_size) as tee_writer:
+            tee_writer.depth = writer.depth
+            self.node.write(tee_writer)
+        self.callback(''.join(parts))
+
+
+class _TeeStream():
+    """
+    str stream writing to an EggWriter and to a list of parts.
+    """
+    def __init__(self, writer, parts):
+        self._writer = writer
+        self._parts = parts
+
+    def write(self, text):
+        self._parts.append(text)
+        self._writer.write(text)
+
+
+def format_nodes(nodes, depth=0):
+    """
+    Text of nodes written one after the other at the given depth.
+    """
+    output = io.StringIO()
+    with EggWriter(output) as writer:
+        writer.depth = depth
+        for node in nodes:
+            node.write(writer)
+    return output.getvalue()
+
+
+def quote_name(name):
+    """
+    Name as written in egg text. Names holding whitespace, braces, quotes or <> are quoted, their backslashes and
+    quotes escaped. Names that already are a quoted string, like the ones read by egg_reader, are kept as they are.
+    """
+    name = str(name)
+    if QUOTED_NAME_PATTERN.match(name) or (name and not UNSAFE_NAME_PATTERN.search(name)):
+        return name
+    return '"{}"'.format(name.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def precision_arguments(decimals, values):
+    """
+    %-format arguments of values for '%.*f' conversions: the (decimals, value) pairs, flattened in row order.
+    """
+    arguments = [0] * (2 * values.size)
+    arguments[::2] = decimals.ravel().tolist()
+    arguments[1::2] = values.ravel().tolist()
+    return tuple(arguments)
+
+
+def _column(values, width):
+    return np.asarray(values, dtype=np.float64).reshape(-1, width)
+
+
+def _escape(name):
+    return str(name).replace('%', '%%')
+
+
+def _format_value(value):
+    if isinstance(value, tuple):
+        return ' '.join(str(x) for x in value)
+    return str(value)
+
+
+def _write_content(writer, content):
+    if isinstance(content, Node):
+        content.write(writer)
+    else:
+        writer.write_line(_format_value(content))
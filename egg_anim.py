@@ -0,0 +1,680 @@
+import math
+import re
+
+import numpy as np
+
+from .egg import Entry, Values
+from .egg_cache import content_key
+from .egg_mesh import foreach_get
+
+# enum values of keyframe interpolations, as foreach_get reads them.
+CONSTANT, LINEAR, BEZIER = 0, 1, 2
+# Newton steps solving bezier segments for the parameter of a frame, a step leaving the bracket of the root bisects it.
+BEZIER_STEPS = 16
+FLT_EPSILON = 1.1920929e-07
+XFORM_CONTENTS = 'ijkprhxyz'
+# value of the ijkprhxyz components left out of a <Xfm$Anim_S$>.
+XFORM_DEFAULTS = (1.0, 1.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+# transform channels of pose bones and objects animated by F-curves and their number of components.
+BONE_CHANNELS = (('location', 3), ('rotation_quaternion', 4), ('rotation_euler', 3), ('rotation_axis_angle', 4),
+                 ('scale', 3))
+_OBJECT_PATH = re.compile(r'^(location|rotation_quaternion|rotation_euler|rotation_axis_angle|scale)$')
+_BONE_PATH = re.compile(r'^pose\.bones\["(.+)"\]\.(\w+)$')
+_KEY_BLOCK_PATH = re.compile(r'^key_blocks\["(.+)"\]\.value$')
+
+
+def sample_fcurves(fcurves, frames):
+    """
+    (c, f) values of F-curves at increasing frames, without evaluating the scene.
+    Bezier, linear and constant keyframes are read with foreach_get and evaluated for every curve and frame at once,
+    following blender's fcurve_eval_keyframes, including its constant and linear extrapolations. Curves with modifiers
+    or other interpolations (easing, elastic...) are evaluated by fcurve.evaluate(), one frame at a time.
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    values = np.zeros((len(fcurves), len(frames)))
+    keyframes = []
+    for row, fcurve in enumerate(fcurves):
+        points = fcurve.keyframe_points
+        if not len(points):
+            continue
+        interpolation = foreach_get(points, 'interpolation', np.int32)
+        if fcurve.modifiers or interpolation.max() > BEZIER:
+            values[row] = [fcurve.evaluate(frame) for frame in frames.tolist()]
+            continue
+        keyframes.append((
+            row, foreach_get(points, 'co', np.float32, 2), foreach_get(points, 'handle_left', np.float32, 2),
+            foreach_get(points, 'handle_right', np.float32, 2), interpolation, fcurve.extrapolation == 'LINEAR',
+        ))
+    if keyframes and len(frames):
+        rows, co, left, right, interpolation, linear = zip(*keyframes)
+        values[list(rows)] = _evaluate_keyframes(
+            [len(points) for points in co], np.concatenate(co).astype(np.float64),
+            np.concatenate(left).astype(np.float64), np.concatenate(right).astype(np.float64),
+            np.concatenate(interpolation), np.array(linear), frames,
+        )
+    return values
+
+
+def _evaluate_keyframes(counts, co, left, right, interpolation, linear, frames):
+    """
+    (c, f) values of c curves given their keyframes concatenated in flat arrays, counts keyframes each.
+    """
+    counts = np.array(counts, dtype=np.int64)
+    curve_count = len(counts)
+    first = np.cumsum(counts) - counts
+    last = first + counts - 1
+
+    # keys[c, i] is the number of keyframes of curve c at or before frame i.
+    keys = np.zeros((curve_count, len(frames) + 1), dtype=np.int64)
+    np.add.at(keys, (np.repeat(np.arange(curve_count), counts), np.searchsorted(frames, co[:, 0])), 1)
+    keys = np.cumsum(keys, axis=1)[:, :-1]
+    frame = np.broadcast_to(frames, keys.shape)
+
+    values = np.empty(keys.shape)
+    before = frame <= co[first, 0][:, None]
+    after = ~before & (frame >= co[last, 0][:, None])
+    for mask, end, neighbour, handle in ((before, first, first + 1, left), (after, last, last - 1, right)):
+        curves, columns = np.nonzero(mask)
+        key = end[curves]
+        # linear extrapolation follows the neighbouring key of linear keys and the outer handle of bezier keys.
+        other = np.where(
+            (interpolation[key] == LINEAR)[:, None],
+            co[np.where(counts[curves] > 1, neighbour[curves], key)],
+            handle[key],
+        )
+        span = co[key, 0] - other[:, 0]
+        slope = np.where(span != 0, (co[key, 1] - other[:, 1]) / np.where(span != 0, span, 1.0), 0.0)
+        slope[~linear[curves] | (interpolation[key] == CONSTANT)] = 0.0
+        values[curves, columns] = co[key, 1] + slope * (frame[curves, columns] - co[key, 0])
+
+    curves, columns = np.nonzero(~before & ~after)
+    key = first[curves] + keys[curves, columns] - 1
+    at = frame[curves, columns]
+    x0, y0 = co[key, 0], co[key, 1]
+    x3, y3 = co[key + 1, 0], co[key + 1, 1]
+    inside = np.where(interpolation[key] == CONSTANT, y0, y0 + (y3 - y0) * (at - x0) / (x3 - x0))
+    bezier = np.flatnonzero(interpolation[key] == BEZIER)
+    if len(bezier):
+        inside[bezier] = _bezier_values(
+            co[key[bezier]], right[key[bezier]], left[key[bezier] + 1], co[key[bezier] + 1], at[bezier],
+        )
+    values[curves, columns] = np.where(at == x0, y0, inside)
+    return values
+
+
+def _bezier_values(v1, v2, v3, v4, frames):
+    """
+    Values at frames of (m, 2) bezier segments from v1 to v4, with handles v2 and v3.
+    The handles are shortened like blender's correct_bezpart so the frame of the curve is increasing, then the
+    parameter of every frame is solved by safeguarded Newton steps.
+    """
+    h1 = v1 - v2
+    h2 = v4 - v3
+    length = v4[:, 0] - v1[:, 0]
+    total = np.abs(h1[:, 0]) + np.abs(h2[:, 0])
+    factor = np.where(total > length, length / np.where(total > 0, total, 1.0), 1.0)[:, None]
+    v2 = v1 - factor * h1
+    v3 = v4 - factor * h2
+
+    # power basis of the frame x(t) and the value y(t) of the segments.
+    a = -v1 + 3 * v2 - 3 * v3 + v4
+    b = 3 * v1 - 6 * v2 + 3 * v3
+    c = -3 * v1 + 3 * v2
+    d = v1
+    low = np.zeros(len(frames))
+    high = np.ones(len(frames))
+    t = (frames - v1[:, 0]) / length
+    for _ in range(BEZIER_STEPS):
+        error = ((a[:, 0] * t + b[:, 0]) * t + c[:, 0]) * t + d[:, 0] - frames
+        slope = (3 * a[:, 0] * t + 2 * b[:, 0]) * t + c[:, 0]
+        low = np.where(error < 0, t, low)
+        high = np.where(error > 0, t, high)
+        step = t - error / np.where(slope != 0, slope, np.inf)
+        t = np.where(error == 0, t, np.where((step > low) & (step < high), step, (low + high) / 2))
+    return ((a[:, 1] * t + b[:, 1]) * t + c[:, 1]) * t + d[:, 1]
+
+
+def basis_matrices(rotation_mode, location, rotation_quaternion, rotation_euler, rotation_axis_angle, scale):
+    """
+    (f, 4, 4) local transforms of a pose bone from its (f, k) channels, as blender builds its matrix_basis: the
+    rotation of its rotation mode applied after the scale, then the location.
+    """
+    if rotation_mode == 'QUATERNION':
+        rotation = quaternion_matrices(rotation_quaternion)
+    elif rotation_mode == 'AXIS_ANGLE':
+        axis = rotation_axis_angle[:, 1:]
+        length = np.linalg.norm(axis, axis=1)
+        half = rotation_axis_angle[:, 0] / 2
+        sine = np.where(length > 0, np.sin(half) / np.where(length > 0, length, 1.0), 0.0)
+        rotation = quaternion_matrices(np.hstack([
+            np.where(length > 0, np.cos(half), 1.0)[:, None], axis * sine[:, None],
+        ]))
+    else:
+        rotation = np.broadcast_to(np.identity(3), (len(scale), 3, 3))
+        for axis, angles in zip(rotation_mode, rotation_euler.T):
+            rotation = np.matmul(_axis_rotations(axis, angles), rotation)
+    matrices = np.zeros((len(scale), 4, 4))
+    matrices[:, :3, :3] = rotation * scale[:, None, :]
+    matrices[:, :3, 3] = location
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+
+def quaternion_matrices(quaternions):
+    """
+    (f, 3, 3) rotations of (f, 4) (w, x, y, z) quaternions, normalized first. Null quaternions are the identity.
+    """
+    length = np.linalg.norm(quaternions, axis=1)[:, None]
+    w, x, y, z = np.where(length > 0, quaternions / np.where(length > 0, length, 1.0), (1.0, 0.0, 0.0, 0.0)).T
+    return np.stack([
+        1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y),
+        2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x),
+        2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y),
+    ], axis=1).reshape(-1, 3, 3)
+
+
+def _axis_rotations(axis, angles):
+    cos, sin = np.cos(angles), np.sin(angles)
+    zero, one = np.zeros_like(angles), np.ones_like(angles)
+    rows = {
+        'X': (one, zero, zero, zero, cos, -sin, zero, sin, cos),
+        'Y': (cos, zero, sin, zero, one, zero, -sin, zero, cos),
+        'Z': (cos, -sin, zero, sin, cos, zero, zero, zero, one),
+    }[axis]
+    return np.stack(rows, axis=1).reshape(-1, 3, 3)
+
+
+def world_matrices(blend_object, frames):
+    """
+    (f, 4, 4) world transforms of an object at frames: its location, rotation and scale sampled from the F-curves of
+    its active action, the ones it does not animate keeping their current value, under the current transform of its
+    parent. None when they depend on more than that (see _evaluated_world()) and have to be read from the scene
+    evaluated at every frame.
+    """
+    if _evaluated_world(blend_object):
+        return None
+    frames = np.asarray(frames, dtype=np.float64)
+    animation_data = blend_object.animation_data
+    action = animation_data.action if animation_data is not None else None
+    channels = {}
+    fcurves = []
+    for fcurve in action.fcurves if action is not None else ():
+        if _OBJECT_PATH.match(fcurve.data_path) and not fcurve.mute:
+            channels.setdefault(fcurve.data_path, []).append((fcurve.array_index, len(fcurves)))
+            fcurves.append(fcurve)
+    if not fcurves:
+        return np.tile(np.array(blend_object.matrix_world, dtype=np.float64), (len(frames), 1, 1))
+    basis = basis_matrices(blend_object.rotation_mode, **_channel_arrays(
+        blend_object, channels, sample_fcurves(fcurves, frames), len(frames),
+    ))
+    if blend_object.parent is None:
+        return basis
+    return np.matmul(np.dot(
+        np.array(blend_object.parent.matrix_world, dtype=np.float64),
+        np.array(blend_object.matrix_parent_inverse, dtype=np.float64),
+    ), basis)
+
+
+def _evaluated_world(blend_object):
+    """
+    Whether the world transform of an object depends on more than its transform channels and the current transform of
+    its parent: constraints, drivers (other than the ones of its pose bones) or NLA tracks of the object, or parents
+    that are animated or constrained themselves, or that are not objects (bones, vertices).
+    """
+    animation_data = blend_object.animation_data
+    if blend_object.constraints or (animation_data is not None and (len(animation_data.nla_tracks) or any(
+            not _BONE_PATH.match(driver.data_path) for driver in animation_data.drivers))):
+        return True
+    child = blend_object
+    while child.parent is not None:
+        parent = child.parent
+        if child.parent_type != 'OBJECT' or parent.constraints or parent.animation_data is not None:
+            return True
+        child = parent
+    return False
+
+
+def _channel_arrays(owner, channels, values, count):
+    """
+    (f, k) arrays of the transform channels of an object or pose bone, by name: the rows of values of the components
+    listed in channels, the current value for the others.
+    """
+    arrays = {}
+    for channel, width in BONE_CHANNELS:
+        array = np.tile(np.array(tuple(getattr(owner, channel)), dtype=np.float64), (count, 1))
+        for index, row in channels.get(channel, ()):
+            if index < width:
+                array[:, index] = values[row]
+        arrays[channel] = array
+    return arrays
+
+
+def armature_matrices(armature_object, frames, scene, sampler=None):
+    """
+    (f, 4, 4) transforms of every bone of an armature at frames, by bone name: relative to the parent bone, or to the
+    world for root bones. The pose channels of the active action are sampled from its F-curves, the ones it does not
+    animate keep their current value, and so is the transform of the armature object (see world_matrices()). Bones
+    whose pose depends on more than their channels, the ones with constraints, drivers or not inheriting the rotation
+    or scale of their parent, and the root bones of an armature object whose world transform does, are read from the
+    pose evaluated at every frame instead. They are added to the sampler when one is given, and only filled in once it
+    has run.
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    animation_data = armature_object.animation_data
+    action = animation_data.action if animation_data is not None else None
+    driven = set()
+    for driver in animation_data.drivers if animation_data is not None else ():
+        match = _BONE_PATH.match(driver.data_path)
+        if match:
+            driven.add(match.group(1))
+
+    channels = {}
+    fcurves = []
+    for fcurve in action.fcurves if action is not None else ():
+        match = _BONE_PATH.match(fcurve.data_path)
+        if match and not fcurve.mute:
+            bone_channels = channels.setdefault(match.group(1), {})
+            bone_channels.setdefault(match.group(2), []).append((fcurve.array_index, len(fcurves)))
+            fcurves.append(fcurve)
+    values = sample_fcurves(fcurves, frames)
+
+    world = world_matrices(armature_object, frames)
+    matrices = {}
+    evaluated = []
+    for pose_bone in armature_object.pose.bones:
+        bone = pose_bone.bone
+        if (pose_bone.constraints or pose_bone.name in driven or not bone.use_inherit_rotation or
+                not bone.use_inherit_scale or (bone.parent is None and world is None)):
+            evaluated.append(pose_bone)
+            continue
+        arrays = _channel_arrays(pose_bone, channels.get(pose_bone.name, {}), values, len(frames))
+        rest = np.array(bone.matrix_local, dtype=np.float64)
+        if bone.parent is None:
+            rest = np.matmul(world, rest)
+        else:
+            rest = np.linalg.solve(np.array(bone.parent.matrix_local, dtype=np.float64), rest)
+        matrices[pose_bone.name] = np.matmul(rest, basis_matrices(pose_bone.rotation_mode, **arrays))
+
+    if evaluated:
+        if sampler is None:
+            own_sampler = TimelineSampler(scene, frames)
+            own_sampler.add_bones(armature_object, evaluated, matrices)
+            own_sampler.run()
+        else:
+            sampler.add_bones(armature_object, evaluated, matrices)
+    return matrices
+
+
+def shape_key_values(mesh, frames, scene, sampler=None):
+    """
+    (f,) values of the shape keys of a mesh at frames, by key name, the reference key left out. Keys animated by the
+    active action of the shape keys are sampled from their F-curves, driven keys are read from the scene evaluated at
+    every frame (by the sampler when one is given, see armature_matrices()), the others keep their current value.
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    shape_keys = mesh.shape_keys
+    reference_name = shape_keys.reference_key.name
+    animation_data = shape_keys.animation_data
+    action = animation_data.action if animation_data is not None else None
+    driven = set()
+    for driver in animation_data.drivers if animation_data is not None else ():
+        match = _KEY_BLOCK_PATH.match(driver.data_path)
+        if match:
+            driven.add(match.group(1))
+
+    rows = {}
+    fcurves = []
+    for fcurve in action.fcurves if action is not None else ():
+        match = _KEY_BLOCK_PATH.match(fcurve.data_path)
+        if match and not fcurve.mute:
+            rows[match.group(1)] = len(fcurves)
+            fcurves.append(fcurve)
+    sampled = sample_fcurves(fcurves, frames)
+
+    values = {}
+    evaluated = []
+    for key_block in shape_keys.key_blocks:
+        if key_block.name == reference_name:
+            continue
+        if key_block.name in driven:
+            evaluated.append(key_block)
+        elif key_block.name in rows:
+            values[key_block.name] = sampled[rows[key_block.name]]
+        else:
+            values[key_block.name] = np.full(len(frames), key_block.value)
+    if evaluated:
+        if sampler is None:
+            own_sampler = TimelineSampler(scene, frames)
+            own_sampler.add_key_blocks(evaluated, values)
+            own_sampler.run()
+        else:
+            sampler.add_key_blocks(evaluated, values)
+    return values
+
+
+class TimelineSampler():
+    """
+    Bones and shape keys of a scene read from the scene evaluated at every frame, in a single pass over the timeline.
+    Their dicts of samples are added first, run() then sets every frame once for all of them, records their values in
+    preallocated arrays and fills the dicts. The current frame of the scene is restored once at the end.
+    """
+    def __init__(self, scene, frames):
+        self.scene = scene
+        self.frames = np.asarray(frames, dtype=np.float64)
+        self._armatures = []
+        self._key_blocks = []
+
+    def add_bones(self, armature_object, pose_bones, matrices):
+        """
+        Fill matrices with the (f, 4, 4) transforms of pose bones relative to their parent, or to the world for root
+        bones.
+        """
+        # pose space transforms of the bones and of their parent, the inverted world transform of the armature
+        # standing in for the parent of root bones.
+        shape = (len(self.frames), len(pose_bones), 4, 4)
+        self._armatures.append((armature_object, pose_bones, matrices, np.empty(shape), np.empty(shape)))
+
+    def add_key_blocks(self, key_blocks, values):
+        """
+        Fill values with the (f,) values of shape keys.
+        """
+        self._key_blocks.append((key_blocks, values, np.empty((len(key_blocks), len(self.frames)))))
+
+    def run(self):
+        if not self._armatures and not self._key_blocks:
+            return
+        scene = self.scene
+        current = scene.frame_current
+        try:
+            for index, frame in enumerate(self.frames.tolist()):
+                whole = math.floor(frame)
+                scene.frame_set(int(whole), subframe=frame - whole)
+                for armature_object, pose_bones, _, poses, parents in self._armatures:
+                    inverted_world = np.linalg.inv(np.array(armature_object.matrix_world, dtype=np.float64))
+                    for column, pose_bone in enumerate(pose_bones):
+                        poses[index, column] = pose_bone.matrix
+                        parents[index, column] = inverted_world if pose_bone.parent is None else pose_bone.parent.matrix
+                for key_blocks, _, key_values in self._key_blocks:
+                    for row, key_block in enumerate(key_blocks):
+                        key_values[row, index] = key_block.value
+        finally:
+            scene.frame_set(current)
+
+        for _, pose_bones, matrices, poses, parents in self._armatures:
+            relative = np.linalg.solve(parents, poses) if len(self.frames) else poses
+            matrices.update((pose_bone.name, relative[:, column]) for column, pose_bone in enumerate(pose_bones))
+        for key_blocks, values, key_values in self._key_blocks:
+            values.update(zip([key_block.name for key_block in key_blocks], key_values))
+        self._armatures = []
+        self._key_blocks = []
+
+
+def decompose(matrix):
+    """
+    ijkprhxyz components of a 4x4 transform, computed like mathutils' to_scale(), to_euler() and to_translation(): the
+    scale is the length of the columns, p, r and h are the x, y and z angles (in degrees) of the XYZ euler of the
+    normalized columns, the one of the two possible eulers with the smallest angles.
+    """
+    rows = np.asarray(matrix, dtype=np.float64).tolist()
+    scale = [math.sqrt(rows[0][column] ** 2 + rows[1][column] ** 2 + rows[2][column] ** 2) for column in range(3)]
+    m = [[rows[row][column] / scale[column] if scale[column] else 0.0 for column in range(3)] for row in range(3)]
+    cy = math.hypot(m[0][0], m[1][0])
+    if cy > 16.0 * FLT_EPSILON:
+        euler = (math.atan2(m[2][1], m[2][2]), math.atan2(-m[2][0], cy), math.atan2(m[1][0], m[0][0]))
+        other = (math.atan2(-m[2][1], -m[2][2]), math.atan2(-m[2][0], -cy), math.atan2(-m[1][0], -m[0][0]))
+        if sum(abs(angle) for angle in euler) > sum(abs(angle) for angle in other):
+            euler = other
+    else:
+        euler = (math.atan2(-m[1][2], m[1][1]), math.atan2(-m[2][0], cy), 0.0)
+    return scale + [math.degrees(angle) for angle in euler] + [rows[0][3], rows[1][3], rows[2][3]]
+
+
+def decompose_matrices(matrices):
+    """
+    (..., 9) ijkprhxyz components of (..., 4, 4) transforms: decompose() computed on whole arrays at once.
+    """
+    matrices = np.asarray(matrices, dtype=np.float64)
+    scale = np.sqrt(np.sum(matrices[..., :3, :3] ** 2, axis=-2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m = np.where(scale[..., None, :] != 0.0, matrices[..., :3, :3] / scale[..., None, :], 0.0)
+    cy = np.hypot(m[..., 0, 0], m[..., 1, 0])
+    euler = np.stack([
+        np.arctan2(m[..., 2, 1], m[..., 2, 2]), np.arctan2(-m[..., 2, 0], cy), np.arctan2(m[..., 1, 0], m[..., 0, 0]),
+    ], axis=-1)
+    other = np.stack([
+        np.arctan2(-m[..., 2, 1], -m[..., 2, 2]), np.arctan2(-m[..., 2, 0], -cy),
+        np.arctan2(-m[..., 1, 0], -m[..., 0, 0]),
+    ], axis=-1)
+    euler = np.where((np.abs(euler).sum(axis=-1) > np.abs(other).sum(axis=-1))[..., None], other, euler)
+    gimbal = np.stack([
+        np.arctan2(-m[..., 1, 2], m[..., 1, 1]), np.arctan2(-m[..., 2, 0], cy), np.zeros(cy.shape),
+    ], axis=-1)
+    euler = np.where((cy > 16.0 * FLT_EPSILON)[..., None], euler, gimbal)
+    return np.concatenate([scale, np.degrees(euler), matrices[..., :3, 3]], axis=-1)
+
+
+def fold_channels(components, tolerance):
+    """
+    (letter, values) of the ijkprhxyz channels of (f, 9) components worth writing. A channel varying by at most
+    tolerance is folded into its single middle value, and left out when all its values are within tolerance of the
+    default of the channel.
+    """
+    low = components.min(axis=0, initial=np.inf)
+    high = components.max(axis=0, initial=-np.inf)
+    defaults = np.array(XFORM_DEFAULTS)
+    channels = []
+    for column, letter in enumerate(XFORM_CONTENTS):
+        if high[column] - low[column] > tolerance:
+            channels.append((letter, components[:, column]))
+        elif max(abs(low[column] - defaults[column]), abs(high[column] - defaults[column])) > tolerance:
+            channels.append((letter, np.array([(low[column] + high[column]) / 2])))
+    return channels
+
+
+def reduce_rate(components, fps, error):
+    """
+    (components, fps) of (f, k) components sampled at fps, resampled to fewer evenly spaced frames that still reproduce
+    every component within error once linearly interpolated. The first and the last frames are kept and every sample
+    plays at its original time, the frame rate of the m samples being fps * (m - 1) / (f - 1). The number of samples is
+    searched by bisection: the error does not always shrink as samples are added, so the count found reproduces the
+    components but is not always the lowest one that does.
+    """
+    frame_count = len(components)
+    if error is None or frame_count < 3:
+        return components, fps
+    best = components
+    low, high = 2, frame_count - 1
+    while low <= high:
+        sample_count = (low + high) // 2
+        samples = _resample(components, sample_count)
+        if np.abs(_resample(samples, frame_count) - components).max(initial=0.0) <= error:
+            best = samples
+            high = sample_count - 1
+        else:
+            low = sample_count + 1
+    return best, fps * (len(best) - 1) / float(frame_count - 1)
+
+
+def _resample(values, count):
+    """
+    count rows linearly interpolated at evenly spaced positions of (n, k) values, from the first row to the last one.
+    """
+    positions = np.linspace(0.0, len(values) - 1, count)
+    lower = np.minimum(positions.astype(np.int64), len(values) - 2)
+    weight = (positions - lower)[:, None]
+    return values[lower] * (1.0 - weight) + values[lower + 1] * weight
+
+
+def _fps_value(fps):
+    # reduced frame rates are not rounded to the animation decimals, the last frame of long tables would drift.
+    return '%.10g' % fps
+
+
+def xfm_anim(components, fps, float_format):
+    """
+    <Xfm$Anim> of (f, 9) ijkprhxyz components, a row per frame.
+    """
+    return Entry('Xfm$Anim', 'xform', content=[
+        Entry('Scalar', 'order', content='sprht'),
+        Entry('Scalar', 'fps', content=_fps_value(fps)),
+        Entry('Scalar', 'contents', content=XFORM_CONTENTS),
+        Values(components, len(XFORM_CONTENTS), float_format),
+    ])
+
+
+def xfm_anim_s(components, fps, float_format, tolerance):
+    """
+    <Xfm$Anim_S$> of (f, 9) ijkprhxyz components, a <S$Anim> per channel, constant channels folded (see
+    fold_channels()).
+    """
+    return Entry('Xfm$Anim_S$', 'xform', content=[
+        Entry('Char*', 'order', content='sprht'),
+        Entry('Scalar', 'fps', content=_fps_value(fps)),
+    ] + [
+        Entry('S$Anim', letter, content=[Values(values, float_format=float_format)])
+        for letter, values in fold_channels(components, tolerance)
+    ])
+
+
+def skeleton_table(armature, matrices, fps, float_format, tolerance=None, error=None):
+    """
+    <Table> "<skeleton>" of an armature, with a <Table> per bone nested like the bones. Without a tolerance the
+    transforms of every bone are written in a full <Xfm$Anim>, otherwise their channels are folded in a <Xfm$Anim_S$>.
+    With an error, the tables are written at a reduced frame rate (see reduce_rate()) reproducing all the bones:
+    Panda3D keeps a single frame rate and frame count per <Bundle>.
+    """
+    children = {}
+    for bone in armature.bones:
+        children.setdefault(None if bone.parent is None else bone.parent.name, []).append(bone.name)
+    # the (f, b, 4, 4) transforms of all the bones are decomposed at once.
+    names = list(matrices)
+    stacked = np.stack([matrices[name] for name in names], axis=1) if names else np.zeros((0, 0, 4, 4))
+    decomposed = decompose_matrices(stacked)
+    if names:
+        reduced, fps = reduce_rate(decomposed.reshape(len(decomposed), -1), fps, error)
+        decomposed = reduced.reshape(len(reduced), len(names), len(XFORM_CONTENTS))
+    components = dict(zip(names, np.swapaxes(decomposed, 0, 1)))
+
+    def bone_table(name):
+        if tolerance is None:
+            xform = xfm_anim(components[name], fps, float_format)
+        else:
+            xform = xfm_anim_s(components[name], fps, float_format, tolerance)
+        table = Entry('Table', name, content=[xform])
+        table.contents.extend(bone_table(child) for child in children.get(name, ()))
+        return table
+
+    return Entry('Table', '"<skeleton>"', content=[bone_table(name) for name in children.get(None, ())])
+
+
+def morph_table(values, fps, float_format, tolerance=None):
+    """
+    <Table> morph of shape key values, a <S$Anim> per key. With a tolerance, the values of keys varying by at most
+    tolerance are folded into a single value.
+    """
+    fps_value = _fps_value(fps)
+    entries = []
+    for name, key_values in values.items():
+        if tolerance is not None and len(key_values) and np.ptp(key_values) <= tolerance:
+            key_values = [(np.min(key_values) + np.max(key_values)) / 2]
+        entries.append(Entry('S$Anim', name, content=[
+            Entry('Scalar', 'fps', content=fps_value),
+            Values(key_values, float_format=float_format),
+        ]))
+    return Entry('Table', 'morph', content=entries)
+
+
+def _animated_shape_keys(blend_object):
+    shape_keys = blend_object.data.shape_keys if blend_object.type == 'MESH' else None
+    if shape_keys is not None and shape_keys.animation_data is not None and len(shape_keys.key_blocks) > 1:
+        return shape_keys
+    return None
+
+
+def sample_animation(blend_object, frames, scene, sampler=None):
+    """
+    Samples of the animation of an object at frames, by name: the (f, 4, 4) transforms of the bones of an animated
+    armature (see armature_matrices()) or the (f,) values of the animated shape keys of a mesh (see
+    shape_key_values()). None for other objects. With a TimelineSampler, the samples read from the evaluated scene
+    are only filled in once it has run.
+    """
+    if blend_object.type == 'ARMATURE' and blend_object.animation_data is not None:
+        return armature_matrices(blend_object, frames, scene, sampler)
+    if _animated_shape_keys(blend_object) is not None:
+        return shape_key_values(blend_object.data, frames, scene, sampler)
+    return None
+
+
+def animation_key(blend_object, frames):
+    """
+    content_key() of everything the samples of an object depend on: the keyframes of its action, the rest pose of its
+    armature and the pose channels (or its shape key values), its transform channels and the one of its parent, and
+    the frames. None when the samples also depend on the evaluated scene, through constraints, drivers, NLA tracks,
+    animated parents, F-curve modifiers or easing keyframes, and for objects without animation.
+    """
+    parts = ['animation', blend_object.name, np.asarray(frames, dtype=np.float64)]
+    if blend_object.type == 'ARMATURE' and blend_object.animation_data is not None:
+        animation_data = blend_object.animation_data
+        if _evaluated_world(blend_object):
+            return None
+        parts.append(np.array(blend_object.matrix_world, dtype=np.float64))
+        parts.append(blend_object.rotation_mode)
+        parts.extend(tuple(getattr(blend_object, channel)) for channel, _ in BONE_CHANNELS)
+        if blend_object.parent is not None:
+            parts.append(np.dot(
+                np.array(blend_object.parent.matrix_world, dtype=np.float64),
+                np.array(blend_object.matrix_parent_inverse, dtype=np.float64),
+            ))
+        for bone in blend_object.data.bones:
+            parts.extend((
+                bone.name, None if bone.parent is None else bone.parent.name,
+                np.array(bone.matrix_local, dtype=np.float64), bone.use_inherit_rotation, bone.use_inherit_scale,
+            ))
+        for pose_bone in blend_object.pose.bones:
+            if pose_bone.constraints:
+                return None
+            parts.extend((pose_bone.name, pose_bone.rotation_mode))
+            parts.extend(tuple(getattr(pose_bone, channel)) for channel, _ in BONE_CHANNELS)
+    else:
+        shape_keys = _animated_shape_keys(blend_object)
+        if shape_keys is None:
+            return None
+        animation_data = shape_keys.animation_data
+        parts.append(shape_keys.reference_key.name)
+        parts.extend((key_block.name, key_block.value) for key_block in shape_keys.key_blocks)
+    if len(animation_data.drivers):
+        return None
+    for fcurve in animation_data.action.fcurves if animation_data.action is not None else ():
+        points = fcurve.keyframe_points
+        interpolation = foreach_get(points, 'interpolation', np.int32)
+        if fcurve.modifiers or interpolation.max(initial=CONSTANT) > BEZIER:
+            return None
+        parts.extend((
+            fcurve.data_path, fcurve.array_index, fcurve.mute, fcurve.extrapolation, interpolation,
+            foreach_get(points, 'co', np.float32, 2), foreach_get(points, 'handle_left', np.float32, 2),
+            foreach_get(points, 'handle_right', np.float32, 2),
+        ))
+    return content_key(*parts)
+
+
+def sampled_bundle(blend_object, samples, fps, float_format, tolerance=None, error=None):
+    """
+    <Bundle> of the samples of an object returned by sample_animation(). With a tolerance, constant channels are
+    folded, with an error the frame rate of every bone is reduced.
+    """
+    if blend_object.type == 'ARMATURE':
+        table = skeleton_table(blend_object.data, samples, fps, float_format, tolerance, error)
+    else:
+        table = morph_table(samples, fps, float_format, tolerance)
+    return Entry('Bundle', blend_object.name, content=[table])
+
+
+def animation_bundle(blend_object, scene, frames, fps, float_format, tolerance=None, error=None):
+    """
+    <Bundle> of the animation of an object at frames: the skeleton of an animated armature or the shape keys of a mesh
+    with animated shape keys. None for other objects.
+    """
+    samples = sample_animation(blend_object, frames, scene)
+    if samples is None:
+        return None
+    return sampled_bundle(blend_object, samples, fps, float_format, tolerance, error)
@@ -1,25 +1,60 @@
+import functools
+import io
 import traceback
+from collections import Counter
 
 import bpy
+import numpy as np
 
-from .egg import Egg, Entry
+from .egg import Chunk, Egg, EggWriter, Entry, FloatFormat, Tee, ThreadedGzipStream
+from .egg_anim import TimelineSampler, animation_key, sample_animation, sampled_bundle
+from .egg_cache import DEFAULT_MAX_SIZE, DiskCache, code_version, content_key
+from .egg_mesh import extract_mesh, material_runs, polygon_groups, split_pools, vertex_pool
+from .egg_parallel import ParallelFormatter
+from .egg_trace import NULL_TRACER, Tracer, trace_path
+from .egg_vertex_cache import cache_misses, optimize, renumber_first_use
+
+
+# Settings that do not change the egg output of an object, left out of the chunk cache keys.
+UNCACHED_SETTINGS = (
+    'egg_filepath', 'egg_exportdir', 'egg_compress', 'egg_processes', 'egg_cache_dir', 'egg_cache_size', 'egg_trace',
+    'egg_animations', 'egg_animation_tolerance', 'egg_animation_error',
+)
 
 
 def save(context, export_settings):
     _start(context)
 
+    tracer = Tracer() if export_settings.get('egg_trace') else NULL_TRACER
+    processes = export_settings.get('egg_processes', 0)
+    formatter = ParallelFormatter(processes) if processes else None
+    cache_dir = export_settings.get('egg_cache_dir')
+    cache = DiskCache(cache_dir, export_settings.get('egg_cache_size', DEFAULT_MAX_SIZE)) if cache_dir else None
     try:
-        egg = Egg()
-        exporter = EggExporter(egg, export_settings)
-        exporter.export_globals()
-        exporter.export_scenes()
-        # exporter.export_animations()
-    except Exception as err:
-        traceback.print_tb(err.__traceback__)
-        print('cannot complete Egg Export: {}'.format(err))
-    else:
-        _write(egg, export_settings)
+        with tracer.span('save', filepath=export_settings['egg_filepath']):
+            try:
+                egg = Egg()
+                exporter = EggExporter(egg, export_settings, formatter, cache, tracer)
+                with tracer.span('export_globals'):
+                    exporter.export_globals()
+                with tracer.span('export_scenes'):
+                    exporter.export_scenes()
+                if export_settings.get('egg_animations'):
+                    with tracer.span('export_animations'):
+                        exporter.export_animations()
+            except Exception as err:
+                traceback.print_tb(err.__traceback__)
+                print('cannot complete Egg Export: {}'.format(err))
+            else:
+                with tracer.span('write'):
+                    _write(egg, export_settings, tracer)
+                with tracer.span('prune_cache'):
+                    exporter.prune_cache()
+                print(exporter.report())
     finally:
+        if formatter is not None:
+            formatter.close()
+        tracer.write(trace_path(export_settings['egg_filepath']))
         _end(context)
 
 
@@ -30,61 +65,368 @@ def _start(context):
 class EggExporter():
     """
     Extract necessary information from the blender file.
+    When a ParallelFormatter is given, mesh entries are formatted by its worker processes and the egg receives their
+    chunks instead of the entries themselves. When a DiskCache is given, the text of every object is cached under a hash
+    of its inputs as it is written, and spliced back in as a chunk by the next exports. The tracer records a span for
+    every scene, object and mesh. Floats are written with the number of decimals of the egg_precision setting, a dict of
+    FloatFormat arguments. With egg_vertex_cache, triangles are reordered for the vertex cache, the cache miss ratios
+    are gathered in stats and printed by report().
     """
-    def __init__(self, egg, export_settings):
+    def __init__(self, egg, export_settings, formatter=None, cache=None, tracer=NULL_TRACER):
         self.egg = egg
         self.export_settings = export_settings
+        self.formatter = formatter
+        self.cache = cache
+        self.tracer = tracer
+        self.float_format = FloatFormat(**export_settings.get('egg_precision', {}))
+        self.stats = Counter()
+        self._meshes = {}
+        self._layouts = {}
+        self._mesh_digests = {}
+        self._mesh_users = Counter()
+        self._exported_pools = set()
+        self._shared_polygons = {}
+        self._settings_key = sorted(
+            (key, value) for key, value in export_settings.items() if key not in UNCACHED_SETTINGS
+        )
+        self._code_version = code_version() if cache is not None else None
 
     def export_globals(self):
         coordinate_entry = Entry('CoordinateSystem', content='Z-up')
         self.egg.append(coordinate_entry)
 
     def export_scenes(self):
+        self._mesh_users = Counter(
+            blend_object.data.name
+            for scene in bpy.data.scenes
+            for blend_object in scene.objects
+            if blend_object.type == 'MESH'
+        )
         for scene in bpy.data.scenes:
             self._export_scene(scene)
 
     def _export_scene(self, scene):
-        for blend_object in scene.objects:
-            self._export_blend_object(blend_object)
+        with self.tracer.span('scene', 'scene', name=scene.name):
+            for blend_object in scene.objects:
+                self._export_blend_object(blend_object)
 
     def _export_blend_object(self, blend_object):
         # if blend_object.type == 'MESH':
         # if blend_object.type == bpy.types.MESH:
         if blend_object.type == 'MESH':
-            self._export_mesh_data(blend_object)
+            with self.tracer.span('object', 'object', name=blend_object.name):
+                self._export_mesh_data(blend_object)
+
+    def _extract_mesh(self, mesh):
+        """
+        Geometry of a mesh datablock, extracted once per export.
+        """
+        mesh_arrays = self._meshes.get(mesh.name)
+        if mesh_arrays is None:
+            with self.tracer.span('extract_mesh', 'mesh', name=mesh.name):
+                mesh_arrays = self._meshes[mesh.name] = extract_mesh(mesh)
+        return mesh_arrays
+
+    def _layout(self, mesh):
+        """
+        Pools and polygon ranges of a mesh, computed once per export.
+        The triangles are sorted by material and their welded vertices renumbered in first use order, so every material
+        is a contiguous block of triangles over a mostly contiguous range of vertices. With egg_vertex_cache, the
+        triangles of every material are reordered for the vertex cache. Returns the (pool_name, corners) of every pool,
+        corners being the first corner of each of its vertices, and the (group_name, pool_name, triangles) ranges of
+        polygon_groups(), grouped by material name.
+        """
+        layout = self._layouts.get(mesh.name)
+        if layout is not None:
+            return layout
+
+        with self.tracer.span('triangulate', 'mesh', name=mesh.name):
+            loop_triangles, triangle_polygon = mesh.triangulate_loops()
+        with self.tracer.span('weld', 'mesh', name=mesh.name, corners=mesh.loop_count):
+            corners, corner_vertex = mesh.weld(self.export_settings.get('egg_weld_epsilon', 0.0))
+        triangles = corner_vertex[loop_triangles]
+
+        with self.tracer.span('sort_materials', 'mesh', name=mesh.name):
+            if mesh.material_index is None:
+                triangle_material = np.zeros(len(triangles), dtype=np.int32)
+            else:
+                triangle_material = mesh.material_index[triangle_polygon]
+            order, runs = material_runs(triangle_material)
+            triangles = triangles[order]
+        if self.export_settings.get('egg_vertex_cache'):
+            with self.tracer.span('optimize_vertex_cache', 'mesh', name=mesh.name, triangles=len(triangles)):
+                self.stats['cache_misses_before'] += cache_misses(corner_vertex[loop_triangles])
+                for _, start, stop in runs:
+                    run = triangles[start:stop]
+                    triangles[start:stop] = run[optimize(run, len(corners))]
+                self.stats['cache_misses_after'] += cache_misses(triangles)
+                self.stats['optimized_triangles'] += len(triangles)
+        triangles, vertex_order = renumber_first_use(triangles, len(corners))
+        corners = corners[vertex_order]
+
+        with self.tracer.span('split_pools', 'mesh', name=mesh.name, vertices=len(corners)):
+            split = split_pools(triangles, len(corners))
+        pools = []
+        ranges = []
+        for pool_index, (pool_start, pool_stop, vertices, pool_triangles) in enumerate(split):
+            pool_name = mesh.name if len(split) == 1 else '{}.{}'.format(mesh.name, pool_index)
+            pools.append((pool_name, corners[vertices]))
+            for material_index, start, stop in runs:
+                start, stop = max(start, pool_start), min(stop, pool_stop)
+                if start < stop:
+                    ranges.append((
+                        mesh.material_name(material_index), pool_name,
+                        pool_triangles[start - pool_start:stop - pool_start],
+                    ))
+
+        self.stats['meshes'] += 1
+        self.stats['corners'] += mesh.loop_count
+        self.stats['vertices'] += len(corners)
+        self.stats['triangles'] += len(triangles)
+        self.stats['pools'] += len(pools)
+        layout = self._layouts[mesh.name] = (pools, ranges)
+        return layout
 
     def _export_mesh_data(self, blend_object):
         """
-        TODO: The polygon entries for each mesh must be the triangles, not quads or n-gons.
+        A mesh used by a single object is exported as a <Group> referencing a pool in world coordinates. A mesh shared
+        by several objects gets a single pool in local coordinates, which every object references from an <Instance>
+        carrying its own transform. The vertices of the pools are the corners of the mesh, welded when they share all
+        their attributes once rounded to multiples of egg_weld_epsilon (see weld()). The polygons of every material are
+        gathered in a sub <Group>.
         """
+        mesh = self._extract_mesh(blend_object.data)
+        if self._mesh_users[mesh.name] > 1:
+            self._export_mesh_instance(blend_object, mesh)
+            return
+
+        key = self._object_key('Group', blend_object, mesh)
+        if self._splice_cached_chunk(key):
+            return
+
+        pools, ranges = self._layout(mesh)
         mesh_entry = Entry('Group', name=blend_object.name)
-        for polygon in blend_object.data.polygons:
-            vertex_indices = tuple([v for v in polygon.vertices])
-            vertex_ref_entry = Entry('VertexRef', content=vertex_indices)
-            vertex_ref_entry.append(Entry("Ref", content=blend_object.data.name))
-            mesh_entry.append(Entry('Polygon', content=vertex_ref_entry))
+        pool_entries = [
+            vertex_pool(pool_name, mesh, corners, blend_object.matrix_world, self.float_format)
+            for pool_name, corners in pools
+        ]
+        with self.tracer.span('entries', 'mesh', name=mesh.name):
+            if self.formatter is None:
+                mesh_entry.contents.extend(polygon_groups(ranges))
+                nodes = [mesh_entry] + pool_entries
+            else:
+                nodes = self.formatter.object_entries(mesh_entry, ranges, pool_entries)
+        self._append_object_nodes(key, nodes)
+
+    def _export_mesh_instance(self, blend_object, mesh):
+        with_pool = mesh.name not in self._exported_pools
+        self._exported_pools.add(mesh.name)
+        key = self._object_key('Instance', blend_object, mesh, with_pool)
+        if self._splice_cached_chunk(key):
+            return
+
+        nodes = []
+        pools, ranges = self._layout(mesh)
+        if with_pool:
+            for pool_name, corners in pools:
+                pool = vertex_pool(pool_name, mesh, corners, float_format=self.float_format)
+                nodes.append(pool if self.formatter is None else self.formatter.pool_entry(pool))
+
+        polygons = self._shared_polygons.get(mesh.name)
+        if polygons is None:
+            if self.formatter is None:
+                polygons = polygon_groups(ranges)
+            else:
+                polygons = self.formatter.polygon_chunks(ranges)
+            self._shared_polygons[mesh.name] = polygons
+
+        transform = _transform_entry(blend_object.matrix_world)
+        instance_entry = Entry('Instance', name=blend_object.name, content=[transform])
+        instance_entry.contents.extend(polygons)
+        nodes.append(instance_entry)
+        self._append_object_nodes(key, nodes)
 
-        self.egg.append(mesh_entry)
+    def _object_key(self, entry_type, blend_object, mesh, *extra):
+        """
+        Cache key of the egg text of an object: its geometry and corner attributes, transform, materials and the export
+        settings.
+        """
+        if self.cache is None:
+            return None
+        mesh_digest = self._mesh_digests.get(mesh.name)
+        if mesh_digest is None:
+            parts = [
+                mesh.name, mesh.co, mesh.loop_start, mesh.loop_total, mesh.loop_vertex_index, mesh.normals,
+                mesh.colors, mesh.material_index, len(mesh.uvs), len(mesh.morphs),
+            ]
+            for layer_name, values in mesh.uvs + mesh.morphs:
+                parts.extend((layer_name, values))
+            with self.tracer.span('hash_mesh', 'mesh', name=mesh.name):
+                mesh_digest = self._mesh_digests[mesh.name] = content_key(*parts)
+        materials = [material.name if material else None for material in blend_object.data.materials]
+        return content_key(
+            self._code_version, self._settings_key, entry_type, blend_object.name, mesh_digest,
+            np.array(blend_object.matrix_world, dtype=np.float64), materials, extra,
+        )
+
+    def _splice_cached_chunk(self, key):
+        if key is None:
+            return False
+        data = self.cache.get(key)
+        if data is None:
+            return False
+        self.egg.append(Chunk(data.decode('utf-8')))
+        self.stats['cached_objects'] += 1
+        return True
 
-        vertex_pool_entry = Entry('VertexPool', name=blend_object.data.name)
-        for vertex in blend_object.data.vertices:
-            vertex_attributes = [(blend_object.matrix_world * vertex.co).to_tuple()]
-            vertex_pool_entry.append(
-                Entry('Vertex', name=vertex.index, content=vertex_attributes),
-            )
+    def _append_object_nodes(self, key, nodes):
+        """
+        Append the root nodes of an object. With a cache, they are stored in it as they are written.
+        """
+        self.stats['formatted_objects'] += 1
+        if key is None:
+            for node in nodes:
+                self.egg.append(node)
+        else:
+            self.egg.append(Tee(Egg(nodes), functools.partial(self._store_chunk, key)))
 
-        self.egg.append(vertex_pool_entry)
+    def _store_chunk(self, key, text):
+        self.cache.put(key, text.encode('utf-8'))
+
+    def prune_cache(self):
+        """
+        Evict the oldest entries of the cache, once the objects are written and stored.
+        """
+        if self.cache is not None:
+            self.cache.prune()
+
+    def report(self):
+        """
+        Summary of the export statistics.
+        """
+        stats = self.stats
+        lines = ['egg export: {} objects, {} meshes, {} corners welded into {} vertices, {} triangles, {} pools'.format(
+            stats['formatted_objects'] + stats['cached_objects'], stats['meshes'], stats['corners'], stats['vertices'],
+            stats['triangles'], stats['pools'],
+        )]
+        if stats['optimized_triangles']:
+            lines.append('vertex cache ACMR: {:.3f} before, {:.3f} after optimization'.format(
+                stats['cache_misses_before'] / float(stats['optimized_triangles']),
+                stats['cache_misses_after'] / float(stats['optimized_triangles']),
+            ))
+        if stats['sampled_animations'] or stats['cached_animations']:
+            lines.append('animations: {} sampled, {} read from the cache'.format(
+                stats['sampled_animations'], stats['cached_animations'],
+            ))
+        if self.cache is not None:
+            lines.append('cache: {} objects reused, {} hits, {} misses'.format(
+                stats['cached_objects'], self.cache.hits, self.cache.misses,
+            ))
+        return '\n'.join(lines)
 
     def export_animations(self):
-        animation_entries = []
+        """
+        Append a <Table> holding a <Bundle> per animated armature and per mesh with animated shape keys, sampled at
+        every frame of the range of their scene. Channels varying by less than egg_animation_tolerance, or than the
+        last decimal written, are folded into a single value. With a positive egg_animation_error, the bone tables of
+        every armature are written at a reduced frame rate reproducing their channels within that error. With a cache,
+        the samples of every object are cached under a hash of its keyframes and rest pose, and only sampled again once
+        changed.
+        The bones and shape keys read from the evaluated scene are sampled in a single pass over the frames of every
+        scene.
+        """
+        tolerance = max(
+            self.export_settings.get('egg_animation_tolerance', 0.0),
+            0.5 * 10.0 ** -self.float_format.precision['animation'],
+        )
+        error = self.export_settings.get('egg_animation_error') or None
+        bundles = []
+        for scene in bpy.data.scenes:
+            frames = np.arange(scene.frame_start, scene.frame_end + 1, dtype=np.float64)
+            fps = scene.render.fps / scene.render.fps_base
+            sampler = TimelineSampler(scene, frames)
+            sampled = []
+            stored = []
+            for blend_object in scene.objects:
+                with self.tracer.span('sample_animation', 'object', name=blend_object.name, frames=len(frames)):
+                    key, samples = self._animation_samples(blend_object, frames, sampler)
+                if samples is not None:
+                    sampled.append((blend_object, samples))
+                    if key is not None:
+                        stored.append((key, samples))
+            with self.tracer.span('sample_timeline', 'scene', name=scene.name, frames=len(frames)):
+                sampler.run()
+            for key, samples in stored:
+                archive = io.BytesIO()
+                np.savez(archive, *samples.values(), names=np.array(list(samples), dtype=str))
+                self.cache.put(key, archive.getvalue())
+            for blend_object, samples in sampled:
+                with self.tracer.span('animation', 'object', name=blend_object.name, frames=len(frames)):
+                    bundles.append(sampled_bundle(blend_object, samples, fps, self.float_format, tolerance, error))
+        if bundles:
+            self.egg.append(Entry('Table', content=bundles))
 
-        return animation_entries
+    def _animation_samples(self, blend_object, frames, sampler):
+        """
+        (key, samples) of the animation of an object (see sample_animation()), its samples read from the cache when its
+        keyframes did not change. Otherwise the key is the one to store the samples under once the sampler has run, or
+        None.
+        """
+        key = animation_key(blend_object, frames) if self.cache is not None else None
+        if key is not None:
+            key = content_key(self._code_version, key)
+            data = self.cache.get(key)
+            if data is not None:
+                self.stats['cached_animations'] += 1
+                with np.load(io.BytesIO(data)) as archive:
+                    return None, {
+                        name: archive['arr_{}'.format(index)] for index, name in enumerate(archive['names'].tolist())
+                    }
+        samples = sample_animation(blend_object, frames, sampler.scene, sampler)
+        if samples is not None:
+            self.stats['sampled_animations'] += 1
+        return key, samples
 
 
-def _write(egg, export_settings):
+def _transform_entry(matrix):
+    """
+    <Transform> entry of a blender matrix. Egg matrices apply to row vectors, so they are the transpose of blender's.
+    """
+    rows = np.array(matrix, dtype=np.float64).T.tolist()
+    return Entry('Transform', content=Entry('Matrix4', content=[tuple(row) for row in rows]))
+
+
+def _write(egg, export_settings, tracer=NULL_TRACER):
+    """
+    Stream the egg to its file, compressed by a background thread when egg_compress is set.
+    """
     with open(export_settings['egg_filepath'], 'wb') as eggfile:
-        output = [bytes(line + '\n', export_settings['egg_file_format']) for line in egg.format_output()]
-        eggfile.writelines(output)
+        if export_settings.get('egg_compress'):
+            with ThreadedGzipStream(eggfile) as stream:
+                _write_stream(egg, stream, export_settings, tracer)
+        else:
+            _write_stream(egg, eggfile, export_settings, tracer)
+
+
+def _write_stream(egg, stream, export_settings, tracer):
+    if tracer.enabled:
+        stream = _TracedStream(stream, tracer)
+    with EggWriter(stream, export_settings['egg_file_format']) as writer:
+        egg.write(writer)
+
+
+class _TracedStream():
+    """
+    Stream recording its writes, so the time spent formatting and the time spent writing (or waiting for the compression
+    thread) are told apart in the trace.
+    """
+    def __init__(self, stream, tracer):
+        self._stream = stream
+        self._tracer = tracer
+
+    def write(self, data):
+        with self._tracer.span('stream_write', 'io', size=len(data)):
+            return self._stream.write(data)
 
 
 def _end(context):
@@ -0,0 +1,90 @@
+import glob
+import hashlib
+import os
+
+import numpy as np
+
+DEFAULT_MAX_SIZE = 512 << 20
+
+
+class DiskCache():
+    """
+    Persistent content addressed cache.
+    Every entry is a file named after its key. Reading an entry refreshes its modification time, prune() removes the
+    least recently used entries until the directory holds at most max_size bytes.
+    """
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as cache_file:
+                data = cache_file.read()
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        os.utime(path, None)
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary_path, 'wb') as cache_file:
+            cache_file.write(data)
+        os.replace(temporary_path, path)
+
+    def prune(self):
+        """
+        Evict the least recently used entries until the cache fits in max_size.
+        """
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, '*')):
+            if path.endswith('.tmp'):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            os.remove(path)
+            total_size -= size
+
+
+def content_key(*parts):
+    """
+    Hex digest of parts. Arrays are hashed from their dtype, shape and raw data, anything else from its repr.
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update('{}{}'.format(part.dtype.str, part.shape).encode('utf-8'))
+            digest.update(np.ascontiguousarray(part).tobytes())
+        elif isinstance(part, bytes):
+            digest.update(part)
+        else:
+            digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def code_version():
+    """
+    Digest of the addon sources, part of every key so entries written by another version of the exporter are never
+    used.
+    """
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+        with open(path, 'rb') as source_file:
+            digest.update(source_file.read())
+    return digest.hexdigest()
@@ -0,0 +1,466 @@
+import numpy as np
+
+from .egg import Entry, Polygon, Ref, VertexPool, VertexRef
+
+
+EPSILON = 1e-6
+# Largest pool whose vertex indices fit in 16 bits.
+MAX_POOL_VERTICES = 65535
+
+
+class MeshArrays():
+    """
+    Geometry of a blender mesh datablock extracted into NumPy buffers.
+    co holds the local vertex positions, polygons are described by their loop range (loop_start, loop_total) in
+    loop_vertex_index. The corner attributes are optional: normals holds one normal per loop, uvs and morphs are lists
+    of (name, array) pairs with one uv per loop (the default layer named None) and one shape key offset per vertex,
+    colors holds one RGBA per loop. material_index holds the material slot of every polygon and materials the material
+    name of every slot (None for empty slots).
+    """
+    def __init__(
+        self, name, co, loop_start, loop_total, loop_vertex_index, normals=None, uvs=(), colors=None, morphs=(),
+        material_index=None, materials=(),
+    ):
+        self.name = name
+        self.co = co
+        self.loop_start = loop_start
+        self.loop_total = loop_total
+        self.loop_vertex_index = loop_vertex_index
+        self.normals = normals
+        self.uvs = list(uvs)
+        self.colors = colors
+        self.morphs = list(morphs)
+        self.material_index = material_index
+        self.materials = list(materials)
+        self._loop_triangulation = None
+
+    @property
+    def vertex_count(self):
+        return len(self.co)
+
+    @property
+    def polygon_count(self):
+        return len(self.loop_start)
+
+    @property
+    def loop_count(self):
+        return len(self.loop_vertex_index)
+
+    def triangulate_loops(self):
+        """
+        Triangles of the mesh as (t, 3) loop indices and the polygon each triangle comes from, computed once per
+        MeshArrays.
+        """
+        if self._loop_triangulation is None:
+            self._loop_triangulation = triangulate(
+                np.asarray(self.co)[self.loop_vertex_index], self.loop_start, self.loop_total,
+                np.arange(self.loop_count, dtype=np.int32),
+            )
+        return self._loop_triangulation
+
+    def corner_columns(self):
+        """
+        (l, k) arrays of the attributes of every corner: position, normal, uvs, color and morph offsets.
+        """
+        columns = [np.asarray(self.co)[self.loop_vertex_index]]
+        if self.normals is not None:
+            columns.append(self.normals)
+        columns.extend(uv for _, uv in self.uvs)
+        if self.colors is not None:
+            columns.append(self.colors)
+        columns.extend(np.asarray(deltas)[self.loop_vertex_index] for _, deltas in self.morphs)
+        return columns
+
+    def weld(self, epsilon=0.0):
+        """
+        Vertices of the corners of the mesh, see weld().
+        """
+        return weld(self.corner_columns(), epsilon)
+
+    def material_name(self, index):
+        """
+        Name of the material of a slot, None for empty or missing slots.
+        """
+        return self.materials[index] if 0 <= index < len(self.materials) else None
+
+
+def extract_mesh(mesh):
+    """
+    Read the geometry of a blender mesh with foreach_get, without creating a python object per element.
+    Corners of smooth polygons get the normal of their vertex, the ones of flat polygons the normal of their polygon.
+    Colors come from the active vertex color layer, morphs from the offsets of the shape keys to the reference key.
+    Materials are read by name from the material slots of the mesh.
+    """
+    co = foreach_get(mesh.vertices, 'co', np.float32, 3)
+    loop_start = foreach_get(mesh.polygons, 'loop_start', np.int32)
+    loop_total = foreach_get(mesh.polygons, 'loop_total', np.int32)
+    loop_vertex_index = foreach_get(mesh.loops, 'vertex_index', np.int32)
+
+    loop_polygon = _loop_polygons(loop_start, loop_total, len(loop_vertex_index))
+    use_smooth = foreach_get(mesh.polygons, 'use_smooth', bool)[loop_polygon]
+    normals = np.where(
+        use_smooth[:, None],
+        foreach_get(mesh.vertices, 'normal', np.float32, 3)[loop_vertex_index],
+        foreach_get(mesh.polygons, 'normal', np.float32, 3)[loop_polygon],
+    )
+    uvs = [(_uv_name(mesh, layer), foreach_get(layer.data, 'uv', np.float32, 2)) for layer in mesh.uv_layers]
+
+    colors = None
+    color_layer = mesh.vertex_colors.active
+    if color_layer is not None and len(color_layer.data):
+        colors = _rgba(foreach_get(color_layer.data, 'color', np.float32, len(color_layer.data[0].color)))
+
+    morphs = []
+    if mesh.shape_keys is not None:
+        reference_key = mesh.shape_keys.reference_key
+        reference_co = foreach_get(reference_key.data, 'co', np.float32, 3)
+        for key_block in mesh.shape_keys.key_blocks:
+            if key_block.name != reference_key.name:
+                morphs.append((key_block.name, foreach_get(key_block.data, 'co', np.float32, 3) - reference_co))
+
+    material_index = foreach_get(mesh.polygons, 'material_index', np.int32)
+    materials = [material.name if material else None for material in mesh.materials]
+    return MeshArrays(
+        mesh.name, co, loop_start, loop_total, loop_vertex_index, normals, uvs, colors, morphs, material_index,
+        materials,
+    )
+
+
+def _uv_name(mesh, layer):
+    """
+    Name of the <UV> of a uv layer: None for the active layer (or the first one), written as the unnamed default
+    texture coordinates panda binds textures to.
+    """
+    default = mesh.uv_layers.active or mesh.uv_layers[0]
+    return None if layer.name == default.name else layer.name
+
+
+def extract_mesh_reference(mesh):
+    """
+    Element by element version of extract_mesh, the reference the vectorized extraction is tested against.
+    """
+    co = np.array([vertex.co.to_tuple() for vertex in mesh.vertices], dtype=np.float32).reshape(-1, 3)
+    loop_start = np.array([polygon.loop_start for polygon in mesh.polygons], dtype=np.int32)
+    loop_total = np.array([polygon.loop_total for polygon in mesh.polygons], dtype=np.int32)
+    loop_vertex_index = np.array([loop.vertex_index for loop in mesh.loops], dtype=np.int32)
+
+    normals = np.zeros((len(mesh.loops), 3), dtype=np.float32)
+    for polygon in mesh.polygons:
+        for loop_index in range(polygon.loop_start, polygon.loop_start + polygon.loop_total):
+            if polygon.use_smooth:
+                normals[loop_index] = mesh.vertices[mesh.loops[loop_index].vertex_index].normal.to_tuple()
+            else:
+                normals[loop_index] = polygon.normal.to_tuple()
+    uvs = [
+        (_uv_name(mesh, layer), np.array([loop.uv.to_tuple() for loop in layer.data], dtype=np.float32).reshape(-1, 2))
+        for layer in mesh.uv_layers
+    ]
+
+    colors = None
+    color_layer = mesh.vertex_colors.active
+    if color_layer is not None and len(color_layer.data):
+        colors = _rgba(np.array([tuple(loop.color) for loop in color_layer.data], dtype=np.float32))
+
+    morphs = []
+    if mesh.shape_keys is not None:
+        reference_key = mesh.shape_keys.reference_key
+        for key_block in mesh.shape_keys.key_blocks:
+            if key_block.name != reference_key.name:
+                morphs.append((key_block.name, np.array([
+                    (point.co - reference_point.co).to_tuple()
+                    for point, reference_point in zip(key_block.data, reference_key.data)
+                ], dtype=np.float32).reshape(-1, 3)))
+
+    material_index = np.array([polygon.material_index for polygon in mesh.polygons], dtype=np.int32)
+    materials = [material.name if material else None for material in mesh.materials]
+    return MeshArrays(
+        mesh.name, co, loop_start, loop_total, loop_vertex_index, normals, uvs, colors, morphs, material_index,
+        materials,
+    )
+
+
+def weld(columns, epsilon=0.0):
+    """
+    Merge the corners sharing all their attributes into vertices.
+    columns are (l, k) arrays of corner attributes, the rows of all columns are compared at once as the bytes of a
+    structured array by a single unique pass. With an epsilon, every attribute value (position, normal, uv, color and
+    morph offset alike) is first rounded to the nearest multiple of it: corners are welded when all their values fall
+    in the same cells of that grid. This is a quantization, not a distance test, corners closer than epsilon on both
+    sides of a cell boundary stay apart. Returns the (v,) index of the first corner of every vertex, vertices being
+    numbered in the order of their first corner, and the (l,) vertex of every corner.
+    """
+    values = np.hstack([np.asarray(column, dtype=np.float64).reshape(len(column), -1) for column in columns])
+    if epsilon:
+        values = np.round(values / epsilon)
+    # -0.0 and 0.0 compare equal but differ in their bytes.
+    values = np.ascontiguousarray(values + 0.0)
+    rows = values.view(np.dtype((np.void, values.dtype.itemsize * values.shape[1]))).ravel()
+    _, first_corners, corner_vertex = np.unique(rows, return_index=True, return_inverse=True)
+
+    order = np.argsort(first_corners)
+    renumber = np.empty_like(order)
+    renumber[order] = np.arange(len(order))
+    return first_corners[order], renumber[corner_vertex.ravel()].astype(np.int32)
+
+
+def triangulate(co, loop_start, loop_total, loop_vertex_index):
+    """
+    Split the polygons into triangles, keeping their winding.
+    Polygons are processed together by arity: convex ones are split as a fan, concave ones are ear clipped. Returns a
+    (t, 3) array of vertex indices, in polygon order, and the (t,) array of the polygon index of each triangle.
+    """
+    triangle_counts = np.maximum(loop_total - 2, 0)
+    offsets = np.concatenate(([0], np.cumsum(triangle_counts)[:-1])).astype(np.int64)
+    triangles = np.empty((int(triangle_counts.sum()), 3), dtype=np.int32)
+    triangle_polygon = np.repeat(np.arange(len(loop_start), dtype=np.int32), triangle_counts)
+
+    for arity in np.unique(loop_total).tolist():
+        if arity < 3:
+            continue
+        faces = np.flatnonzero(loop_total == arity)
+        corners = loop_vertex_index[loop_start[faces][:, None] + np.arange(arity)]
+        if arity == 3:
+            triangles[offsets[faces]] = corners
+            continue
+
+        points = np.asarray(co, dtype=np.float64)[corners]
+        normals = _newell_normals(points)
+        convex = np.all(_turns(points, normals) >= -_tolerance(normals), axis=1)
+        for face_corners, face_offsets, ears in (
+            (corners[convex], offsets[faces[convex]], _fan(len(faces[convex]), arity)),
+            (corners[~convex], offsets[faces[~convex]], _ear_clip(points[~convex], normals[~convex])),
+        ):
+            for step in range(arity - 2):
+                triangles[face_offsets + step] = np.take_along_axis(face_corners, ears[:, step], axis=1)
+
+    return triangles, triangle_polygon
+
+
+def _newell_normals(points):
+    """
+    Normals of (f, k, 3) polygons, not normalized.
+    """
+    return np.cross(points, np.roll(points, -1, axis=1)).sum(axis=1)
+
+
+def _tolerance(normals):
+    """
+    Per polygon threshold under which turns and edge sides are considered null, relative to the polygon size.
+    """
+    return (EPSILON * np.einsum('fi,fi->f', normals, normals))[:, None]
+
+
+def _turns(points, normals):
+    """
+    Signed turn of every corner of (f, k, 3) polygons, positive when the corner is convex.
+    """
+    previous_points = np.roll(points, 1, axis=1)
+    next_points = np.roll(points, -1, axis=1)
+    turns = np.cross(points - previous_points, next_points - points)
+    return np.einsum('fki,fi->fk', turns, normals)
+
+
+def _fan(face_count, arity):
+    """
+    Corner indices (f, k - 2, 3) of the fan triangulation of convex polygons.
+    """
+    steps = np.arange(1, arity - 1)
+    fan = np.stack([np.zeros_like(steps), steps, steps + 1], axis=1)
+    return np.broadcast_to(fan, (face_count, arity - 2, 3))
+
+
+def _ear_clip(points, normals):
+    """
+    Corner indices (f, k - 2, 3) of the ear clipping triangulation of (f, k, 3) polygons.
+    One ear is clipped from every polygon at each step. Points lying on the edges of a candidate ear block it, so no
+    degenerate triangle is created. When a polygon has no valid ear (degenerate polygons), its most convex corner is
+    clipped instead.
+    """
+    face_count, arity = points.shape[:2]
+    tolerance = _tolerance(normals)
+    rows = np.arange(face_count)[:, None]
+    order = np.tile(np.arange(arity), (face_count, 1))
+    ears = np.empty((face_count, arity - 2, 3), dtype=np.int64)
+
+    for step in range(arity - 3):
+        remaining = arity - step
+        current = points[rows, order]
+        previous_points = np.roll(current, 1, axis=1)
+        next_points = np.roll(current, -1, axis=1)
+        turns = _turns(current, normals)
+
+        # point j is inside the triangle (i - 1, i, i + 1) when it is on the inner side of the three edges.
+        candidates = current[:, None, :, :]
+        inside = np.ones((face_count, remaining, remaining), dtype=bool)
+        for start, stop in ((previous_points, current), (current, next_points), (next_points, previous_points)):
+            edges = np.cross((stop - start)[:, :, None, :], candidates - start[:, :, None, :])
+            inside &= np.einsum('fijk,fk->fij', edges, normals) >= -tolerance[:, :, None]
+        corner = np.arange(remaining)
+        own = (corner[None, :] - corner[:, None]) % remaining
+        inside[:, (own == 0) | (own == 1) | (own == remaining - 1)] = False
+
+        valid = (turns > tolerance) & ~inside.any(axis=2)
+        clipped = np.where(valid.any(axis=1), np.argmax(valid, axis=1), np.argmax(turns, axis=1))
+        ears[:, step] = np.stack([
+            order[rows[:, 0], (clipped - 1) % remaining],
+            order[rows[:, 0], clipped],
+            order[rows[:, 0], (clipped + 1) % remaining],
+        ], axis=1)
+
+        keep = np.ones(order.shape, dtype=bool)
+        keep[rows[:, 0], clipped] = False
+        order = order[keep].reshape(face_count, remaining - 1)
+
+    ears[:, arity - 3] = order
+    return ears
+
+
+def material_runs(triangle_material):
+    """
+    Stable order sorting triangles by material slot, and the (material_index, start, stop) range of every material in
+    the sorted triangles.
+    """
+    order = np.argsort(triangle_material, kind='stable')
+    materials = np.asarray(triangle_material)[order]
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(materials)) + 1, [len(order)])).tolist()
+    return order, [
+        (int(materials[start]), start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if start < stop
+    ]
+
+
+def split_pools(triangles, vertex_count, max_vertices=MAX_POOL_VERTICES):
+    """
+    Split (t, 3) triangles into consecutive ranges using at most max_vertices vertices each, one pool per range.
+    Returns a (start, stop, vertices, pool_triangles) tuple per range: the vertices of its pool in first use order and
+    its triangles renumbered into them. Triangles of at most max_vertices vertices are returned as a single range.
+    """
+    if vertex_count <= max_vertices:
+        return [(0, len(triangles), np.arange(vertex_count), triangles)]
+    pools = []
+    start = 0
+    while start < len(triangles):
+        # grow the window until it uses more than max_vertices vertices or reaches the last triangle.
+        window = max_vertices
+        while True:
+            used, first_use, inverse = np.unique(
+                triangles[start:start + window].ravel(), return_index=True, return_inverse=True,
+            )
+            if len(used) > max_vertices:
+                stop = start + int(np.sort(first_use)[max_vertices]) // 3
+                break
+            if start + window >= len(triangles):
+                stop = len(triangles)
+                break
+            window *= 2
+        # keep the vertices of the triangles up to stop, renumbered in first use order.
+        first_use_order = np.argsort(first_use, kind='stable')
+        new_index = np.empty(len(used), dtype=np.int32)
+        new_index[first_use_order] = np.arange(len(used), dtype=np.int32)
+        count = 3 * (stop - start)
+        pool_triangles = new_index[inverse.ravel()[:count]].reshape(-1, 3)
+        pools.append((start, stop, used[first_use_order[:int(pool_triangles.max()) + 1]], pool_triangles))
+        start = stop
+    return pools
+
+
+def polygon_entries(pool_name, triangles):
+    """
+    Polygon entries of (t, 3) triangles referencing a pool, all sharing a single Ref.
+    """
+    pool_ref = Ref(pool_name)
+    return [Polygon(VertexRef(tuple(triangle), pool_ref)) for triangle in triangles.tolist()]
+
+
+def polygon_groups(ranges, polygons=None):
+    """
+    Polygon nodes of (group_name, pool_name, triangles) ranges. Consecutive ranges sharing a group name are gathered in
+    a sub <Group> of that name, the polygons of ranges without a group name are returned as is. The nodes of every range
+    are built by polygons(pool_name, triangles, nested), nested being 1 inside sub groups, polygon_entries by default.
+    """
+    nodes = []
+    group_entry = None
+    for group_name, pool_name, triangles in ranges:
+        range_nodes = polygon_entries(pool_name, triangles) if polygons is None else polygons(
+            pool_name, triangles, 0 if group_name is None else 1,
+        )
+        if group_name is None:
+            group_entry = None
+            nodes.extend(range_nodes)
+            continue
+        if group_entry is None or group_entry.name != group_name:
+            group_entry = Entry('Group', name=group_name)
+            nodes.append(group_entry)
+        group_entry.contents.extend(range_nodes)
+    return nodes
+
+
+def vertex_pool(name, mesh, corners, matrix=None, float_format=None):
+    """
+    VertexPool of welded vertices of a mesh, given the first corner of each (see weld()). With a 4x4 matrix, positions,
+    normals and morph offsets are transformed to world coordinates.
+    """
+    vertices = mesh.loop_vertex_index[corners]
+    positions = np.asarray(mesh.co)[vertices]
+    normals = None if mesh.normals is None else mesh.normals[corners]
+    morphs = [(morph_name, np.asarray(deltas)[vertices]) for morph_name, deltas in mesh.morphs]
+    if matrix is not None:
+        positions = transform_points(positions, matrix)
+        normals = None if normals is None else transform_normals(normals, matrix)
+        morphs = [(morph_name, transform_vectors(deltas, matrix)) for morph_name, deltas in morphs]
+    return VertexPool(
+        name, positions, normals=normals, uvs=[(uv_name, uv[corners]) for uv_name, uv in mesh.uvs],
+        colors=None if mesh.colors is None else mesh.colors[corners], morphs=morphs, float_format=float_format,
+    )
+
+
+def transform_points(points, matrix):
+    """
+    Apply a 4x4 transform (e.g. a blender matrix_world) to an (n, 3) array of points.
+    """
+    matrix = np.array(matrix, dtype=np.float64)
+    return np.dot(points, matrix[:3, :3].T) + matrix[:3, 3]
+
+
+def transform_vectors(vectors, matrix):
+    """
+    Apply the rotation and scale of a 4x4 transform to an (n, 3) array of vectors.
+    """
+    return np.dot(vectors, np.array(matrix, dtype=np.float64)[:3, :3].T)
+
+
+def transform_normals(normals, matrix):
+    """
+    Transform an (n, 3) array of normals by the inverse transpose of a 4x4 transform, keeping them normalized.
+    """
+    normals = np.dot(normals, np.linalg.inv(np.array(matrix, dtype=np.float64)[:3, :3]))
+    lengths = np.linalg.norm(normals, axis=1)[:, None]
+    return normals / np.where(lengths > 0, lengths, 1)
+
+
+def _loop_polygons(loop_start, loop_total, loop_count):
+    """
+    Polygon of every loop.
+    """
+    loop_polygon = np.zeros(loop_count, dtype=np.int32)
+    offsets = np.cumsum(loop_total) - loop_total
+    loops = np.repeat(loop_start - offsets, loop_total) + np.arange(int(loop_total.sum()))
+    loop_polygon[loops] = np.repeat(np.arange(len(loop_start), dtype=np.int32), loop_total)
+    return loop_polygon
+
+
+def _rgba(colors):
+    """
+    RGBA of RGB (blender 2.7x vertex colors) or RGBA colors.
+    """
+    if colors.shape[1] == 4:
+        return colors
+    return np.hstack([colors, np.ones((len(colors), 1), dtype=colors.dtype)])
+
+
+def foreach_get(collection, attribute, dtype, width=1):
+    """
+    Attribute of every element of a blender collection, read by a single foreach_get call into an (n, width) array.
+    """
+    buffer = np.empty(len(collection) * width, dtype=dtype)
+    collection.foreach_get(attribute, buffer)
+    return buffer.reshape(-1, width) if width > 1 else buffer
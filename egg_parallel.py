@@ -0,0 +1,101 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .egg import Chunk, Egg, EggWriter, Entry, format_nodes
+from .egg_mesh import polygon_entries, polygon_groups
+
+CHUNK_POLYGONS = 50000
+CHUNK_VERTICES = 50000
+# Run by every worker process before its first job: registers the addon package without running its __init__, which
+# imports bpy, so that processes started by the spawn method (the default on Windows and macOS), whose python has no
+# bpy, can import this module to unpickle the job functions.
+WORKER_SETUP = '''
+import sys
+import types
+if package_name not in sys.modules:
+    package = types.ModuleType(package_name)
+    package.__path__ = [package_dir]
+    sys.modules[package_name] = package
+'''
+
+
+class ParallelFormatter():
+    """
+    Format mesh entries on a pool of worker processes.
+    The main thread only hands over the extracted arrays, the workers build the entries and return their text. Small
+    objects are formatted by a single job, large ones are split into polygon and vertex ranges. Every job result is
+    wrapped in a Chunk at its place in the egg tree, so the output is identical to the one of a serial export.
+    mp_context is the multiprocessing context of the workers, the default one when None.
+    """
+    def __init__(
+        self, processes=None, chunk_polygons=CHUNK_POLYGONS, chunk_vertices=CHUNK_VERTICES, mp_context=None,
+    ):
+        self.chunk_polygons = chunk_polygons
+        self.chunk_vertices = chunk_vertices
+        package = {'package_name': __package__, 'package_dir': os.path.dirname(os.path.abspath(__file__))}
+        self._executor = ProcessPoolExecutor(
+            processes, mp_context=mp_context, initializer=exec, initargs=(WORKER_SETUP, package),
+        )
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def object_entries(self, group_entry, ranges, pools=()):
+        """
+        Nodes standing for a root <Group> or <Instance> holding the (group_name, pool_name, triangles) polygon ranges
+        (see polygon_groups) followed by the pools they reference, if given. The polygons are appended after the current
+        contents of group_entry.
+        """
+        triangle_count = sum(len(triangles) for _, _, triangles in ranges)
+        if triangle_count <= self.chunk_polygons and all(pool.count() <= self.chunk_vertices for pool in pools):
+            return [Chunk(self._executor.submit(_format_object, [group_entry] + list(pools), ranges))]
+
+        group_entry.contents.extend(self.polygon_chunks(ranges))
+        return [group_entry] + [self.pool_entry(pool) for pool in pools]
+
+    def polygon_chunks(self, ranges, depth=1):
+        """
+        Polygon nodes of the ranges of root level groups, their polygons formatted in chunks of chunk_polygons
+        triangles.
+        """
+        def chunks(pool_name, triangles, nested):
+            return [
+                Chunk(self._executor.submit(
+                    _format_polygons, pool_name, triangles[start:start + self.chunk_polygons], depth + nested,
+                ), depth + nested)
+                for start in range(0, len(triangles), self.chunk_polygons)
+            ]
+        return polygon_groups(ranges, chunks)
+
+    def pool_entry(self, pool):
+        """
+        Root level <VertexPool> whose vertices are formatted by ranges of chunk_vertices rows.
+        """
+        return Entry('VertexPool', name=pool.name, content=[
+            Chunk(self._executor.submit(_format_pool_rows, pool.rows(start, start + self.chunk_vertices)), 1)
+            for start in range(0, pool.count(), self.chunk_vertices)
+        ])
+
+
+def _format_object(nodes, ranges):
+    nodes[0].contents.extend(polygon_groups(ranges))
+    return format_nodes([Egg(nodes)])
+
+
+def _format_polygons(pool_name, triangles, depth):
+    return format_nodes(polygon_entries(pool_name, triangles), depth=depth)
+
+
+def _format_pool_rows(pool):
+    output = io.StringIO()
+    with EggWriter(output) as writer:
+        writer.depth = 1
+        pool.write_rows(writer)
+    return output.getvalue()
@@ -0,0 +1,140 @@
+import re
+
+from .egg import Egg, Entry
+
+# Quoted strings, comments, <Type>, braces and bare words. Quoted strings keep their quotes so a parsed tree is written
+# back as valid egg.
+TOKEN_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"|//[^\n]*|/\*.*?\*/|<[^>]*>|[{}]|[^\s{}"]+', re.DOTALL)
+# Same tokens, plus unterminated strings, comments and types running to the end of the text. Those can only match at the
+# end of a chunk, where the token is completed by the next one.
+STREAM_TOKEN_PATTERN = re.compile(
+    r'"(?:[^"\\]|\\.)*"|"(?:[^"\\]|\\.)*\\?|//[^\n]*|/\*.*?\*/|/\*.*|<[^>]*>|<[^>]*|[{}]|[^\s{}"]+',
+    re.DOTALL,
+)
+READ_SIZE = 1 << 16
+
+
+def parse(text):
+    """
+    Build the Entry tree of egg text.
+    Consecutive values within an entry become a tuple, or a str when there is a single one, e.g. the rows of a <V> block
+    or the quoted text of a <Comment>. Comments (// and /* */) are dropped.
+    """
+    root = Egg()
+    stack = [root]
+    parent = root
+    values = []
+    entry_type = None
+    name = None
+
+    for token in TOKEN_PATTERN.findall(text):
+        first = token[0]
+        if first == '<':
+            if values:
+                parent.contents.append(values[0] if len(values) == 1 else tuple(values))
+                values = []
+            entry_type = token[1:-1]
+            name = None
+        elif first == '{':
+            if entry_type is None:
+                raise ValueError('unexpected {{ after {}'.format(_path(stack)))
+            entry = Entry(entry_type, name)
+            parent.contents.append(entry)
+            stack.append(entry)
+            parent = entry
+            entry_type = None
+        elif first == '}':
+            if len(stack) == 1:
+                raise ValueError('unbalanced } at the root of the egg')
+            if values:
+                parent.contents.append(values[0] if len(values) == 1 else tuple(values))
+                values = []
+            stack.pop()
+            parent = stack[-1]
+        elif first == '/' and (token.startswith('//') or token.startswith('/*')):
+            continue
+        elif entry_type is not None:
+            name = token if name is None else '{} {}'.format(name, token)
+        else:
+            values.append(token)
+
+    if entry_type is not None or len(stack) > 1:
+        raise ValueError('unexpected end of egg in {}'.format(_path(stack)))
+    if values:
+        root.contents.append(values[0] if len(values) == 1 else tuple(values))
+    return root
+
+
+def iterparse(eggfile, read_size=READ_SIZE):
+    """
+    Read an egg text file object incrementally, yielding events instead of building a tree:
+    ('start', type, name) when an entry opens, ('data', value) for its values, grouped as by parse(), and
+    ('end', type, name) when it closes. Only the stack of open entries and the current chunk are held in memory.
+    """
+    stack = []
+    values = []
+    entry_type = None
+    name = None
+    buffer = ''
+
+    while True:
+        chunk = eggfile.read(read_size)
+        buffer += chunk
+        consumed = len(buffer)
+        for match in STREAM_TOKEN_PATTERN.finditer(buffer):
+            if chunk and match.end() == len(buffer):
+                # the token may go on in the next chunk.
+                consumed = match.start()
+                break
+            token = match.group()
+            first = token[0]
+            if first == '<':
+                if values:
+                    yield ('data', values[0] if len(values) == 1 else tuple(values))
+                    values = []
+                entry_type = token[1:-1]
+                name = None
+            elif first == '{':
+                if entry_type is None:
+                    raise ValueError('unexpected {{ after {}'.format(_stream_path(stack)))
+                stack.append((entry_type, name))
+                yield ('start', entry_type, name)
+                entry_type = None
+            elif first == '}':
+                if not stack:
+                    raise ValueError('unbalanced } at the root of the egg')
+                if values:
+                    yield ('data', values[0] if len(values) == 1 else tuple(values))
+                    values = []
+                closed_type, closed_name = stack.pop()
+                yield ('end', closed_type, closed_name)
+            elif first == '/' and (token.startswith('//') or token.startswith('/*')):
+                continue
+            elif entry_type is not None:
+                name = token if name is None else '{} {}'.format(name, token)
+            else:
+                values.append(token)
+        buffer = buffer[consumed:]
+        if not chunk:
+            break
+
+    if entry_type is not None or stack:
+        raise ValueError('unexpected end of egg in {}'.format(_stream_path(stack)))
+    if values:
+        yield ('data', values[0] if len(values) == 1 else tuple(values))
+
+
+def load(filepath, encoding='UTF-8'):
+    """
+    Parse an egg file.
+    """
+    with open(filepath, encoding=encoding) as eggfile:
+        return parse(eggfile.read())
+
+
+def _stream_path(stack):
+    return '/'.join('<{}> {}'.format(entry_type, name) for entry_type, name in stack) or 'the root'
+
+
+def _path(stack):
+    return '/'.join('<{}> {}'.format(entry.type, entry.name) for entry in stack[1:]) or 'the root'
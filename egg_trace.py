@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+import time
+
+
+class Tracer():
+    """
+    Record nested spans of the export as Chrome trace events, written as a trace.json file that opens in
+    chrome://tracing or ui.perfetto.dev.
+
+        with tracer.span('extract_mesh', 'mesh', name=mesh.name):
+            ...
+    """
+    enabled = True
+
+    def __init__(self):
+        self.events = []
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+
+    def span(self, event, category='export', **args):
+        return Span(self, event, category, args)
+
+    def _record(self, name, category, start, end, args):
+        self.events.append({
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start - self._origin) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': self._pid,
+            'tid': threading.get_ident(),
+            'args': args,
+        })
+
+    def write(self, filepath):
+        with open(filepath, 'w') as trace_file:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, trace_file)
+
+
+class Span():
+    __slots__ = ('_tracer', '_name', '_category', '_args', '_start')
+
+    def __init__(self, tracer, name, category, args):
+        self._tracer = tracer
+        self._name = name
+        self._category = category
+        self._args = args
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self._tracer._record(self._name, self._category, self._start, time.perf_counter(), self._args)
+        return False
+
+
+class NullTracer():
+    """
+    Tracer of exports that are not traced, its spans do nothing.
+    """
+    enabled = False
+
+    def span(self, event, category='export', **args):
+        return _NULL_SPAN
+
+    def write(self, filepath):
+        pass
+
+
+class _NullSpan():
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+NULL_TRACER = NullTracer()
+
+
+def trace_path(egg_filepath):
+    """
+    Path of the trace of an export, next to the egg file: box.egg and box.egg.pz are traced in box.trace.json.
+    """
+    base = egg_filepath[:-len('.pz')] if egg_filepath.endswith('.pz') else egg_filepath
+    base = base[:-len('.egg')] if base.endswith('.egg') else base
+    return base + '.trace.json'
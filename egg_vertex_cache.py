@@ -0,0 +1,117 @@
+from collections import deque
+
+import numpy as np
+
+CACHE_SIZE = 32
+# Vertex scores of Tom Forsyth's "Linear-Speed Vertex Cache Optimisation".
+CACHE_DECAY_POWER = 1.5
+LAST_TRIANGLE_SCORE = 0.75
+VALENCE_BOOST_SCALE = 2.0
+VALENCE_BOOST_POWER = 0.5
+
+
+def optimize(triangles, vertex_count, cache_size=CACHE_SIZE):
+    """
+    Order of (t, 3) triangles improving the reuse of the post-transform vertex cache.
+    Triangles are added one at a time, greedily picking the best scored triangle among the ones using a vertex of a
+    simulated LRU cache. A vertex scores higher near the front of the cache and when few of its triangles are left, so
+    lone vertices are finished first. Returns the (t,) indices of the triangles in their new order.
+    """
+    triangle_count = len(triangles)
+    if not triangle_count:
+        return np.zeros(0, dtype=np.int64)
+    flat = np.asarray(triangles, dtype=np.int64).ravel()
+    valence = np.bincount(flat, minlength=vertex_count)
+
+    # the remaining triangles of vertex v are vertex_triangles[offsets[v]:offsets[v] + remaining[v]].
+    vertex_triangles = (np.argsort(flat, kind='stable') // 3).tolist()
+    offsets = (np.cumsum(valence) - valence).tolist()
+    remaining = valence.tolist()
+    vertices = np.asarray(triangles).tolist()
+
+    position_scores = [LAST_TRIANGLE_SCORE] * 3 + [
+        (1.0 - position / float(cache_size - 3)) ** CACHE_DECAY_POWER for position in range(cache_size - 3)
+    ]
+    valence_scores = [0.0] + [
+        VALENCE_BOOST_SCALE * count ** -VALENCE_BOOST_POWER for count in range(1, int(valence.max()) + 1)
+    ]
+    scores = [valence_scores[count] for count in remaining]
+
+    added = bytearray(triangle_count)
+    order = []
+    cache = []
+    best = 0
+    next_triangle = 0
+    for _ in range(triangle_count):
+        if best < 0:
+            # no triangle left around the cache, restart from the first triangle not added yet.
+            while added[next_triangle]:
+                next_triangle += 1
+            best = next_triangle
+        added[best] = 1
+        order.append(best)
+
+        triangle = vertices[best]
+        for vertex in triangle:
+            start = offsets[vertex]
+            last = start + remaining[vertex] - 1
+            for index in range(start, last + 1):
+                if vertex_triangles[index] == best:
+                    vertex_triangles[index] = vertex_triangles[last]
+                    vertex_triangles[last] = best
+                    break
+            remaining[vertex] -= 1
+
+        cache = triangle + [vertex for vertex in cache if vertex not in triangle]
+        for vertex in cache[cache_size:]:
+            scores[vertex] = valence_scores[remaining[vertex]]
+        del cache[cache_size:]
+        for position, vertex in enumerate(cache):
+            scores[vertex] = position_scores[position] + valence_scores[remaining[vertex]]
+
+        best = -1
+        best_score = -1.0
+        for vertex in cache:
+            start = offsets[vertex]
+            for index in range(start, start + remaining[vertex]):
+                candidate = vertex_triangles[index]
+                a, b, c = vertices[candidate]
+                score = scores[a] + scores[b] + scores[c]
+                if score > best_score:
+                    best = candidate
+                    best_score = score
+
+    return np.array(order, dtype=np.int64)
+
+
+def cache_misses(triangles, cache_size=CACHE_SIZE):
+    """
+    Number of vertices transformed when drawing the (t, 3) triangles with a FIFO cache of cache_size vertices.
+    Divided by the number of triangles, it is the average cache miss ratio (ACMR): 3 without any reuse, around 0.5 at
+    best on large regular meshes.
+    """
+    cache = deque()
+    cached = set()
+    misses = 0
+    for vertex in np.asarray(triangles).ravel().tolist():
+        if vertex not in cached:
+            misses += 1
+            cache.append(vertex)
+            cached.add(vertex)
+            if len(cache) > cache_size:
+                cached.discard(cache.popleft())
+    return misses
+
+
+def renumber_first_use(triangles, vertex_count):
+    """
+    Renumber the vertices of (t, 3) triangles in the order they are first used, the unused ones last. Returns the
+    renumbered triangles and the (vertex_count,) old index of every new vertex.
+    """
+    flat = np.asarray(triangles, dtype=np.int64).ravel()
+    used, first_use = np.unique(flat, return_index=True)
+    unused = np.setdiff1d(np.arange(vertex_count), used)
+    vertex_order = np.concatenate([used[np.argsort(first_use)], unused]).astype(np.int64)
+    new_index = np.empty(vertex_count, dtype=np.int64)
+    new_index[vertex_order] = np.arange(vertex_count)
+    return new_index[triangles].astype(np.int32), vertex_order
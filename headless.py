@@ -0,0 +1,963 @@
+"""
+Stand-in for the subset of the blender python API used by the exporter, so it can be imported, tested, profiled and
+benchmarked outside of blender. Mesh data is held in NumPy arrays and read back with foreach_get like blender's.
+install() registers the bpy, bpy_extras and mathutils modules, scenes are built by hand (Mesh.from_pydata) or from the
+meshes of an egg file (load_egg). Actions animate objects and shape keys through their F-curves, scene.frame_set
+evaluates them; objects and pose bones ignore their constraints.
+"""
+import math
+import os
+import re
+import sys
+import types
+
+import numpy as np
+
+
+class Vector():
+    """
+    mathutils.Vector
+    """
+    def __init__(self, values=(0.0, 0.0, 0.0)):
+        self._array = np.array(values, dtype=np.float64)
+
+    @property
+    def x(self):
+        return float(self._array[0])
+
+    @property
+    def y(self):
+        return float(self._array[1])
+
+    @property
+    def z(self):
+        return float(self._array[2])
+
+    @property
+    def length(self):
+        return float(np.linalg.norm(self._array))
+
+    def to_tuple(self, precision=None):
+        values = self._array.tolist()
+        return tuple(values if precision is None else (round(value, precision) for value in values))
+
+    def __array__(self, dtype=None, copy=None):
+        return self._array if dtype is None else self._array.astype(dtype)
+
+    def __len__(self):
+        return len(self._array)
+
+    def __iter__(self):
+        return iter(self._array.tolist())
+
+    def __getitem__(self, index):
+        return float(self._array[index])
+
+    def __setitem__(self, index, value):
+        self._array[index] = value
+
+    def __eq__(self, other):
+        return np.array_equal(self._array, np.asarray(other, dtype=np.float64))
+
+    def __add__(self, other):
+        return Vector(self._array + np.asarray(other))
+
+    def __sub__(self, other):
+        return Vector(self._array - np.asarray(other))
+
+    def __mul__(self, scalar):
+        return Vector(self._array * scalar)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Vector(-self._array)
+
+    def __repr__(self):
+        return 'Vector({})'.format(self.to_tuple())
+
+
+class Matrix():
+    """
+    mathutils.Matrix, a list of rows. Multiplied with * as in blender 2.7x, or with @.
+    """
+    def __init__(self, rows=None):
+        self._array = np.identity(4) if rows is None else np.array([list(row) for row in rows], dtype=np.float64)
+
+    @classmethod
+    def Identity(cls, size):
+        return cls(np.identity(size))
+
+    @classmethod
+    def Translation(cls, vector):
+        matrix = np.identity(4)
+        matrix[:3, 3] = list(vector)
+        return cls(matrix)
+
+    def copy(self):
+        return Matrix(self._array)
+
+    def transposed(self):
+        return Matrix(self._array.T)
+
+    def inverted(self):
+        return Matrix(np.linalg.inv(self._array))
+
+    def to_translation(self):
+        return Vector(self._array[:3, 3])
+
+    def __array__(self, dtype=None, copy=None):
+        return self._array if dtype is None else self._array.astype(dtype)
+
+    def __len__(self):
+        return len(self._array)
+
+    def __iter__(self):
+        return (Vector(row) for row in self._array)
+
+    def __getitem__(self, index):
+        return Vector(self._array[index])
+
+    def __eq__(self, other):
+        return np.array_equal(self._array, np.asarray(other, dtype=np.float64))
+
+    def __mul__(self, other):
+        if isinstance(other, Matrix):
+            return Matrix(np.dot(self._array, other._array))
+        vector = np.asarray(other, dtype=np.float64)
+        if len(vector) == 3 and len(self._array) == 4:
+            return Vector(np.dot(self._array[:3, :3], vector) + self._array[:3, 3])
+        return Vector(np.dot(self._array, vector))
+
+    __matmul__ = __mul__
+
+    def __repr__(self):
+        return 'Matrix({})'.format(self._array.tolist())
+
+
+class Collection():
+    """
+    bpy_prop_collection of mesh elements, their attributes stored as columns. Elements are created on access.
+    """
+    def __init__(self, columns, length):
+        self._columns = columns
+        self._length = length
+
+    def foreach_get(self, attribute, buffer):
+        column = self._columns[attribute]
+        if np.size(buffer) != column.size:
+            raise RuntimeError('internal error setting the array: expected {} items, got {}'.format(
+                column.size, np.size(buffer),
+            ))
+        buffer[:] = column.ravel()
+
+    def foreach_set(self, attribute, buffer):
+        column = self._columns[attribute]
+        if np.size(buffer) != column.size:
+            raise RuntimeError('internal error setting the array: expected {} items, got {}'.format(
+                column.size, np.size(buffer),
+            ))
+        column[...] = np.reshape(buffer, column.shape)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if not -self._length <= index < self._length:
+            raise IndexError('bpy_prop_collection[index]: index {} out of range'.format(index))
+        return Element(self, index % self._length)
+
+    def __iter__(self):
+        return (Element(self, index) for index in range(self._length))
+
+
+class Element():
+    """
+    Vertex, polygon or loop of a mesh, reading its attributes from the columns of its collection.
+    """
+    __slots__ = ('_collection', 'index')
+
+    def __init__(self, collection, index):
+        self._collection = collection
+        self.index = index
+
+    def __getattr__(self, attribute):
+        try:
+            column = self._collection._columns[attribute]
+        except KeyError:
+            raise AttributeError(attribute)
+        value = column[self.index]
+        return Vector(value) if column.ndim > 1 else value.item()
+
+
+class DataCollection(list):
+    """
+    Collection of datablocks (bpy.data.scenes, bpy.data.meshes...), indexed by position or by name.
+    """
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            for datablock in self:
+                if datablock.name == key:
+                    return datablock
+            raise KeyError('bpy_prop_collection[key]: key "{}" not found'.format(key))
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        return next((datablock for datablock in self if datablock.name == key), default)
+
+    def unique_name(self, name):
+        """
+        Name of a new datablock, suffixed with .001, .002... like blender's when it is already used.
+        """
+        names = set(datablock.name for datablock in self)
+        unique = name
+        suffix = 0
+        while unique in names:
+            suffix += 1
+            unique = '{}.{:03d}'.format(name, suffix)
+        return unique
+
+
+class Material():
+    def __init__(self, name):
+        self.name = name
+
+
+class LoopLayer():
+    """
+    UV or vertex color layer, holding one value per loop.
+    """
+    def __init__(self, name, attribute, values):
+        self.name = name
+        self.data = Collection({attribute: values}, len(values))
+
+
+class LoopLayers(DataCollection):
+    """
+    mesh.uv_layers and mesh.vertex_colors. Vertex colors are RGBA like blender 2.8's.
+    """
+    def __init__(self, mesh, attribute, default):
+        super().__init__()
+        self._mesh = mesh
+        self._attribute = attribute
+        self._default = default
+        self.active = None
+
+    def new(self, name=None):
+        loop_count = len(self._mesh.loops)
+        layer = LoopLayer(
+            self.unique_name(name or ('UVMap' if self._attribute == 'uv' else 'Col')),
+            self._attribute,
+            np.tile(np.array(self._default, dtype=np.float32), (loop_count, 1)),
+        )
+        self.append(layer)
+        if self.active is None:
+            self.active = layer
+        return layer
+
+
+class KeyBlock():
+    def __init__(self, name, co, relative_key=None):
+        self.name = name
+        self.data = Collection({'co': co}, len(co))
+        self.relative_key = relative_key or self
+        self.value = 0.0
+        self.mute = False
+
+
+class Key():
+    """
+    Shape keys of a mesh, the first block is the reference key.
+    """
+    def __init__(self):
+        self.key_blocks = DataCollection()
+        self.animation_data = None
+
+    def animation_data_create(self):
+        self.animation_data = self.animation_data or AnimData()
+        return self.animation_data
+
+    @property
+    def reference_key(self):
+        return self.key_blocks[0]
+
+
+# enum values of keyframe interpolations, as foreach_get reads them.
+INTERPOLATIONS = {'CONSTANT': 0, 'LINEAR': 1, 'BEZIER': 2}
+
+
+class KeyframePoints(Collection):
+    """
+    Keyframes of an F-curve, sorted by frame. Inserted keys get automatic clamped handles, a third of the way to their
+    neighbours and flat at the extremes.
+    """
+    def __init__(self, interpolation):
+        self._interpolation = interpolation
+        super().__init__({
+            'co': np.zeros((0, 2), dtype=np.float32), 'handle_left': np.zeros((0, 2), dtype=np.float32),
+            'handle_right': np.zeros((0, 2), dtype=np.float32),
+            'interpolation': np.zeros(0, dtype=np.int32),
+        }, 0)
+
+    def insert(self, frame, value):
+        co = self._columns['co']
+        index = int(np.searchsorted(co[:, 0], frame))
+        if index < len(co) and co[index, 0] == frame:
+            co[index, 1] = value
+        else:
+            self._columns['co'] = np.insert(co, index, (frame, value), axis=0)
+            self._columns['interpolation'] = np.insert(
+                self._columns['interpolation'], index, INTERPOLATIONS[self._interpolation],
+            )
+            self._length += 1
+        self._auto_handles()
+        return self[index]
+
+    def _auto_handles(self):
+        co = self._columns['co']
+        previous = np.concatenate((co[:1], co[:-1]))
+        following = np.concatenate((co[1:], co[-1:]))
+        spans = following[:, 0] - previous[:, 0]
+        slopes = np.where(spans > 0, (following[:, 1] - previous[:, 1]) / np.where(spans > 0, spans, 1), 0.0)
+        extremes = (co[:, 1] - previous[:, 1]) * (following[:, 1] - co[:, 1]) <= 0
+        slopes[extremes] = 0.0
+        left = (co[:, 0] - previous[:, 0]) / 3.0
+        right = (following[:, 0] - co[:, 0]) / 3.0
+        self._columns['handle_left'] = np.stack([co[:, 0] - left, co[:, 1] - slopes * left], axis=1).astype(np.float32)
+        self._columns['handle_right'] = np.stack(
+            [co[:, 0] + right, co[:, 1] + slopes * right], axis=1,
+        ).astype(np.float32)
+
+
+class FCurve():
+    """
+    Animation curve of the array_index component of the property at data_path. evaluate() follows blender's
+    fcurve_eval_keyframes, one keyframe at a time.
+    """
+    def __init__(self, data_path, index=0, interpolation='BEZIER'):
+        self.data_path = data_path
+        self.array_index = index
+        self.keyframe_points = KeyframePoints(interpolation)
+        self.extrapolation = 'CONSTANT'
+        self.modifiers = []
+        self.mute = False
+
+    def evaluate(self, frame):
+        points = self.keyframe_points._columns
+        co, left, right, interpolation = (
+            points['co'], points['handle_left'], points['handle_right'], points['interpolation'],
+        )
+        count = len(co)
+        if not count:
+            return 0.0
+        linear = self.extrapolation == 'LINEAR'
+        if frame <= co[0, 0]:
+            if not linear or interpolation[0] == INTERPOLATIONS['CONSTANT']:
+                return float(co[0, 1])
+            if interpolation[0] == INTERPOLATIONS['LINEAR']:
+                other = co[1] if count > 1 else co[0]
+            else:
+                other = left[0]
+            span = co[0, 0] - other[0]
+            slope = (co[0, 1] - other[1]) / span if span else 0.0
+            return float(co[0, 1] - slope * (co[0, 0] - frame))
+        if frame >= co[-1, 0]:
+            if not linear or interpolation[-1] == INTERPOLATIONS['CONSTANT']:
+                return float(co[-1, 1])
+            if interpolation[-1] == INTERPOLATIONS['LINEAR']:
+                other = co[-2] if count > 1 else co[-1]
+            else:
+                other = right[-1]
+            span = co[-1, 0] - other[0]
+            slope = (co[-1, 1] - other[1]) / span if span else 0.0
+            return float(co[-1, 1] + slope * (frame - co[-1, 0]))
+
+        index = int(np.searchsorted(co[:, 0], frame, side='right')) - 1
+        (x0, y0), (x3, y3) = co[index].astype(np.float64), co[index + 1].astype(np.float64)
+        if frame == x0:
+            return float(y0)
+        if interpolation[index] == INTERPOLATIONS['CONSTANT']:
+            return float(y0)
+        if interpolation[index] == INTERPOLATIONS['LINEAR']:
+            return float(y0 + (y3 - y0) * (frame - x0) / (x3 - x0))
+        (x1, y1), (x2, y2) = _correct_bezier_part(co[index], right[index], left[index + 1], co[index + 1])
+        # roots of x(t) - frame, x(t) being the cubic bezier of the frames of the segment.
+        roots = np.roots([-x0 + 3 * x1 - 3 * x2 + x3, 3 * x0 - 6 * x1 + 3 * x2, -3 * x0 + 3 * x1, x0 - frame])
+        roots = [root.real for root in roots if abs(root.imag) < 1e-9 and -1e-9 <= root.real <= 1 + 1e-9]
+        t = min(max(roots[0], 0.0), 1.0) if roots else (frame - x0) / (x3 - x0)
+        return float((1 - t) ** 3 * y0 + 3 * (1 - t) ** 2 * t * y1 + 3 * (1 - t) * t ** 2 * y2 + t ** 3 * y3)
+
+
+def _correct_bezier_part(v1, v2, v3, v4):
+    """
+    Handles of a bezier segment shortened as blender's correct_bezpart does, so the curve never goes back in time.
+    """
+    v1, v2, v3, v4 = (np.array(point, dtype=np.float64) for point in (v1, v2, v3, v4))
+    h1 = v1 - v2
+    h2 = v4 - v3
+    length = v4[0] - v1[0]
+    total = abs(h1[0]) + abs(h2[0])
+    if total and total > length:
+        factor = length / total
+        v2 = v1 - factor * h1
+        v3 = v4 - factor * h2
+    return v2, v3
+
+
+class FCurves(list):
+    def new(self, data_path, index=0, action_group=''):
+        fcurve = FCurve(data_path, index)
+        self.append(fcurve)
+        return fcurve
+
+    def find(self, data_path, index=0):
+        return next((
+            fcurve for fcurve in self if fcurve.data_path == data_path and fcurve.array_index == index
+        ), None)
+
+
+class Action():
+    def __init__(self, name):
+        self.name = name
+        self.fcurves = FCurves()
+
+    @property
+    def frame_range(self):
+        frames = [point[0] for fcurve in self.fcurves for point in fcurve.keyframe_points._columns['co']]
+        return Vector((min(frames), max(frames)) if frames else (0.0, 0.0))
+
+
+class AnimData():
+    def __init__(self, action=None):
+        self.action = action
+        self.drivers = FCurves()
+        self.nla_tracks = []
+
+
+class Bone():
+    """
+    Bone of an armature, matrix_local being its rest transform in armature space.
+    """
+    def __init__(self, name, matrix_local=None, parent=None):
+        self.name = name
+        self.matrix_local = Matrix(matrix_local)
+        self.parent = parent
+        self.use_inherit_rotation = True
+        self.use_inherit_scale = True
+
+
+class Armature():
+    def __init__(self, name):
+        self.name = name
+        self.bones = DataCollection()
+
+    def new_bone(self, name, matrix_local=None, parent=None):
+        """
+        Add a bone, the stand-in for creating it as an edit bone.
+        """
+        bone = Bone(self.bones.unique_name(name), matrix_local, parent)
+        self.bones.append(bone)
+        return bone
+
+
+class PoseBone():
+    """
+    Pose channels of a bone. rotation_quaternion is (w, x, y, z) and rotation_axis_angle (angle, x, y, z).
+    """
+    def __init__(self, pose, bone):
+        self._pose = pose
+        self.bone = bone
+        self.name = bone.name
+        self.location = Vector((0.0, 0.0, 0.0))
+        self.rotation_quaternion = Vector((1.0, 0.0, 0.0, 0.0))
+        self.rotation_euler = Vector((0.0, 0.0, 0.0))
+        self.rotation_axis_angle = Vector((0.0, 0.0, 1.0, 0.0))
+        self.rotation_mode = 'QUATERNION'
+        self.scale = Vector((1.0, 1.0, 1.0))
+        self.constraints = []
+
+    @property
+    def parent(self):
+        return None if self.bone.parent is None else self._pose.bones[self.bone.parent.name]
+
+    @property
+    def matrix_basis(self):
+        return Matrix(_basis_matrix(self))
+
+    @property
+    def matrix(self):
+        """
+        Pose matrix in armature space, constraints are not evaluated.
+        """
+        rest = np.asarray(self.bone.matrix_local)
+        if self.parent is None:
+            return Matrix(np.dot(rest, np.asarray(self.matrix_basis)))
+        parent_rest = np.asarray(self.bone.parent.matrix_local)
+        return Matrix(np.linalg.multi_dot([
+            np.asarray(self.parent.matrix), np.linalg.inv(parent_rest), rest, np.asarray(self.matrix_basis),
+        ]))
+
+
+class Pose():
+    def __init__(self, armature):
+        self.bones = DataCollection()
+        for bone in armature.bones:
+            self.bones.append(PoseBone(self, bone))
+
+
+def _basis_matrix(owner):
+    """
+    Local transform of the location, rotation and scale channels of an object or pose bone.
+    """
+    if owner.rotation_mode == 'QUATERNION':
+        rotation = _quaternion_matrix(owner.rotation_quaternion)
+    elif owner.rotation_mode == 'AXIS_ANGLE':
+        angle, x, y, z = owner.rotation_axis_angle
+        length = math.sqrt(x * x + y * y + z * z)
+        half = angle / 2.0
+        quaternion = (1.0, 0.0, 0.0, 0.0)
+        if length:
+            quaternion = (math.cos(half),) + tuple(math.sin(half) * value / length for value in (x, y, z))
+        rotation = _quaternion_matrix(quaternion)
+    else:
+        rotation = np.identity(3)
+        for axis, angle in zip(owner.rotation_mode, owner.rotation_euler):
+            rotation = np.dot(_axis_rotation(axis, angle), rotation)
+    matrix = np.identity(4)
+    matrix[:3, :3] = rotation * np.asarray(owner.scale)
+    matrix[:3, 3] = list(owner.location)
+    return matrix
+
+
+def _quaternion_matrix(quaternion):
+    w, x, y, z = np.asarray(quaternion, dtype=np.float64) / np.linalg.norm(quaternion)
+    return np.array([
+        (1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)),
+        (2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)),
+        (2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)),
+    ])
+
+
+def _axis_rotation(axis, angle):
+    cos, sin = math.cos(angle), math.sin(angle)
+    if axis == 'X':
+        return np.array([(1, 0, 0), (0, cos, -sin), (0, sin, cos)])
+    if axis == 'Y':
+        return np.array([(cos, 0, sin), (0, 1, 0), (-sin, 0, cos)])
+    return np.array([(cos, -sin, 0), (sin, cos, 0), (0, 0, 1)])
+
+
+class Mesh():
+    def __init__(self, name):
+        self.name = name
+        self.materials = []
+        self.shape_keys = None
+        self.from_pydata(np.zeros((0, 3)), [], [])
+
+    def from_pydata(self, vertices, edges, faces):
+        """
+        Set the vertices and faces of the mesh (edges are ignored). faces is a list of vertex index sequences, or a 2d
+        array when all faces have the same number of vertices.
+        """
+        co = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+        if isinstance(faces, np.ndarray) and faces.ndim == 2:
+            loop_total = np.full(len(faces), faces.shape[1], dtype=np.int32)
+            loop_vertex_index = faces.astype(np.int32).ravel()
+        else:
+            loop_total = np.array([len(face) for face in faces], dtype=np.int32)
+            loop_vertex_index = np.array([index for face in faces for index in face], dtype=np.int32)
+        loop_start = np.concatenate(([0], np.cumsum(loop_total)[:-1])).astype(np.int32)
+
+        # Newell normals of the polygons, the vertices get the normalized sum of the ones of their polygons.
+        loop_polygon = np.repeat(np.arange(len(loop_total)), loop_total)
+        next_loops = np.arange(len(loop_vertex_index)) + 1
+        next_loops[loop_start + loop_total - 1] = loop_start
+        points = co[loop_vertex_index].astype(np.float64)
+        corner_normals = np.cross(points, points[next_loops])
+        polygon_normals = np.zeros((len(loop_total), 3))
+        np.add.at(polygon_normals, loop_polygon, corner_normals)
+        vertex_normals = np.zeros((len(co), 3))
+        np.add.at(vertex_normals, loop_vertex_index, polygon_normals[loop_polygon])
+
+        self.vertices = Collection({'co': co, 'normal': _normalized(vertex_normals)}, len(co))
+        self.polygons = Collection({
+            'loop_start': loop_start,
+            'loop_total': loop_total,
+            'material_index': np.zeros(len(loop_total), dtype=np.int32),
+            'use_smooth': np.zeros(len(loop_total), dtype=bool),
+            'normal': _normalized(polygon_normals),
+        }, len(loop_total))
+        self.loops = Collection({'vertex_index': loop_vertex_index}, len(loop_vertex_index))
+        self.uv_layers = LoopLayers(self, 'uv', (0.0, 0.0))
+        self.vertex_colors = LoopLayers(self, 'color', (1.0, 1.0, 1.0, 1.0))
+        self.shape_keys = None
+
+
+class Object():
+    """
+    Object with the transform channels of a pose bone, rotation_mode defaulting to 'XYZ'. matrix_world is computed from
+    them and the one of the parent, setting it sets the location, XYZ euler and scale (shear is lost).
+    """
+    def __init__(self, name, object_data=None, matrix_world=None):
+        self.name = name
+        self.data = object_data
+        self.type = {Mesh: 'MESH', Armature: 'ARMATURE'}.get(type(object_data), 'EMPTY')
+        self.location = Vector((0.0, 0.0, 0.0))
+        self.rotation_quaternion = Vector((1.0, 0.0, 0.0, 0.0))
+        self.rotation_euler = Vector((0.0, 0.0, 0.0))
+        self.rotation_axis_angle = Vector((0.0, 0.0, 1.0, 0.0))
+        self.rotation_mode = 'XYZ'
+        self.scale = Vector((1.0, 1.0, 1.0))
+        self.constraints = []
+        self.parent = None
+        self.parent_type = 'OBJECT'
+        self.matrix_parent_inverse = Matrix()
+        self.matrix_world = Matrix(matrix_world)
+        self.pose = Pose(object_data) if self.type == 'ARMATURE' else None
+        self.animation_data = None
+
+    @property
+    def matrix_basis(self):
+        return Matrix(_basis_matrix(self))
+
+    @property
+    def matrix_world(self):
+        matrix = _basis_matrix(self)
+        if self.parent is not None:
+            matrix = np.linalg.multi_dot([
+                np.asarray(self.parent.matrix_world), np.asarray(self.matrix_parent_inverse), matrix,
+            ])
+        return Matrix(matrix)
+
+    @matrix_world.setter
+    def matrix_world(self, matrix):
+        matrix = np.asarray(matrix, dtype=np.float64)
+        if self.parent is not None:
+            matrix = np.linalg.solve(
+                np.dot(np.asarray(self.parent.matrix_world), np.asarray(self.matrix_parent_inverse)), matrix,
+            )
+        scale = np.linalg.norm(matrix[:3, :3], axis=0)
+        rotation = matrix[:3, :3] / np.where(scale > 0, scale, 1.0)
+        self.location = Vector(matrix[:3, 3])
+        self.rotation_mode = 'XYZ'
+        self.rotation_euler = Vector((
+            math.atan2(rotation[2, 1], rotation[2, 2]), math.atan2(-rotation[2, 0], math.hypot(*rotation[:2, 0])),
+            math.atan2(rotation[1, 0], rotation[0, 0]),
+        ))
+        self.scale = Vector(scale)
+
+    def animation_data_create(self):
+        self.animation_data = self.animation_data or AnimData()
+        return self.animation_data
+
+    def shape_key_add(self, name='Key', from_mix=True):
+        """
+        Add a shape key to the mesh of the object, the first one added is its reference key.
+        """
+        mesh = self.data
+        if mesh.shape_keys is None:
+            mesh.shape_keys = Key()
+        co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get('co', co)
+        key_blocks = mesh.shape_keys.key_blocks
+        key_block = KeyBlock(key_blocks.unique_name(name), co.reshape(-1, 3), key_blocks[0] if key_blocks else None)
+        key_blocks.append(key_block)
+        return key_block
+
+
+class Scene():
+    def __init__(self, name, objects=None):
+        self.name = name
+        self.objects = DataCollection(objects or [])
+        self.frame_start = 1
+        self.frame_end = 250
+        self.frame_current = 1
+        self.render = types.SimpleNamespace(fps=24, fps_base=1.0)
+
+    def frame_set(self, frame, subframe=0.0):
+        """
+        Go to a frame and evaluate the actions of the objects of the scene and of their shape keys.
+        """
+        self.frame_current = frame
+        for blend_object in self.objects:
+            owners = [blend_object]
+            if isinstance(blend_object.data, Mesh) and blend_object.data.shape_keys is not None:
+                owners.append(blend_object.data.shape_keys)
+            for owner in owners:
+                action = owner.animation_data.action if owner.animation_data is not None else None
+                for fcurve in action.fcurves if action is not None else ():
+                    _set_path(owner, fcurve.data_path, fcurve.array_index, fcurve.evaluate(frame + subframe))
+
+
+class BlendData():
+    """
+    bpy.data
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.scenes = DataCollection()
+        self.objects = DataCollection()
+        self.meshes = DataCollection()
+        self.materials = DataCollection()
+        self.armatures = DataCollection()
+        self.actions = DataCollection()
+
+
+class Context():
+    """
+    bpy.context, its scene is the first scene of bpy.data.
+    """
+    def __init__(self, data):
+        self._data = data
+
+    @property
+    def scene(self):
+        return self._data.scenes[0] if self._data.scenes else None
+
+
+class Operator():
+    bl_idname = ''
+    bl_label = ''
+
+    def report(self, report_type, message):
+        print('{}: {}'.format(', '.join(sorted(report_type)), message))
+
+
+class AddonPreferences():
+    bl_idname = ''
+    layout = None
+
+
+class Menu(list):
+    """
+    Menu type, holding the draw functions appended to it.
+    """
+
+
+class ExportHelper():
+    """
+    bpy_extras.io_utils.ExportHelper
+    """
+    filepath = ''
+    check_existing = True
+
+    def invoke(self, context, event):
+        return {'RUNNING_MODAL'}
+
+
+def _property(default=None, **options):
+    """
+    Properties evaluate to their default, so operators can be instantiated and run directly.
+    """
+    return default
+
+
+def _set_path(owner, data_path, index, value):
+    """
+    Set the index component of the property at data_path, e.g. pose.bones["Bone"].location.
+    """
+    target = owner
+    parts = re.findall(r'\.?(\w+)|\["([^"]*)"\]', data_path)
+    for attribute, key in parts[:-1]:
+        target = getattr(target, attribute) if attribute else target[key]
+    attribute = parts[-1][0]
+    current = getattr(target, attribute)
+    if isinstance(current, Vector):
+        current[index] = value
+    else:
+        setattr(target, attribute, value)
+
+
+def _normalized(vectors):
+    lengths = np.linalg.norm(vectors, axis=1)[:, None]
+    return (vectors / np.where(lengths > 0, lengths, 1)).astype(np.float32)
+
+
+def ensure_ext(filepath, ext, case_sensitive=False):
+    """
+    bpy.path.ensure_ext
+    """
+    filename = os.path.basename(filepath)
+    if (filename if case_sensitive else filename.lower()).endswith(ext if case_sensitive else ext.lower()):
+        return filepath
+    return filepath + ext
+
+
+def install():
+    """
+    Register the bpy, bpy_extras and mathutils stand-in modules, returns bpy. Modules already imported, e.g. the real
+    ones when running in blender, are kept.
+    """
+    if 'bpy' in sys.modules:
+        return sys.modules['bpy']
+
+    def module(name, **attributes):
+        new_module = types.ModuleType(name)
+        new_module.__dict__.update(attributes)
+        sys.modules.setdefault(name, new_module)
+        return sys.modules[name]
+
+    data = BlendData()
+    properties = {
+        name: _property for name in (
+            'BoolProperty', 'IntProperty', 'FloatProperty', 'StringProperty', 'EnumProperty', 'FloatVectorProperty',
+        )
+    }
+    bpy = module(
+        'bpy',
+        data=data,
+        context=Context(data),
+        props=module('bpy.props', **properties),
+        types=module(
+            'bpy.types', Operator=Operator, AddonPreferences=AddonPreferences, INFO_MT_file_export=Menu(),
+            Object=Object, Mesh=Mesh, Scene=Scene, Material=Material, Armature=Armature, Bone=Bone, Action=Action,
+        ),
+        path=module('bpy.path', ensure_ext=ensure_ext),
+        utils=module('bpy.utils', register_module=lambda module_name: None, unregister_module=lambda module_name: None),
+    )
+    module('bpy_extras', io_utils=module('bpy_extras.io_utils', ExportHelper=ExportHelper))
+    module('mathutils', Vector=Vector, Matrix=Matrix)
+    return bpy
+
+
+def load_egg(filepath, data=None):
+    """
+    Add a scene holding the meshes of an egg file to data (bpy.data by default).
+    Every group with polygons becomes a mesh object, one per vertex pool its polygons reference, with the referenced
+    vertices in world coordinates. <MRef> become the materials of the meshes, vertex <UV> and <RGBA> their uv and
+    vertex color layers, <Dxyz> their shape keys. Polygons without a <Normal> are smooth when their vertices have one.
+    """
+    from .egg_reader import load
+
+    data = install().data if data is None else data
+    egg = load(filepath)
+    pools = {}
+    _collect_pools(egg, pools)
+    scene = Scene(data.scenes.unique_name(os.path.basename(filepath).split('.')[0]))
+    data.scenes.append(scene)
+    _load_groups(egg, pools, scene, data)
+    return scene
+
+
+def _values(entry):
+    values = []
+    for content in entry.contents:
+        if isinstance(content, tuple):
+            values.extend(content)
+        elif isinstance(content, str):
+            values.append(content)
+    return values
+
+
+def _unquote(name):
+    return name[1:-1] if len(name) > 1 and name[0] == name[-1] == '"' else name
+
+
+def _children(entry, entry_type):
+    return [content for content in entry.contents if getattr(content, 'type', None) == entry_type]
+
+
+def _floats(entry, size):
+    values = [float(value) for value in _values(entry)[:size]]
+    return values + [0.0] * (size - len(values))
+
+
+def _collect_pools(entry, pools):
+    """
+    Index map and attribute arrays of every vertex pool: positions, normals (None when no vertex has one), uvs,
+    colors and morph offsets, the last three as dicts by name.
+    """
+    for child in entry.contents:
+        if not hasattr(child, 'type'):
+            continue
+        if child.type != 'VertexPool':
+            _collect_pools(child, pools)
+            continue
+
+        vertices = _children(child, 'Vertex')
+        count = len(vertices)
+        indices = {}
+        positions = np.zeros((count, 3))
+        normals = None
+        uvs = {}
+        colors = {}
+        morphs = {}
+        for row, vertex in enumerate(vertices):
+            indices[vertex.name] = row
+            positions[row] = _floats(vertex, 3)
+            for attribute in vertex.contents:
+                attribute_type = getattr(attribute, 'type', None)
+                if attribute_type == 'Normal':
+                    if normals is None:
+                        normals = np.zeros((count, 3))
+                    normals[row] = _floats(attribute, 3)
+                elif attribute_type == 'UV':
+                    uv_name = _unquote(attribute.name or 'UVMap')
+                    uvs.setdefault(uv_name, np.zeros((count, 2)))[row] = _floats(attribute, 2)
+                elif attribute_type == 'RGBA':
+                    colors.setdefault('Col', np.ones((count, 4)))[row] = _floats(attribute, 4)
+                elif attribute_type == 'Dxyz':
+                    morphs.setdefault(_unquote(attribute.name), np.zeros((count, 3)))[row] = _floats(attribute, 3)
+        pools[child.name] = (indices, positions, normals, uvs, colors, morphs)
+
+
+def _load_groups(entry, pools, scene, data):
+    for child in entry.contents:
+        if not hasattr(child, 'type') or child.type == 'VertexPool':
+            continue
+        polygons = _children(child, 'Polygon')
+        if polygons:
+            _load_meshes(_unquote(child.name or child.type), polygons, pools, scene, data)
+        _load_groups(child, pools, scene, data)
+
+
+def _load_meshes(name, polygons, pools, scene, data):
+    faces_by_pool = {}
+    for polygon in polygons:
+        materials = _children(polygon, 'MRef')
+        material = _unquote(_values(materials[0])[0]) if materials else None
+        flat = bool(_children(polygon, 'Normal'))
+        for vertex_ref in _children(polygon, 'VertexRef'):
+            pool_name = _values(_children(vertex_ref, 'Ref')[0])[0]
+            faces_by_pool.setdefault(pool_name, []).append((_values(vertex_ref), material, flat))
+
+    for pool_name, faces in faces_by_pool.items():
+        indices, positions, normals, uvs, colors, morphs = pools[pool_name]
+        rows = [[indices[index] for index in face] for face, _, _ in faces]
+        used = np.unique(np.concatenate([np.array(face, dtype=np.int64) for face in rows]))
+        remap = np.zeros(len(positions), dtype=np.int64)
+        remap[used] = np.arange(len(used))
+        loop_rows = np.array([row for face in rows for row in face], dtype=np.int64)
+
+        mesh_name = name if len(faces_by_pool) == 1 else '{}.{}'.format(name, _unquote(pool_name))
+        mesh = Mesh(data.meshes.unique_name(mesh_name))
+        mesh.from_pydata(positions[used], [], [remap[face].tolist() for face in rows])
+        if normals is not None:
+            mesh.vertices.foreach_set('normal', _normalized(normals[used]))
+            mesh.polygons.foreach_set('use_smooth', np.array([not flat for _, _, flat in faces]))
+        for layers, values_by_name in ((mesh.uv_layers, uvs), (mesh.vertex_colors, colors)):
+            for layer_name, values in sorted(values_by_name.items()):
+                layers.new(layer_name).data.foreach_set(layers._attribute, values[loop_rows])
+        material_names = sorted(set(material for _, material, _ in faces if material is not None))
+        for material_name in material_names:
+            material = data.materials.get(material_name)
+            if material is None:
+                material = Material(material_name)
+                data.materials.append(material)
+            mesh.materials.append(material)
+        if material_names:
+            mesh.polygons.foreach_set('material_index', np.array([
+                material_names.index(material) if material is not None else 0 for _, material, _ in faces
+            ], dtype=np.int32))
+        data.meshes.append(mesh)
+
+        blend_object = Object(data.objects.unique_name(mesh_name), mesh)
+        if morphs:
+            blend_object.shape_key_add('Basis')
+            for morph_name, deltas in sorted(morphs.items()):
+                key_block = blend_object.shape_key_add(morph_name)
+                key_block.data.foreach_set('co', (positions[used] + deltas[used]).astype(np.float32))
+        data.objects.append(blend_object)
+        scene.objects.append(blend_object)
@@ -0,0 +1,345 @@
+import math
+import unittest
+
+import numpy as np
+
+from egg_exporter.egg import FloatFormat
+from egg_exporter.egg_anim import (
+    TimelineSampler, animation_bundle, animation_key, armature_matrices, basis_matrices, decompose, decompose_matrices,
+    fold_channels, reduce_rate, sample_animation, sample_fcurves, shape_key_values,
+)
+from egg_exporter.egg_reader import parse
+from egg_exporter.headless import INTERPOLATIONS, Action, Armature, FCurve, Matrix, Mesh, Object, Scene
+
+FRAMES = np.linspace(-5, 30, 141)
+
+
+def fcurve(keyframes, interpolation='BEZIER', extrapolation='CONSTANT', data_path='location', index=0):
+    curve = FCurve(data_path, index, interpolation)
+    for frame, value in keyframes:
+        curve.keyframe_points.insert(frame, value)
+    curve.extrapolation = extrapolation
+    return curve
+
+
+def rig():
+    """
+    Armature of a root bone and a child bone, the child rotating on its parent's tail, animated over 20 frames.
+    """
+    armature = Armature('rig')
+    root = armature.new_bone('root', Matrix.Translation((0, 0, 1)))
+    armature.new_bone('arm', Matrix([(0, -1, 0, 0), (1, 0, 0, 0), (0, 0, 1, 2), (0, 0, 0, 1)]), root)
+    rig_object = Object('rig', armature, Matrix.Translation((1, 0, 0)))
+    action = Action('wave')
+    for index, keyframes in enumerate([[(1, 0), (10, 1), (20, 0)], [(1, 0), (20, 2)]]):
+        curve = action.fcurves.new('pose.bones["root"].location', index)
+        for frame, value in keyframes:
+            curve.keyframe_points.insert(frame, value)
+    for index, keyframes in enumerate([[(1, 1), (20, 0.5)], [(1, 0), (10, 0.5), (20, 0)]]):
+        curve = action.fcurves.new('pose.bones["arm"].rotation_quaternion', index)
+        for frame, value in keyframes:
+            curve.keyframe_points.insert(frame, value)
+    action.fcurves.new('pose.bones["arm"].scale', 2).keyframe_points.insert(5, 2)
+    rig_object.animation_data_create().action = action
+    scene = Scene('scene', [rig_object])
+    scene.frame_end = 20
+    return rig_object, scene
+
+
+def evaluated_matrices(rig_object, scene, frames):
+    """
+    Parent relative transforms of the bones read from the pose evaluated at every frame, the way the old exporter did.
+    """
+    matrices = {pose_bone.name: [] for pose_bone in rig_object.pose.bones}
+    for frame in frames:
+        scene.frame_set(int(math.floor(frame)), frame - math.floor(frame))
+        for pose_bone in rig_object.pose.bones:
+            if pose_bone.parent is None:
+                matrix = rig_object.matrix_world * pose_bone.matrix
+            else:
+                matrix = pose_bone.parent.matrix.inverted() * pose_bone.matrix
+            matrices[pose_bone.name].append(np.array(matrix))
+    return matrices
+
+
+class EggAnimTestCase(unittest.TestCase):
+    def test_sample_fcurves_matches_evaluate(self):
+        keyframes = [(1, 0), (4, 3), (5, -1), (12, 2.5), (13, 2.5), (25, -4)]
+        curves = [
+            fcurve(keyframes, interpolation, extrapolation)
+            for interpolation in INTERPOLATIONS for extrapolation in ('CONSTANT', 'LINEAR')
+        ]
+        curves.append(fcurve([(3, 7)], 'LINEAR', 'LINEAR'))
+        curves.append(fcurve([], 'LINEAR'))
+        # handles reaching past the neighbouring keys are shortened.
+        curves.append(fcurve(keyframes))
+        points = curves[-1].keyframe_points
+        points.foreach_set('handle_right', np.array(keyframes) + (9, 4))
+        points.foreach_set('handle_left', np.array(keyframes) - (9, 1))
+        curves.append(fcurve(keyframes, extrapolation='LINEAR'))
+        curves[-1].keyframe_points.foreach_set('interpolation', np.array([2, 1, 0, 2, 1, 2], dtype=np.int32))
+
+        values = sample_fcurves(curves, FRAMES)
+        for curve, curve_values in zip(curves, values):
+            np.testing.assert_allclose(curve_values, [curve.evaluate(frame) for frame in FRAMES], atol=1e-9)
+
+    def test_sample_fcurves_falls_back_to_evaluate(self):
+        curve = fcurve([(1, 0), (10, 1)])
+        curve.modifiers.append('NOISE')
+        frames = []
+        evaluate = curve.evaluate
+        curve.evaluate = lambda frame: frames.append(frame) or evaluate(frame)
+        values = sample_fcurves([curve], [1, 2, 3])
+        self.assertEqual(frames, [1, 2, 3])
+        self.assertEqual(values[0].tolist(), [evaluate(1), evaluate(2), evaluate(3)])
+
+    def test_basis_matrices(self):
+        rig_object, _ = rig()
+        pose_bone = rig_object.pose.bones['arm']
+        pose_bone.location = (1, 2, 3)
+        pose_bone.scale = (1, 2, 0.5)
+        pose_bone.rotation_quaternion = (0.5, 0.1, 0.7, 0.2)
+        pose_bone.rotation_euler = (0.3, -1.2, 2.5)
+        pose_bone.rotation_axis_angle = (1.3, 0.2, -0.4, 0.9)
+        channels = {
+            channel: np.array([tuple(getattr(pose_bone, channel))], dtype=np.float64) for channel in (
+                'location', 'rotation_quaternion', 'rotation_euler', 'rotation_axis_angle', 'scale',
+            )
+        }
+        for rotation_mode in ('QUATERNION', 'AXIS_ANGLE', 'XYZ', 'XZY', 'YXZ', 'YZX', 'ZXY', 'ZYX'):
+            pose_bone.rotation_mode = rotation_mode
+            np.testing.assert_allclose(
+                basis_matrices(rotation_mode, **channels)[0], np.array(pose_bone.matrix_basis), atol=1e-12,
+            )
+
+    def test_armature_matrices_match_evaluated_pose(self):
+        rig_object, scene = rig()
+        frames = np.linspace(0, 22, 45)
+        matrices = armature_matrices(rig_object, frames, scene)
+        for name, evaluated in evaluated_matrices(rig_object, scene, frames).items():
+            np.testing.assert_allclose(matrices[name], evaluated, atol=1e-9)
+
+    def test_constrained_bones_are_evaluated(self):
+        rig_object, scene = rig()
+        rig_object.pose.bones['arm'].constraints.append('DAMPED_TRACK')
+        scene.frame_current = 7
+        frame_set = scene.frame_set
+        frames = []
+        scene.frame_set = lambda frame, subframe=0.0: frames.append(frame + subframe) or frame_set(frame, subframe)
+        matrices = armature_matrices(rig_object, [1, 2.5, 4], scene)
+        self.assertEqual(frames, [1, 2.5, 4, 7])
+        self.assertEqual(scene.frame_current, 7)
+        expected = evaluated_matrices(rig_object, scene, [1, 2.5, 4])
+        np.testing.assert_allclose(matrices['arm'], expected['arm'], atol=1e-9)
+
+    def test_animated_armature_object(self):
+        rig_object, scene = rig()
+        rig_object.rotation_mode = 'ZXY'
+        rig_object.scale = (2, 2, 2)
+        parent = Object('parent', matrix_world=Matrix.Translation((0, 3, 0)))
+        rig_object.parent = parent
+        rig_object.matrix_parent_inverse = Matrix.Translation((0, 0, -1))
+        action = rig_object.animation_data.action
+        for data_path, keyframes in (('location', [(1, 0), (20, 4)]), ('rotation_euler', [(5, 0), (15, 2)])):
+            curve = action.fcurves.new(data_path, 2)
+            for frame, value in keyframes:
+                curve.keyframe_points.insert(frame, value)
+        frames = np.linspace(0, 22, 45)
+        matrices = armature_matrices(rig_object, frames, scene)
+        for name, evaluated in evaluated_matrices(rig_object, scene, frames).items():
+            np.testing.assert_allclose(matrices[name], evaluated, atol=1e-9)
+
+        # the root bone of an armature with an animated parent is read from the evaluated scene.
+        parent.animation_data_create().action = Action('slide')
+        parent.animation_data.action.fcurves.new('location', 0).keyframe_points.insert(1, 0)
+        parent.animation_data.action.fcurves[0].keyframe_points.insert(20, 5)
+        scene.objects.insert(0, parent)
+        self.assertIsNone(animation_key(rig_object, frames))
+        matrices = armature_matrices(rig_object, frames, scene)
+        for name, evaluated in evaluated_matrices(rig_object, scene, frames).items():
+            np.testing.assert_allclose(matrices[name], evaluated, atol=1e-9)
+
+    def test_decompose(self):
+        pose_bone = rig()[0].pose.bones['root']
+        pose_bone.location = (1, 2, 3)
+        pose_bone.scale = (2, 3, 4)
+        pose_bone.rotation_mode = 'XYZ'
+        pose_bone.rotation_euler = (0.3, -0.6, 2.5)
+        np.testing.assert_allclose(decompose(np.array(pose_bone.matrix_basis)), [
+            2, 3, 4, math.degrees(0.3), math.degrees(-0.6), math.degrees(2.5), 1, 2, 3,
+        ])
+        # a pitch past 90 degrees is written as the equivalent euler with the smallest angles.
+        pose_bone.rotation_euler = (0.0, 2.0, 0.0)
+        hpr = decompose(np.array(pose_bone.matrix_basis))[3:6]
+        np.testing.assert_allclose(hpr, [0, math.degrees(2), 0], atol=1e-12)
+
+    def test_decompose_matrices_matches_decompose(self):
+        random = np.random.RandomState(7)
+        rotations = basis_matrices(
+            'XYZ', np.zeros((60, 3)), np.zeros((60, 4)), random.uniform(-4, 4, (60, 3)), np.zeros((60, 4)),
+            random.uniform(0.1, 3, (60, 3)),
+        )
+        rotations[:, :3, 3] = random.uniform(-10, 10, (60, 3))
+        # gimbal locked, flipped and degenerate transforms.
+        rotations[0, :3, :3] = [(0, 0, 1), (0, 1, 0), (-1, 0, 0)]
+        rotations[1, :3, :3] = [(0, 0, -2), (1, 0, 0), (0, -1, 0)]
+        rotations[2, :3, :3] = np.diag([-1, 1, 1])
+        rotations[3, :3, 0] = 0
+        matrices = rotations.reshape(20, 3, 4, 4)
+        components = decompose_matrices(matrices)
+        self.assertEqual(components.shape, (20, 3, 9))
+        for matrix, matrix_components in zip(matrices.reshape(-1, 4, 4), components.reshape(-1, 9)):
+            np.testing.assert_allclose(matrix_components, decompose(matrix), rtol=0, atol=1e-6)
+
+    def test_shape_key_values(self):
+        mesh = Mesh('blob')
+        mesh.from_pydata([(0, 0, 0), (1, 0, 0), (0, 1, 0)], [], [(0, 1, 2)])
+        blob = Object('blob', mesh)
+        blob.shape_key_add('Basis')
+        blob.shape_key_add('smile')
+        blob.shape_key_add('frown').value = 0.25
+        action = Action('talk')
+        action.fcurves.new('key_blocks["smile"].value').keyframe_points.insert(1, 0)
+        action.fcurves.find('key_blocks["smile"].value').keyframe_points.insert(11, 1)
+        mesh.shape_keys.animation_data_create().action = action
+        values = shape_key_values(mesh, [1, 6, 11], Scene('scene', [blob]))
+        self.assertEqual(sorted(values), ['frown', 'smile'])
+        np.testing.assert_allclose(values['smile'], [0, 0.5, 1])
+        np.testing.assert_allclose(values['frown'], [0.25] * 3)
+
+    def test_timeline_sampler_sets_every_frame_once(self):
+        rig_object, scene = rig()
+        rig_object.pose.bones['arm'].constraints.append('DAMPED_TRACK')
+        mesh = Mesh('blob')
+        mesh.from_pydata([(0, 0, 0), (1, 0, 0), (0, 1, 0)], [], [(0, 1, 2)])
+        blob = Object('blob', mesh)
+        blob.shape_key_add('Basis')
+        blob.shape_key_add('smile').value = 0.75
+        mesh.shape_keys.animation_data_create().drivers.new('key_blocks["smile"].value')
+        scene.objects.append(blob)
+        scene.frame_current = 7
+        frame_set = scene.frame_set
+        frames = []
+        scene.frame_set = lambda frame, subframe=0.0: frames.append(frame + subframe) or frame_set(frame, subframe)
+
+        sampler = TimelineSampler(scene, [1, 2.5, 4])
+        matrices = sample_animation(rig_object, [1, 2.5, 4], scene, sampler)
+        values = sample_animation(blob, [1, 2.5, 4], scene, sampler)
+        self.assertEqual((sorted(matrices), values, frames), (['root'], {}, []))
+        sampler.run()
+        self.assertEqual(frames, [1, 2.5, 4, 7])
+        self.assertEqual(scene.frame_current, 7)
+        expected = evaluated_matrices(rig_object, scene, [1, 2.5, 4])
+        np.testing.assert_allclose(matrices['arm'], expected['arm'], atol=1e-9)
+        np.testing.assert_allclose(values['smile'], [0.75] * 3)
+
+    def test_animation_key(self):
+        frames = np.arange(1, 21)
+        rig_object, _ = rig()
+        key = animation_key(rig_object, frames)
+        self.assertEqual(animation_key(rig()[0], frames), key)
+        self.assertNotEqual(animation_key(rig_object, frames[:-1]), key)
+        rig_object.pose.bones['root'].scale = (2, 2, 2)
+        self.assertNotEqual(animation_key(rig_object, frames), key)
+
+        rig_object, _ = rig()
+        rig_object.animation_data.action.fcurves[0].keyframe_points.insert(15, 3)
+        self.assertNotEqual(animation_key(rig_object, frames), key)
+        # constraints depend on the evaluated scene.
+        rig_object.pose.bones['arm'].constraints.append('DAMPED_TRACK')
+        self.assertIsNone(animation_key(rig_object, frames))
+        self.assertIsNone(animation_key(Object('empty'), frames))
+
+    def test_animation_bundle(self):
+        rig_object, scene = rig()
+        bundle = parse(str(animation_bundle(rig_object, scene, np.arange(1, 21), 24, FloatFormat(animation=4))))
+        skeleton = bundle.contents[0].contents[0]
+        self.assertEqual((skeleton.type, skeleton.name), ('Table', '"<skeleton>"'))
+        root = skeleton.contents[0]
+        self.assertEqual([entry.name for entry in root.contents], ['xform', 'arm'])
+        xform = root.contents[0]
+        self.assertEqual([entry.name for entry in xform.contents[:3]], ['order', 'fps', 'contents'])
+        values = xform.contents[3].contents[0]
+        self.assertEqual(len(values), 20 * 9)
+        self.assertEqual(values[:9], ('1', '1', '1', '0', '0', '0', '1', '0', '1'))
+        self.assertIsNone(animation_bundle(Object('empty'), scene, np.arange(1, 21), 24, FloatFormat()))
+
+    def test_animation_bundle_quotes_names(self):
+        mesh = Mesh('blob')
+        mesh.from_pydata([(0, 0, 0), (1, 0, 0), (0, 1, 0)], [], [(0, 1, 2)])
+        blob = Object('blob {1}', mesh)
+        blob.shape_key_add('Basis')
+        blob.shape_key_add('big smile')
+        action = Action('talk')
+        action.fcurves.new('key_blocks["big smile"].value').keyframe_points.insert(1, 0.5)
+        mesh.shape_keys.animation_data_create().action = action
+        text = str(animation_bundle(blob, Scene('scene', [blob]), [1, 2], 24, FloatFormat()))
+        self.assertIn('<Bundle> "blob {1}" {', text)
+        self.assertIn('<S$Anim> "big smile" {', text)
+        smile = parse(text).contents[0].contents[0].contents[0]
+        self.assertEqual((smile.type, smile.name), ('S$Anim', '"big smile"'))
+        self.assertEqual(smile.contents[1].contents[0], ('0.5', '0.5'))
+
+        armature = Armature('rig')
+        armature.new_bone('upper arm')
+        rig_object = Object('my rig', armature)
+        rig_object.animation_data_create().action = Action('wave')
+        rig_object.animation_data.action.fcurves.new('pose.bones["upper arm"].location').keyframe_points.insert(1, 1)
+        text = str(animation_bundle(rig_object, Scene('scene', [rig_object]), [1, 2], 24, FloatFormat()))
+        self.assertIn('<Bundle> "my rig" {', text)
+        self.assertIn('<Table> "upper arm" {', text)
+
+    def test_fold_channels(self):
+        components = np.tile([1, 1, 2, 0, 0, 90, 0, 0, 1], (4, 1)).astype(np.float64)
+        components[:, 0] += [0, 1e-5, -1e-5, 0]
+        components[:, 3] = [0, 10, 20, 30]
+        channels = fold_channels(components, 1e-4)
+        self.assertEqual([letter for letter, _ in channels], ['k', 'p', 'h', 'z'])
+        self.assertEqual([len(values) for _, values in channels], [1, 4, 1, 1])
+        self.assertEqual([letter for letter, _ in fold_channels(components, 0.0)], ['i', 'k', 'p', 'h', 'z'])
+
+    def test_reduce_rate(self):
+        frames = np.arange(2000, dtype=np.float64)
+        ramp = np.stack([frames, frames * 2], axis=1)
+        kept, fps = reduce_rate(ramp, 24, 1e-3)
+        self.assertEqual(kept.tolist(), [[0, 0], [1999, 3998]])
+        self.assertAlmostEqual(fps, 24 / 1999.0)
+        wave = np.sin(np.arange(25) / 4.0)[:, None]
+        self.assertIs(reduce_rate(wave, 24, 1e-12)[0], wave)
+        self.assertIs(reduce_rate(wave, 24, None)[0], wave)
+
+    def test_reduce_rate_keeps_clip_length(self):
+        for frame_count in (20, 23, 100, 101):
+            wave = np.sin(np.arange(frame_count) / 4.0)[:, None]
+            kept, fps = reduce_rate(wave, 24, 0.05)
+            self.assertLess(len(kept), frame_count / 2)
+            self.assertAlmostEqual((len(kept) - 1) / fps, (frame_count - 1) / 24.0)
+            self.assertEqual((kept[0, 0], kept[-1, 0]), (wave[0, 0], wave[-1, 0]))
+            # linearly interpolated at the original frames, the samples stay within the error.
+            interpolated = np.interp(np.arange(frame_count) * fps / 24.0, np.arange(len(kept)), kept[:, 0])
+            self.assertLessEqual(np.abs(interpolated - wave[:, 0]).max(), 0.05 + 1e-12)
+
+    def test_reduced_rate_animation_bundle(self):
+        rig_object, scene = rig()
+        bundle = animation_bundle(rig_object, scene, np.arange(1, 21), 24, FloatFormat(animation=4), 5e-5, 2.0)
+        root = parse(str(bundle)).contents[0].contents[0].contents[0]
+        root_xform, arm_xform = root.contents[0], root.contents[1].contents[0]
+        # Panda3D reads a single frame rate and frame count per bundle.
+        rate, arm_rate = [float(xform.contents[1].contents[0]) for xform in (root_xform, arm_xform)]
+        self.assertEqual(rate, arm_rate)
+        self.assertLess(rate, 24)
+        channels = root_xform.contents[2:] + arm_xform.contents[2:]
+        sizes = set(np.size(channel.contents[0].contents[0]) for channel in channels)
+        self.assertEqual(sizes - {1}, {round(19 * rate / 24) + 1})
+
+    def test_folded_animation_bundle(self):
+        rig_object, scene = rig()
+        bundle = parse(str(animation_bundle(rig_object, scene, np.arange(1, 21), 24, FloatFormat(animation=4), 5e-5)))
+        root = bundle.contents[0].contents[0].contents[0]
+        arm_xform = root.contents[1].contents[0]
+        self.assertEqual((arm_xform.type, [entry.name for entry in arm_xform.contents]), (
+            'Xfm$Anim_S$', ['order', 'fps', 'k', 'p', 'h', 'z'],
+        ))
+        k, p, h, z = (entry.contents[0].contents for entry in arm_xform.contents[2:])
+        self.assertEqual((k, h, z), (['2'], ['90'], ['1']))
+        self.assertEqual(len(p[0]), 20)
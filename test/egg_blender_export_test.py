@@ -0,0 +1,236 @@
+import glob
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from egg_exporter import egg_blender_export
+from egg_exporter.egg import Egg
+from egg_exporter.egg_blender_export import EggExporter, bpy
+from egg_exporter.egg_cache import DiskCache
+from egg_exporter.egg_mesh import extract_mesh, extract_mesh_reference
+from egg_exporter.egg_parallel import ParallelFormatter
+from egg_exporter.egg_reader import parse
+from egg_exporter.headless import BlendData, Matrix, Mesh, Object, Scene, load_egg
+from egg_exporter.test.egg_anim_test import rig
+
+FILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'files')
+
+
+@unittest.skipUnless(isinstance(bpy.data, BlendData), 'runs on the headless bpy stand-in')
+class EggBlenderExportTestCase(unittest.TestCase):
+    def setUp(self):
+        bpy.data.clear()
+        self.directory = tempfile.mkdtemp()
+        super(EggBlenderExportTestCase, self).setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        bpy.data.clear()
+        super(EggBlenderExportTestCase, self).tearDown()
+
+    def export(self, formatter=None, **export_settings):
+        return self.cached_export(None, formatter, **export_settings)[0]
+
+    def cached_export(self, cache, formatter=None, **export_settings):
+        egg = Egg()
+        exporter = EggExporter(egg, dict(export_settings, egg_file_format='UTF-8'), formatter, cache)
+        exporter.export_globals()
+        exporter.export_scenes()
+        return str(egg), exporter
+
+    def test_extract_mesh_matches_reference(self):
+        for filepath in glob.glob(os.path.join(FILES_DIR, '*.egg')):
+            load_egg(filepath)
+        self.assertTrue(bpy.data.meshes)
+        for mesh in bpy.data.meshes:
+            extracted, reference = extract_mesh(mesh), extract_mesh_reference(mesh)
+            for attribute in ('co', 'loop_start', 'loop_total', 'loop_vertex_index', 'material_index'):
+                np.testing.assert_array_equal(getattr(extracted, attribute), getattr(reference, attribute))
+
+    def test_export_scene(self):
+        load_egg(os.path.join(FILES_DIR, 'box.egg'))
+        egg = parse(self.export())
+        self.assertEqual([entry.type for entry in egg.contents], ['CoordinateSystem', 'Group', 'VertexPool'])
+        group, pool = egg.contents[1:]
+        self.assertEqual(len(group.contents), 12)
+        # the polygons of the box are flat, their corners do not share their normals.
+        self.assertEqual(len(pool.contents), 24)
+
+    def test_export_welds_corners(self):
+        mesh = Mesh('grid')
+        mesh.from_pydata(
+            [(x, y, 0) for y in range(3) for x in range(3)], [],
+            [(y * 3 + x, y * 3 + x + 1, y * 3 + x + 4, y * 3 + x + 3) for y in range(2) for x in range(2)],
+        )
+        mesh.polygons.foreach_set('use_smooth', np.ones(4, dtype=bool))
+        mesh.uv_layers.new('UVMap').data.foreach_set('uv', np.tile([(0, 0), (1, 0), (1, 1), (0, 1)], (4, 1)))
+        blend_object = Object('grid', mesh)
+        blend_object.shape_key_add('Basis')
+        blend_object.shape_key_add('bump').data.foreach_set('co', np.array(
+            [(x, y, 1 if (x, y) == (1, 1) else 0) for y in range(3) for x in range(3)], dtype=np.float32,
+        ))
+        bpy.data.scenes.append(Scene('scene', [blend_object]))
+
+        group, pool = parse(self.export()).contents[1:]
+        # the corners sharing a vertex have different uvs, except for the corner vertices of the grid.
+        self.assertEqual(len(pool.contents), 4 + 4 * 2 + 4)
+        self.assertEqual(sum(
+            1 for vertex in pool.contents for attribute in vertex.contents if getattr(attribute, 'type', None) == 'Dxyz'
+        ), 4)
+        indices = set(int(index) for polygon in group.contents for index in polygon.contents[0].contents[0])
+        self.assertEqual(indices, set(range(len(pool.contents))))
+
+    def test_export_optimizes_vertex_cache(self):
+        load_egg(os.path.join(FILES_DIR, 'panda.egg'))
+        egg = parse(self.export(egg_vertex_cache=True))
+        reference = parse(self.export())
+        self.assertEqual(len(egg.contents), len(reference.contents))
+        for entry, reference_entry in zip(egg.contents, reference.contents):
+            self.assertEqual(len(entry.contents), len(reference_entry.contents))
+        # vertices are renumbered in first use order.
+        group = egg.contents[1]
+        first_use = []
+        for polygon in group.contents:
+            for index in polygon.contents[-1].contents[0]:
+                if int(index) not in first_use:
+                    first_use.append(int(index))
+        self.assertEqual(first_use, list(range(len(first_use))))
+
+    def test_export_groups_polygons_by_material(self):
+        load_egg(os.path.join(FILES_DIR, 'perFaceMaterials.egg'))
+        group, pool = parse(self.export()).contents[1:]
+        self.assertEqual(
+            [(entry.type, entry.name, len(entry.contents)) for entry in group.contents],
+            [('Group', 'Material.Floor', 2), ('Group', 'Material.Top', 2), ('Group', 'Material.Wall', 8)],
+        )
+        # vertices are numbered in the order of the material groups.
+        indices = [
+            int(index) for material in group.contents for polygon in material.contents
+            for index in polygon.contents[0].contents[0]
+        ]
+        self.assertEqual(sorted(set(indices)), list(range(len(pool.contents))))
+        self.assertEqual(indices[:6], [0, 1, 2, 0, 2, 3])
+
+    def test_export_uv_layers(self):
+        mesh = Mesh('quad')
+        mesh.from_pydata([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)], [], [(0, 1, 2, 3)])
+        mesh.uv_layers.new('UVMap')
+        mesh.uv_layers.new('UV Map 2')
+        bpy.data.scenes.append(Scene('scene', [Object('quad', mesh)]))
+        text = self.export()
+        self.assertIn('<UV> { 0 0 }', text)
+        self.assertIn('<UV> "UV Map 2" { 0 0 }', text)
+        self.assertNotIn('UVMap', text)
+
+    def test_export_quotes_material_names(self):
+        load_egg(os.path.join(FILES_DIR, 'leaves.egg'))
+        text = self.export()
+        self.assertIn('<Group> "Leather  grey" {', text)
+        self.assertNotIn('<Group> Leather  grey {', text)
+
+    def test_export_animations(self):
+        rig_object, scene = rig()
+        bpy.data.scenes.append(scene)
+        egg = Egg()
+        exporter = EggExporter(egg, {'egg_file_format': 'UTF-8'})
+        exporter.export_animations()
+        table, = parse(str(egg)).contents
+        self.assertEqual((table.type, [bundle.name for bundle in table.contents]), ('Table', ['rig']))
+        self.assertEqual(scene.frame_current, 1)
+
+    def test_export_animations_cache(self):
+        rig_object, scene = rig()
+        bpy.data.scenes.append(scene)
+        cache = DiskCache(self.directory)
+        texts = []
+        for _ in range(2):
+            egg = Egg()
+            exporter = EggExporter(egg, {'egg_file_format': 'UTF-8'}, cache=cache)
+            exporter.export_animations()
+            texts.append(str(egg))
+            self.assertEqual(exporter.stats['sampled_animations'] + exporter.stats['cached_animations'], 1)
+        self.assertEqual(texts[0], texts[1])
+        self.assertEqual(exporter.stats['cached_animations'], 1)
+
+        rig_object.animation_data.action.fcurves[0].keyframe_points.insert(15, 3)
+        exporter = EggExporter(Egg(), {'egg_file_format': 'UTF-8'}, cache=cache)
+        exporter.export_animations()
+        self.assertEqual(exporter.stats['sampled_animations'], 1)
+
+    def test_export_cache(self):
+        load_egg(os.path.join(FILES_DIR, 'box.egg'))
+        load_egg(os.path.join(FILES_DIR, 'leaves.egg'))
+        objects = len(bpy.data.objects)
+        cache = DiskCache(self.directory)
+        cold, exporter = self.cached_export(cache)
+        self.assertEqual((exporter.stats['formatted_objects'], exporter.stats['cached_objects']), (objects, 0))
+        self.assertEqual(cold, self.export())
+        warm, exporter = self.cached_export(cache)
+        self.assertEqual((exporter.stats['formatted_objects'], exporter.stats['cached_objects']), (0, objects))
+        self.assertEqual(warm, cold)
+        self.assertTrue(exporter.report().startswith('egg export: {} objects, 0 meshes'.format(objects)))
+        cache = DiskCache(os.path.join(self.directory, 'parallel'))
+        with ParallelFormatter(2, chunk_polygons=500, chunk_vertices=500) as formatter:
+            self.assertEqual(self.cached_export(cache, formatter)[0], cold)
+        self.assertEqual(self.cached_export(cache)[0], cold)
+
+    def test_export_cache_formats_changed_objects(self):
+        load_egg(os.path.join(FILES_DIR, 'box.egg'))
+        load_egg(os.path.join(FILES_DIR, 'leaves.egg'))
+        cache = DiskCache(self.directory)
+        self.cached_export(cache)
+        box = bpy.data.objects[0]
+        box.matrix_world = Matrix.Translation((0, 0, 2))
+        text, exporter = self.cached_export(cache)
+        self.assertEqual(exporter.stats['formatted_objects'], 1)
+        self.assertEqual(exporter.stats['cached_objects'], len(bpy.data.objects) - 1)
+        self.assertEqual(exporter.stats['meshes'], 1)
+        self.assertEqual(text, self.export())
+
+    def test_export_instances(self):
+        mesh = Mesh('quad')
+        mesh.from_pydata([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)], [], [(0, 1, 2, 3)])
+        bpy.data.scenes.append(Scene('scene', [
+            Object('a', mesh), Object('b', mesh, Matrix.Translation((5, 0, 0))),
+        ]))
+        egg = parse(self.export())
+        self.assertEqual(
+            [entry.type for entry in egg.contents], ['CoordinateSystem', 'VertexPool', 'Instance', 'Instance'],
+        )
+
+    def test_parallel_export_matches_serial(self):
+        load_egg(os.path.join(FILES_DIR, 'panda.egg'))
+        with ParallelFormatter(2, chunk_polygons=500, chunk_vertices=500) as formatter:
+            self.assertEqual(self.export(formatter), self.export())
+
+    def test_save(self):
+        load_egg(os.path.join(FILES_DIR, 'box.egg'))
+        filepath = os.path.join(self.directory, 'box.egg')
+        egg_blender_export.save(bpy.context, {
+            'egg_file_format': 'UTF-8', 'egg_filepath': filepath, 'egg_exportdir': self.directory + '/',
+        })
+        egg_blender_export.save(bpy.context, {
+            'egg_file_format': 'UTF-8', 'egg_filepath': filepath + '.pz', 'egg_exportdir': self.directory + '/',
+            'egg_compress': True,
+        })
+        with open(filepath, encoding='UTF-8') as eggfile:
+            text = eggfile.read()
+        self.assertEqual(text, self.export() + '\n')
+        with gzip.open(filepath + '.pz', 'rt', encoding='UTF-8') as eggfile:
+            self.assertEqual(eggfile.read(), text)
+
+    def test_save_trace(self):
+        load_egg(os.path.join(FILES_DIR, 'box.egg'))
+        egg_blender_export.save(bpy.context, {
+            'egg_file_format': 'UTF-8', 'egg_filepath': os.path.join(self.directory, 'box.egg'),
+            'egg_exportdir': self.directory + '/', 'egg_trace': True,
+        })
+        with open(os.path.join(self.directory, 'box.trace.json')) as trace_file:
+            events = json.load(trace_file)['traceEvents']
+        names = set(event['name'] for event in events)
+        self.assertTrue({'save', 'export_scenes', 'object', 'extract_mesh', 'triangulate', 'write'} <= names)
@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from egg_exporter.egg_cache import DiskCache, content_key
+
+
+class EggCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        super(EggCacheTestCase, self).setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(EggCacheTestCase, self).tearDown()
+
+    def test_content_key(self):
+        positions = np.arange(12, dtype=np.float32).reshape(4, 3)
+        self.assertEqual(content_key('box', positions), content_key('box', positions.copy()))
+        self.assertNotEqual(content_key('box', positions), content_key('box', positions.reshape(3, 4)))
+        self.assertNotEqual(content_key('box', positions), content_key('box', positions.astype(np.float64)))
+        self.assertNotEqual(content_key('box', positions), content_key('box', positions + 1))
+
+    def test_get_put(self):
+        cache = DiskCache(self.directory)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', b'<Group> a {}')
+        self.assertEqual(cache.get('a'), b'<Group> a {}')
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_prune_evicts_least_recently_used(self):
+        cache = DiskCache(self.directory, max_size=20)
+        for timestamp, key in enumerate(['a', 'b', 'c']):
+            cache.put(key, b'0123456789')
+            os.utime(os.path.join(self.directory, key), (1000 + timestamp, 1000 + timestamp))
+        cache.get('a')
+
+        cache.prune()
+        self.assertEqual(sorted(os.listdir(self.directory)), ['a', 'c'])
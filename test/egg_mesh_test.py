@@ -0,0 +1,137 @@
+import unittest
+
+import numpy as np
+
+from egg_exporter.egg_mesh import (
+    MeshArrays, material_runs, polygon_groups, split_pools, transform_normals, transform_points, vertex_pool, weld,
+)
+
+
+def quad_and_triangle():
+    co = np.array([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (2, 0, 0)], dtype=np.float32)
+    return MeshArrays(
+        'mesh', co,
+        loop_start=np.array([0, 4], dtype=np.int32),
+        loop_total=np.array([4, 3], dtype=np.int32),
+        loop_vertex_index=np.array([0, 1, 2, 3, 1, 4, 2], dtype=np.int32),
+    )
+
+
+class EggMeshTestCase(unittest.TestCase):
+    def test_counts(self):
+        mesh = quad_and_triangle()
+        self.assertEqual(mesh.polygon_count, 2)
+        self.assertEqual(mesh.loop_count, 7)
+        self.assertEqual(mesh.vertex_count, 5)
+
+    def test_transform_points(self):
+        matrix = [
+            (0, -1, 0, 10),
+            (1, 0, 0, 20),
+            (0, 0, 2, 30),
+            (0, 0, 0, 1),
+        ]
+        points = transform_points(np.array([(1, 0, 0), (0, 1, 1)], dtype=np.float32), matrix)
+        np.testing.assert_allclose(points, [(10, 21, 30), (9, 20, 32)])
+
+    def test_triangulate_keeps_triangles_and_fans_convex_polygons(self):
+        mesh = quad_and_triangle()
+        loop_triangles, triangle_polygon = mesh.triangulate_loops()
+        self.assertEqual(loop_triangles.tolist(), [[0, 1, 2], [0, 2, 3], [4, 5, 6]])
+        self.assertEqual(mesh.loop_vertex_index[loop_triangles].tolist(), [[0, 1, 2], [0, 2, 3], [1, 4, 2]])
+        self.assertEqual(triangle_polygon.tolist(), [0, 0, 1])
+
+    def test_triangulate_concave_polygons(self):
+        shapes = [
+            [(0, 0), (2, 0), (2, 1), (1, 1), (1, 2), (0, 2)],
+            [(0, 0), (2, 1), (4, 0), (2, 3)],
+            [(0, 0), (4, 0), (4, 4), (3, 4), (3, 1), (1, 1), (1, 4), (0, 4)],
+            [(0, 0), (2, 0), (2, 1), (1, 1), (1, 2), (0, 2)],
+        ]
+        co, loop_total = [], []
+        for shape in shapes:
+            co.extend((x, y, 0) for x, y in shape)
+            loop_total.append(len(shape))
+        loop_total = np.array(loop_total, dtype=np.int32)
+        loop_start = np.concatenate(([0], np.cumsum(loop_total)[:-1])).astype(np.int32)
+        co = np.array(co, dtype=np.float32)
+        mesh = MeshArrays('mesh', co, loop_start, loop_total, np.arange(len(co), dtype=np.int32))
+
+        # loops and vertices are the same here.
+        triangles, triangle_polygon = mesh.triangulate_loops()
+        self.assertEqual(np.bincount(triangle_polygon).tolist(), (loop_total - 2).tolist())
+        for polygon, shape in enumerate(shapes):
+            areas = [signed_area(co[triangle]) for triangle in triangles[triangle_polygon == polygon]]
+            self.assertTrue(min(areas) > 0)
+            self.assertAlmostEqual(sum(areas), signed_area(np.array(shape, dtype=np.float32)))
+
+    def test_weld(self):
+        positions = np.array([(0, 0, 0), (1, 0, 0), (0, 0, 0), (1, 0, 0), (0, 0, 0)], dtype=np.float32)
+        normals = np.array([(0, 0, 1), (0, 0, 1), (0, 0, 1), (0, 0, 1), (0, 1, 0)], dtype=np.float32)
+        corners, corner_vertex = weld([positions, normals])
+        self.assertEqual(corners.tolist(), [0, 1, 4])
+        self.assertEqual(corner_vertex.tolist(), [0, 1, 0, 1, 2])
+
+    def test_weld_epsilon(self):
+        uvs = np.array([(0.5, 0.5), (0.5000001, -0.0), (0.5, 0.0), (0.6, 0.5)])
+        self.assertEqual(weld([uvs])[1].tolist(), [0, 1, 2, 3])
+        self.assertEqual(weld([uvs], epsilon=1e-5)[1].tolist(), [0, 1, 1, 2])
+        # values are quantized: close ones on both sides of a cell boundary are not welded.
+        self.assertEqual(weld([[[0.0], [0.6e-5]]], epsilon=1e-5)[1].tolist(), [0, 1])
+
+    def test_mesh_weld(self):
+        mesh = quad_and_triangle()
+        mesh.normals = np.tile(np.array([(0, 0, 1)], dtype=np.float32), (7, 1))
+        mesh.uvs = [('UVMap', np.array([(0, 0), (1, 0), (1, 1), (0, 1), (1, 0), (2, 0), (1, 1)], dtype=np.float32))]
+        corners, corner_vertex = mesh.weld()
+        self.assertEqual(corners.tolist(), [0, 1, 2, 3, 5])
+        self.assertEqual(corner_vertex[mesh.triangulate_loops()[0]].tolist(), [[0, 1, 2], [0, 2, 3], [1, 4, 2]])
+
+        mesh.uvs[0][1][4] = (0.5, 0)
+        self.assertEqual(len(mesh.weld()[0]), 6)
+
+    def test_vertex_pool(self):
+        mesh = quad_and_triangle()
+        mesh.normals = np.tile(np.array([(0, 0, 1)], dtype=np.float32), (7, 1))
+        mesh.morphs = [('lift', np.array([(0, 0, 0), (0, 0, 0), (0, 0, 0), (0, 0, 0), (0, 0, 1)], dtype=np.float32))]
+        corners, _ = mesh.weld()
+        matrix = [(0, -1, 0, 10), (1, 0, 0, 20), (0, 0, 2, 30), (0, 0, 0, 1)]
+        pool = vertex_pool('mesh', mesh, corners, matrix)
+        np.testing.assert_allclose(pool.positions, transform_points(mesh.co, matrix))
+        np.testing.assert_allclose(pool.normals, np.tile([(0, 0, 1)], (5, 1)))
+        np.testing.assert_allclose(pool.morphs[0][1][4], (0, 0, 2))
+
+    def test_material_runs(self):
+        order, runs = material_runs(np.array([2, 0, 2, 1, 0], dtype=np.int32))
+        self.assertEqual(order.tolist(), [1, 4, 3, 0, 2])
+        self.assertEqual(runs, [(0, 0, 2), (1, 2, 3), (2, 3, 5)])
+        self.assertEqual(material_runs(np.zeros(0, dtype=np.int32))[1], [])
+
+    def test_split_pools(self):
+        triangles = np.array([(0, 1, 2), (2, 1, 3), (3, 4, 5), (0, 5, 6), (6, 7, 8)], dtype=np.int32)
+        self.assertEqual(len(split_pools(triangles, 9)), 1)
+        pools = split_pools(triangles, 9, max_vertices=5)
+        self.assertEqual([(start, stop) for start, stop, _, _ in pools], [(0, 2), (2, 4), (4, 5)])
+        for start, stop, vertices, pool_triangles in pools:
+            self.assertLessEqual(len(vertices), 5)
+            self.assertEqual(vertices[pool_triangles].tolist(), triangles[start:stop].tolist())
+        self.assertEqual(pools[1][2].tolist(), [3, 4, 5, 0, 6])
+
+    def test_polygon_groups(self):
+        triangles = np.array([(0, 1, 2), (0, 2, 3)])
+        nodes = polygon_groups([
+            (None, 'mesh', triangles[:1]), ('wood', 'mesh.0', triangles), ('wood', 'mesh.1', triangles[1:]),
+            ('stone', 'mesh.1', triangles),
+        ])
+        self.assertEqual([node.type for node in nodes], ['Polygon', 'Group', 'Group'])
+        self.assertEqual([(node.name, len(node.contents)) for node in nodes[1:]], [('wood', 3), ('stone', 2)])
+
+    def test_transform_normals(self):
+        matrix = [(2, 0, 0, 5), (0, 1, 0, 0), (0, 0, 1, 0), (0, 0, 0, 1)]
+        normals = transform_normals(np.array([(1, 1, 0)], dtype=np.float32) / np.sqrt(2), matrix)
+        np.testing.assert_allclose(normals, [(1 / np.sqrt(5), 2 / np.sqrt(5), 0)])
+
+
+def signed_area(points):
+    x, y = points[:, 0], points[:, 1]
+    return 0.5 * float(np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y))
@@ -0,0 +1,71 @@
+import multiprocessing
+import unittest
+
+import numpy as np
+
+from egg_exporter.egg import Egg, Entry, VertexPool
+from egg_exporter.egg_mesh import polygon_entries, polygon_groups
+from egg_exporter.egg_parallel import ParallelFormatter
+
+
+def grid(side):
+    x, y = np.meshgrid(np.arange(side), np.arange(side))
+    positions = np.stack([x.ravel(), y.ravel(), np.zeros(side * side)], axis=1) * 0.1
+    first = (np.arange(side - 1)[:, None] * side + np.arange(side - 1)).ravel()
+    triangles = np.concatenate([
+        np.stack([first, first + 1, first + side + 1], axis=1),
+        np.stack([first, first + side + 1, first + side], axis=1),
+    ])
+    return positions, triangles
+
+
+class EggParallelTestCase(unittest.TestCase):
+    def serial_egg(self, positions, triangles):
+        group_entry = Entry('Group', 'grid', content=polygon_entries('grid', triangles))
+        return str(Egg([Entry('CoordinateSystem', content='Z-up'), group_entry, VertexPool('grid', positions)]))
+
+    def serial_groups(self, positions, ranges):
+        group_entry = Entry('Group', 'grid', content=polygon_groups(ranges))
+        return str(Egg([group_entry, VertexPool('grid', positions)]))
+
+    def parallel_groups(self, positions, ranges, **chunk_sizes):
+        with ParallelFormatter(2, **chunk_sizes) as formatter:
+            return str(Egg(formatter.object_entries(Entry('Group', 'grid'), ranges, [VertexPool('grid', positions)])))
+
+    def parallel_egg(self, positions, triangles, **formatter_arguments):
+        egg = Egg([Entry('CoordinateSystem', content='Z-up')])
+        with ParallelFormatter(2, **formatter_arguments) as formatter:
+            for node in formatter.object_entries(
+                Entry('Group', 'grid'), [(None, 'grid', triangles)], [VertexPool('grid', positions)],
+            ):
+                egg.append(node)
+            return str(egg)
+
+    def test_whole_object_output_matches_serial(self):
+        positions, triangles = grid(8)
+        self.assertEqual(self.parallel_egg(positions, triangles), self.serial_egg(positions, triangles))
+
+    def test_chunked_output_matches_serial(self):
+        positions, triangles = grid(20)
+        self.assertEqual(
+            self.parallel_egg(positions, triangles, chunk_polygons=97, chunk_vertices=50),
+            self.serial_egg(positions, triangles),
+        )
+
+    def test_material_groups_match_serial(self):
+        positions, triangles = grid(20)
+        ranges = [
+            (None, 'grid', triangles[:50]), ('wood', 'grid', triangles[50:400]), ('stone', 'grid', triangles[400:]),
+        ]
+        serial = self.serial_groups(positions, ranges)
+        self.assertEqual(self.parallel_groups(positions, ranges), serial)
+        self.assertEqual(self.parallel_groups(positions, ranges, chunk_polygons=97, chunk_vertices=50), serial)
+
+    def test_spawned_workers(self):
+        # spawned workers import this module without the addon __init__, which needs bpy.
+        positions, triangles = grid(20)
+        spawn = multiprocessing.get_context('spawn')
+        self.assertEqual(
+            self.parallel_egg(positions, triangles, chunk_polygons=97, chunk_vertices=50, mp_context=spawn),
+            self.serial_egg(positions, triangles),
+        )
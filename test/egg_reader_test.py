@@ -0,0 +1,83 @@
+import glob
+import io
+import os
+import unittest
+
+from egg_exporter.egg import Entry, Node
+from egg_exporter.egg_reader import iterparse, load, parse
+
+from egg_exporter.test.egg_test import TEST_STRING_A
+
+FILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'files')
+
+
+class EggReaderTestCase(unittest.TestCase):
+    def test_parse_round_trip(self):
+        self.assertEqual(str(parse(TEST_STRING_A)), TEST_STRING_A)
+
+    def test_parse_entries(self):
+        egg = parse('''
+            <Comment> { "exported with // options" }
+            <Texture> "my texture" {
+                "maps/noise.rgb"  // image
+                <Scalar> wrap { CLAMP }
+            }
+            /* animation
+               table */
+            <Table> {
+                <V> {
+                    1 2 3
+                    4 5 6
+                }
+            }
+        ''')
+        comment, texture, table = egg.contents
+        self.assertEqual((comment.type, comment.contents), ('Comment', ['"exported with // options"']))
+        self.assertEqual(texture.name, '"my texture"')
+        self.assertEqual(texture.contents[0], '"maps/noise.rgb"')
+        self.assertEqual(str(texture.contents[1]), str(Entry('Scalar', 'wrap', 'CLAMP')))
+        self.assertIsNone(table.name)
+        self.assertEqual(table.contents[0].contents, [('1', '2', '3', '4', '5', '6')])
+
+    def test_parse_errors(self):
+        for text in ('<Group> box {', '<Group> box { } }', '{ 1 2 3 }', '<Group> box'):
+            self.assertRaises(ValueError, parse, text)
+
+    def test_load_test_files(self):
+        for filepath in glob.glob(os.path.join(FILES_DIR, '*.egg')):
+            egg = load(filepath)
+            self.assertTrue(len(egg))
+            self.assertEqual(str(parse(str(egg))), str(egg))
+
+    def test_iterparse_events(self):
+        events = list(iterparse(io.StringIO('<Group> box { <Ref> { box } 1 2 } "text"'), read_size=3))
+        self.assertEqual(events, [
+            ('start', 'Group', 'box'),
+            ('start', 'Ref', None),
+            ('data', 'box'),
+            ('end', 'Ref', None),
+            ('data', ('1', '2')),
+            ('end', 'Group', 'box'),
+            ('data', '"text"'),
+        ])
+        self.assertRaises(ValueError, list, iterparse(io.StringIO('<Group> box { <Ref> { box }')))
+
+    def test_iterparse_matches_parse(self):
+        for filepath in glob.glob(os.path.join(FILES_DIR, '*.egg')):
+            with open(filepath, encoding='UTF-8') as eggfile:
+                text = eggfile.read()
+            expected = list(tree_events(parse(text)))
+            for read_size in (61, 4096):
+                events = list(iterparse(io.StringIO(text), read_size=read_size))
+                self.assertEqual(events, expected, '{} read by {} characters'.format(filepath, read_size))
+
+
+def tree_events(entry):
+    for content in entry.contents:
+        if isinstance(content, Node):
+            yield ('start', content.type, content.name)
+            for event in tree_events(content):
+                yield event
+            yield ('end', content.type, content.name)
+        else:
+            yield ('data', content)
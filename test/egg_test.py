@@ -1,6 +1,13 @@
+import gzip
+import io
 import unittest
 
-from egg_exporter.egg import Entry, Egg
+import numpy as np
+
+from egg_exporter.egg import (
+    EggWriter, Entry, Egg, FloatFormat, Polygon, Ref, Tee, ThreadedGzipStream, Values, Vertex, VertexPool, VertexRef,
+    quote_name,
+)
 
 
 TEST_STRING_A = '''<CoordinateSystem> { Z-Up }
@@ -88,3 +95,152 @@ class EggTestCase(unittest.TestCase):
         self.egg.append(group_entry)
 
         self.assertEqual(str(self.egg), TEST_STRING_A)
+
+    def test_egg_entry_default_content(self):
+        first = Entry('Group', 'first')
+        second = Entry('Group', 'second')
+        first.append(Entry('CoordinateSystem', content='Z-Up'))
+
+        self.assertEqual(first.count(), 1)
+        self.assertEqual(second.count(), 0)
+
+    def test_egg_typed_entry_format(self):
+        pool_ref = Ref('box')
+        polygon = Polygon([Entry('Normal', content=(0, -1, 0)), VertexRef((3, 7, 8, 4), pool_ref)])
+        entry = Entry('Polygon', content=[
+            Entry('Normal', content=(0, -1, 0)),
+            Entry('VertexRef', content=[(3, 7, 8, 4), Entry('Ref', content='box')]),
+        ])
+        self.assertEqual(str(polygon), str(entry))
+
+        vertex = Vertex(1, (0, 1, 1))
+        vertex.append(Entry('UV', content=(1, 1)))
+        self.assertEqual(str(vertex), str(Entry('Vertex', 1, [(0, 1, 1), Entry('UV', content=(1, 1))])))
+        self.assertEqual(str(Vertex(0, (0, 1, 1))), '<Vertex> 0 { 0 1 1 }')
+
+    def test_egg_typed_entry_slots(self):
+        for entry in (Vertex(0, (0, 0, 0)), Polygon(), VertexRef((0, 1, 2), Ref('box')), Ref('box')):
+            self.assertFalse(hasattr(entry, '__dict__'))
+
+    def test_egg_vertex_pool_format(self):
+        test_string = (
+            '''<VertexPool> box {\n    <Vertex> 0 {\n        0.0 1.0 1.0\n        <UV> { 1.0 1.0 }\n    }\n}'''
+        )
+        pool = VertexPool('box', [(0, 1, 1)], uvs=[(None, [(1, 1)])])
+        self.assertEqual(str(pool), test_string)
+
+        pool = VertexPool('box', [(0.5, 1, 1), (2, 3, 4), (5, 6, 7)])
+        self.assertEqual(str(pool).split('\n')[1], '    <Vertex> 0 { 0.5 1.0 1.0 }')
+
+    def test_egg_vertex_pool_matches_vertex_entries(self):
+        pool = VertexPool(
+            'box',
+            positions=[(0, 1, 1.5), (2, 3, 4), (5, 6, 7)],
+            normals=[(0, 0, 1), (0, 1, 0), (1, 0, 0)],
+            uvs=[(None, [(0.5, 1), (0, 0), (1, 0)]), ('lightmap', [(1, 1), (2, 2), (3, 3)])],
+            colors=np.ones((3, 4)),
+            morphs=[('smile', [(0, 0, 0), (1, 0, 0), (1, 0, 0)]), ('frown', [(0, 0, 0), (0, 0, 0), (0, 2, 0)])],
+        )
+        self.assertEqual(str(pool), str(Entry('VertexPool', 'box', pool.contents)))
+        self.assertEqual(len(pool), 3)
+
+    def test_egg_vertex_pool_many_morphs(self):
+        # more morphs than bits in an int64, every vertex moved by a different subset of them.
+        deltas = np.zeros((70, 9, 3))
+        for morph in range(70):
+            deltas[morph, morph % 8, morph % 3] = morph + 1
+            deltas[morph, 8, 0] = -1
+        morphs = [('m{}'.format(morph), morph_deltas) for morph, morph_deltas in enumerate(deltas)]
+        pool = VertexPool('p', np.arange(27.0).reshape(9, 3), morphs=morphs)
+        text = str(pool)
+        self.assertEqual(text, str(Entry('VertexPool', 'p', pool.contents)))
+        self.assertIn('<Dxyz> m64 { 0.0 65.0 0.0 }', text)
+        self.assertIn('<Dxyz> m68 { 0.0 0.0 69.0 }', text)
+        self.assertEqual(text.count('<Dxyz>'), 70 + 70)
+
+    def test_egg_float_format(self):
+        float_format = FloatFormat(position=3, color=1)
+        self.assertEqual(
+            float_format.format_array([0.5, 2, 100, -1.25, 0.1 + 0.2, 1 / 3.0, -0.0001, 1e-9, 12.0004], 'position'),
+            ['0.5', '2', '100', '-1.25', '0.3', '0.333', '0', '0', '12'],
+        )
+        self.assertEqual(float_format.format_array([(0.25, 1, 0.96, 0.04)], 'color'), ['0.2', '1', '1', '0'])
+        self.assertEqual(FloatFormat(uv=0).format_array([(0.4, 2.6)], 'uv'), ['0', '3'])
+        with self.assertRaises(ValueError):
+            FloatFormat(normal=-1)
+
+    def test_egg_vertex_pool_float_format(self):
+        pool = VertexPool(
+            'box',
+            positions=[(0, 1, 1.5), (2, 3.0000001, -4)],
+            normals=[(0, 0, 1), (0, 0.7071068, 0.7071068)],
+            uvs=[('UVMap.000', [(0.5, 1), (0, 0)])],
+            morphs=[('smile', [(0, 0, 0), (0.12345, 0, 0)])],
+            first_index=10,
+            float_format=FloatFormat(normal=3),
+        )
+        self.assertEqual(str(pool), '\n'.join([
+            '<VertexPool> box {',
+            '    <Vertex> 10 {',
+            '        0 1 1.5',
+            '        <Normal> { 0 0 1 }',
+            '        <UV> UVMap.000 { 0.5 1 }',
+            '    }',
+            '    <Vertex> 11 {',
+            '        2 3 -4',
+            '        <Normal> { 0 0.707 0.707 }',
+            '        <UV> UVMap.000 { 0 0 }',
+            '        <Dxyz> smile { 0.12345 0 0 }',
+            '    }',
+            '}',
+        ]))
+        self.assertEqual(str(pool.rows(1, 2)).split('\n')[1], '    <Vertex> 11 {')
+
+    def test_egg_empty_vertex_pool_format(self):
+        self.assertEqual(str(VertexPool('box', [])), '<VertexPool> box {}')
+
+    def test_egg_values_format(self):
+        float_format = FloatFormat(animation=2)
+        self.assertEqual(str(Values([90.0001], float_format=float_format)), '<V> { 90 }')
+        self.assertEqual(str(Values([])), '<V> {}')
+        table = Entry('S$Anim', 'p', content=[Values(np.arange(7) / 4.0, 3, float_format)])
+        self.assertEqual(str(table), '\n'.join([
+            '<S$Anim> p {',
+            '    <V> {',
+            '        0 0.25 0.5',
+            '        0.75 1 1.25',
+            '        1.5',
+            '    }',
+            '}',
+        ]))
+        self.assertEqual(str(Values([0.1, 2.0], 1)), '<V> {\n    0.1\n    2.0\n}')
+        self.assertEqual(Values(np.arange(5.0), 2).contents, [(0, 1), (2, 3), (4,)])
+
+    def test_egg_quote_name(self):
+        self.assertEqual(quote_name('Material.001'), 'Material.001')
+        self.assertEqual(quote_name('Leather  grey'), '"Leather  grey"')
+        self.assertEqual(quote_name('a{b}'), '"a{b}"')
+        self.assertEqual(quote_name('say "hi" \\o/'), '"say \\"hi\\" \\\\o/"')
+        self.assertEqual(quote_name('"<skeleton>"'), '"<skeleton>"')
+        self.assertEqual(quote_name(''), '""')
+        self.assertEqual(str(Entry('Group', 'Leather  grey')), '<Group> "Leather  grey" {}')
+        self.assertEqual(str(VertexPool('my mesh', [])), '<VertexPool> "my mesh" {}')
+
+    def test_egg_tee(self):
+        group = Entry('Group', 'a', [Entry('Group', 'b'), VertexPool('c', np.zeros((3, 3)))])
+        texts = []
+        egg = Egg([Entry('CoordinateSystem', content='Z-up'), Tee(Egg([group, Entry('Group', 'd')]), texts.append)])
+        output = io.StringIO()
+        with EggWriter(output, chunk_size=16) as writer:
+            egg.write(writer)
+        self.assertEqual(output.getvalue(), str(Egg([egg.contents[0], group, Entry('Group', 'd')])) + '\n')
+        self.assertEqual(texts, [str(group) + '\n\n<Group> d {}\n'])
+
+    def test_egg_compressed_output(self):
+        pool = VertexPool('grid', np.arange(30000, dtype=np.float64).reshape(-1, 3))
+        output = io.BytesIO()
+        with ThreadedGzipStream(output, max_pending=2) as stream:
+            with EggWriter(stream, 'UTF-8', chunk_size=1024) as writer:
+                pool.write(writer)
+
+        self.assertEqual(gzip.decompress(output.getvalue()).decode('UTF-8'), str(pool) + '\n')
@@ -0,0 +1,57 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from egg_exporter.egg_trace import NULL_TRACER, Tracer, trace_path
+
+
+class EggTraceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        super(EggTraceTestCase, self).setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(EggTraceTestCase, self).tearDown()
+
+    def test_nested_spans(self):
+        tracer = Tracer()
+        with tracer.span('save'):
+            with tracer.span('object', 'object', name='box'):
+                pass
+        inner, outer = tracer.events
+        self.assertEqual((outer['name'], inner['name'], inner['cat'], inner['args']), ('save', 'object', 'object', {
+            'name': 'box',
+        }))
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertGreaterEqual(outer['ts'] + outer['dur'], inner['ts'] + inner['dur'])
+
+    def test_span_records_exceptions(self):
+        tracer = Tracer()
+        with self.assertRaises(ValueError):
+            with tracer.span('save'):
+                raise ValueError()
+        self.assertEqual([event['name'] for event in tracer.events], ['save'])
+
+    def test_write(self):
+        tracer = Tracer()
+        with tracer.span('save'):
+            pass
+        filepath = os.path.join(self.directory, 'box.trace.json')
+        tracer.write(filepath)
+        with open(filepath) as trace_file:
+            trace = json.load(trace_file)
+        self.assertEqual([event['ph'] for event in trace['traceEvents']], ['X'])
+
+    def test_null_tracer(self):
+        with NULL_TRACER.span('save', name='box') as span:
+            self.assertIsNotNone(span)
+        filepath = os.path.join(self.directory, 'box.trace.json')
+        NULL_TRACER.write(filepath)
+        self.assertFalse(os.path.exists(filepath))
+
+    def test_trace_path(self):
+        self.assertEqual(trace_path('/tmp/box.egg'), '/tmp/box.trace.json')
+        self.assertEqual(trace_path('/tmp/box.egg.pz'), '/tmp/box.trace.json')
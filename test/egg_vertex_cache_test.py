@@ -0,0 +1,38 @@
+import unittest
+
+import numpy as np
+
+from egg_exporter.egg_vertex_cache import cache_misses, optimize, renumber_first_use
+
+
+def grid_triangles(size):
+    quads = [(y * (size + 1) + x, y * (size + 1) + x + 1, (y + 1) * (size + 1) + x) for y in range(size)
+             for x in range(size)]
+    quads += [(y * (size + 1) + x + 1, (y + 1) * (size + 1) + x + 1, (y + 1) * (size + 1) + x) for y in range(size)
+              for x in range(size)]
+    return np.array(quads, dtype=np.int32)
+
+
+class EggVertexCacheTestCase(unittest.TestCase):
+    def test_optimize_is_a_permutation(self):
+        triangles = grid_triangles(8)
+        order = optimize(triangles, 81)
+        self.assertEqual(sorted(order.tolist()), list(range(len(triangles))))
+        self.assertEqual(len(optimize(np.zeros((0, 3), dtype=np.int32), 0)), 0)
+
+    def test_optimize_reduces_cache_misses(self):
+        triangles = grid_triangles(40)
+        # the two triangles of a quad are far apart, every vertex leaves the cache before it is reused.
+        before = cache_misses(triangles, 16)
+        after = cache_misses(triangles[optimize(triangles, 41 * 41, 16)], 16)
+        self.assertLess(after, before)
+        self.assertLess(after / float(len(triangles)), 1.0)
+
+    def test_cache_misses(self):
+        self.assertEqual(cache_misses([(0, 1, 2), (2, 1, 3)]), 4)
+        self.assertEqual(cache_misses([(0, 1, 2), (3, 4, 5), (0, 1, 2)], 3), 9)
+
+    def test_renumber_first_use(self):
+        triangles, vertex_order = renumber_first_use(np.array([(3, 1, 2), (2, 1, 4)]), 6)
+        self.assertEqual(triangles.tolist(), [[0, 1, 2], [2, 1, 3]])
+        self.assertEqual(vertex_order.tolist(), [3, 1, 2, 4, 0, 5])
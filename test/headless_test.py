@@ -0,0 +1,51 @@
+import os
+import unittest
+
+import numpy as np
+
+from egg_exporter.headless import BlendData, Matrix, Mesh, Vector, load_egg
+
+FILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'files')
+
+
+class HeadlessTestCase(unittest.TestCase):
+    def test_from_pydata(self):
+        mesh = Mesh('mesh')
+        mesh.from_pydata([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (2, 0, 0)], [], [(0, 1, 2, 3), (1, 4, 2)])
+        self.assertEqual((len(mesh.vertices), len(mesh.polygons), len(mesh.loops)), (5, 2, 7))
+        self.assertEqual(mesh.vertices[4].co.to_tuple(), (2.0, 0.0, 0.0))
+        self.assertEqual((mesh.polygons[1].loop_start, mesh.polygons[1].loop_total), (4, 3))
+        self.assertEqual([loop.vertex_index for loop in mesh.loops], [0, 1, 2, 3, 1, 4, 2])
+
+    def test_foreach_get(self):
+        mesh = Mesh('mesh')
+        mesh.from_pydata(np.arange(12).reshape(4, 3), [], np.array([(0, 1, 2, 3)]))
+        co = np.empty(12, dtype=np.float32)
+        mesh.vertices.foreach_get('co', co)
+        np.testing.assert_array_equal(co, np.arange(12))
+        with self.assertRaises(RuntimeError):
+            mesh.vertices.foreach_get('co', np.empty(9, dtype=np.float32))
+
+    def test_matrix(self):
+        matrix = Matrix.Translation((1, 2, 3)) * Matrix([(0, -1, 0, 0), (1, 0, 0, 0), (0, 0, 1, 0), (0, 0, 0, 1)])
+        self.assertEqual(matrix * Vector((1, 0, 0)), Vector((1, 3, 3)))
+        self.assertEqual(np.array(matrix)[:3, 3].tolist(), [1, 2, 3])
+        self.assertEqual(matrix.inverted() * matrix, Matrix.Identity(4))
+
+    def test_load_egg(self):
+        data = BlendData()
+        scene = load_egg(os.path.join(FILES_DIR, 'perFaceMaterials.egg'), data)
+        self.assertEqual([blend_object.name for blend_object in scene.objects], ['Cube'])
+        mesh = scene.objects[0].data
+        self.assertEqual((len(mesh.vertices), len(mesh.polygons), len(mesh.loops)), (24, 6, 24))
+        self.assertEqual(
+            [material.name for material in mesh.materials], ['Material.Floor', 'Material.Top', 'Material.Wall'],
+        )
+        self.assertEqual(sorted(set(polygon.material_index for polygon in mesh.polygons)), [0, 1, 2])
+
+    def test_load_egg_unique_names(self):
+        data = BlendData()
+        load_egg(os.path.join(FILES_DIR, 'box.egg'), data)
+        load_egg(os.path.join(FILES_DIR, 'box.egg'), data)
+        self.assertEqual([scene.name for scene in data.scenes], ['box', 'box.001'])
+        self.assertEqual([mesh.name for mesh in data.meshes], ['box', 'box.001'])
@@ -0,0 +1,46 @@
+"""
+Run the tests outside of blender, on the headless bpy stand-in.
+
+    python test/run.py [-v] [-f] [test module names, e.g. egg_anim_test]
+
+The addon __init__ imports bpy and registers the operator, so the egg_exporter package is registered without running it
+(like the benchmark scripts do) and the stand-in is installed before the tests import the modules of the addon.
+"""
+import argparse
+import glob
+import importlib
+import os
+import sys
+import types
+import unittest
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON_NAME = 'egg_exporter'
+
+
+def load_tests(names):
+    if ADDON_NAME not in sys.modules:
+        package = types.ModuleType(ADDON_NAME)
+        package.__path__ = [ADDON_DIR]
+        sys.modules[ADDON_NAME] = package
+    importlib.import_module('{}.headless'.format(ADDON_NAME)).install()
+    if not names:
+        names = sorted(
+            os.path.splitext(os.path.basename(path))[0]
+            for path in glob.glob(os.path.join(ADDON_DIR, 'test', '*_test.py'))
+        )
+    return unittest.defaultTestLoader.loadTestsFromNames(['{}.test.{}'.format(ADDON_NAME, name) for name in names])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('names', nargs='*')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('-f', '--failfast', action='store_true')
+    args = parser.parse_args()
+    runner = unittest.TextTestRunner(verbosity=2 if args.verbose else 1, failfast=args.failfast)
+    return 0 if runner.run(load_tests(args.names)).wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())